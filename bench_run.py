@@ -0,0 +1,115 @@
+"""
+Run the firmware benchmarks (software/bench) on each SoC variant, in simulation or on hardware,
+and collect the cycle counts into a comparison table.
+
+    python bench_run.py --sim soc hyper_soc hfsoc
+    python bench_run.py --hw --port /dev/ttyUSB0 soc hyper_soc
+"""
+import argparse
+import subprocess
+import time
+from pathlib import Path
+
+from amaranth.hdl.ir import Fragment
+
+from cpu_profiles import CPU_PROFILES
+from sim.platform import SimPlatform
+from variants import VARIANTS, get_variant
+
+BENCH_BIN = "software/bench.bin"
+
+
+def build_firmware(variant, **soc_args):
+    """ Generate the headers for a variant and build the benchmark firmware against them """
+    # Elaborating the SoC generates software/generated; the ROM contents do not matter here
+    Fragment.get(get_variant(variant)(bios_file=BENCH_BIN, **soc_args), SimPlatform())
+    subprocess.run(["make", "-C", "software", "-B", "bench.bin"], check=True)
+
+
+def parse_results(lines):
+    """ Parse BENCH lines into a dict of (kernel, region, n) to cycles """
+    results = {}
+    for line in lines:
+        fields = line.strip().split(",")
+        if len(fields) == 5 and fields[0] == "BENCH":
+            _, kernel, region, n, cycles = fields
+            results[(kernel, region, int(n, 16))] = int(cycles, 16)
+    return results
+
+
+def run_sim(variant, max_cycles, build_dir=None, **soc_args):
+    platform = SimPlatform(build_dir=build_dir or f"build/bench_sim/{variant}", fast_boot=True)
+    exe = platform.build(get_variant(variant)(bios_file=BENCH_BIN, **soc_args))
+    out = subprocess.run([str(exe), "--exit-on-eot", "--cycles", str(max_cycles)],
+                         capture_output=True, text=True, check=True).stdout
+    return parse_results(out.splitlines())
+
+
+# Variants that cannot be benchmarked on the board by programming the bitstream alone
+HW_UNSUPPORTED = {
+    "hfsoc": "runs from HyperFlash, which must be programmed separately",
+}
+
+
+def run_hw(variant, port, timeout, **soc_args):
+    import serial
+    from mystorm_boards.icelogicbus import IceLogicBusPlatform
+
+    soc = get_variant(variant)(bios_file=BENCH_BIN, **soc_args)
+    with serial.Serial(port, soc.uart_baud, timeout=1) as uart:
+        IceLogicBusPlatform().build(soc, build_dir=f"build/bench_hw/{variant}", do_program=True)
+        lines = []
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            line = uart.readline().decode(errors="replace")
+            lines.append(line)
+            if line.startswith("BENCH,done"):
+                break
+    return parse_results(lines)
+
+
+def table(results):
+    """ Format the results of all variants as a markdown table """
+    variants = list(results)
+    keys = sorted(set(k for r in results.values() for k in r))
+    out = "| kernel | region | n | " + " | ".join(variants) + " |\n"
+    out += "|---" * (3 + len(variants)) + "|\n"
+    for kernel, region, n in keys:
+        cells = [str(results[v].get((kernel, region, n), "")) for v in variants]
+        out += f"| {kernel} | {region} | {n} | " + " | ".join(cells) + " |\n"
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the firmware benchmarks on SoC variants")
+    parser.add_argument("variants", nargs="*", default=list(VARIANTS), help="variants to benchmark")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--sim", action="store_true", help="run in simulation")
+    mode.add_argument("--hw", action="store_true", help="run on the board")
+    parser.add_argument("--cpu-profile", choices=list(CPU_PROFILES), help="CPU profile, instead of the variant's default")
+    parser.add_argument("--port", default="/dev/ttyUSB0", help="serial port of the UART, with --hw")
+    parser.add_argument("--cycles", type=int, default=200000000, help="cycle limit in simulation")
+    parser.add_argument("--timeout", type=float, default=60, help="time limit on hardware, in seconds")
+    parser.add_argument("--output", default="bench_results.md", help="file to write the table to")
+    args = parser.parse_args()
+
+    soc_args = {"cpu_profile": args.cpu_profile}
+    results = {}
+    for variant in args.variants:
+        if args.hw and variant in HW_UNSUPPORTED:
+            print(f"{variant}: skipped, {HW_UNSUPPORTED[variant]}")
+            continue
+        build_firmware(variant, **soc_args)
+        if args.sim:
+            results[variant] = run_sim(variant, args.cycles, **soc_args)
+        else:
+            results[variant] = run_hw(variant, args.port, args.timeout, **soc_args)
+        print(f"{variant}: {len(results[variant])} results")
+
+    out = table(results)
+    print(out)
+    Path(args.output).write_text(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Decode the binary log frames sent by the firmware's blog driver (software/drivers/blog.h), formatting
+each message on the host from its format string in software/log_messages.h. Text between frames is
+passed through unchanged, so the output reads as if the firmware had printed it.
+
+    python blog_decode.py --port /dev/ttyUSB0 --baud 3000000
+    python sim_soc.py hyper_soc | python blog_decode.py -
+"""
+import argparse
+import re
+import struct
+import sys
+
+SYNC = 0xA5
+HEADER = struct.Struct("<BHB")
+MAX_ARGS = 16
+
+MESSAGE = re.compile(r'X\(\s*(\w+)\s*,\s*"((?:[^"\\]|\\.)*)"\s*\)')
+SPEC = re.compile(r"%([-+ 0#]*\d*(?:\.\d+)?)([duxXcf%])")
+
+
+def read_messages(filename):
+    """ Return the list of (name, format) from a LOG_MESSAGES X-macro, indexed by id """
+    with open(filename) as f:
+        text = f.read()
+    return [(name, bytes(fmt, "ascii").decode("unicode_escape")) for name, fmt in MESSAGE.findall(text)]
+
+
+def format_message(fmt, args):
+    """ Format the raw 32-bit arguments of a message, as the firmware's printf-style format describes """
+    args = list(args)
+
+    def convert(match):
+        flags, conv = match.groups()
+        if conv == "%":
+            return "%"
+        if not args:
+            return "<missing>"
+        x = args.pop(0)
+        if conv == "d":
+            x = x - (1 << 32) if x & 0x80000000 else x
+        elif conv == "c":
+            x = chr(x & 0xff)
+        elif conv == "f":
+            x = struct.unpack("<f", struct.pack("<I", x))[0]
+        return ("%" + flags + ("d" if conv == "u" else conv)) % x
+
+    out = SPEC.sub(convert, fmt)
+    if args:
+        out += " [" + " ".join(f"{x:08x}" for x in args) + "]"
+    return out
+
+
+class FrameDecoder:
+    """ Split a byte stream into text and formatted messages, resynchronising on bad frames """
+    def __init__(self, messages):
+        self.messages = messages
+        self.buf = bytearray()
+
+    def frame_length(self):
+        """
+        The length of the frame at the start of the buffer, 0 if the header is not valid, or None if
+        more bytes are needed to tell
+        """
+        if len(self.buf) < HEADER.size:
+            return None
+        _, msg_id, n = HEADER.unpack_from(self.buf)
+        if msg_id >= len(self.messages) or n > MAX_ARGS:
+            return 0
+        length = HEADER.size + 4 * n + 1
+        return length if len(self.buf) >= length else None
+
+    def feed(self, data):
+        """ Add received bytes, yielding the text and messages now complete """
+        self.buf += data
+        while self.buf:
+            if self.buf[0] != SYNC:
+                end = self.buf.find(SYNC)
+                end = len(self.buf) if end < 0 else end
+                yield self.buf[:end].decode(errors="replace")
+                del self.buf[:end]
+                continue
+
+            length = self.frame_length()
+            if length is None:
+                return
+            _, msg_id, n = HEADER.unpack_from(self.buf)
+            if not length or (sum(self.buf[1:length - 1]) & 0xff) != self.buf[length - 1]:
+                # Not a frame after all, so the sync byte was text
+                yield self.buf[:1].decode(errors="replace")
+                del self.buf[:1]
+                continue
+
+            args = struct.unpack_from(f"<{n}I", self.buf, HEADER.size)
+            name, fmt = self.messages[msg_id]
+            yield format_message(fmt, args) + "\n"
+            del self.buf[:length]
+
+    def flush(self):
+        """ At the end of the input, whatever is left is text """
+        out = self.buf.decode(errors="replace")
+        self.buf.clear()
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode binary log frames from the firmware")
+    parser.add_argument("input", nargs="?", help="file of captured output, or - for stdin")
+    parser.add_argument("--port", help="serial port to read from instead")
+    parser.add_argument("--baud", type=int, default=115200, help="baud rate of the serial port")
+    parser.add_argument("--messages", default="software/log_messages.h", help="the firmware's message list")
+    args = parser.parse_args()
+
+    decoder = FrameDecoder(read_messages(args.messages))
+
+    if args.port:
+        import serial
+        with serial.Serial(args.port, args.baud, timeout=0.1) as uart:
+            while True:
+                for out in decoder.feed(uart.read(4096)):
+                    sys.stdout.write(out)
+                sys.stdout.flush()
+
+    f = sys.stdin.buffer if args.input in (None, "-") else open(args.input, "rb")
+    while True:
+        data = f.read1(4096) if hasattr(f, "read1") else f.read(4096)
+        if not data:
+            break
+        for out in decoder.feed(data):
+            sys.stdout.write(out)
+        sys.stdout.flush()
+    sys.stdout.write(decoder.flush())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Profile where the time of a build goes: the elaborate() of each module of the SoC, RTLIL emission,
+the rest of preparing the build, each tool of the toolchain, and programming.
+
+    python build_profile.py hfsoc
+    python build_profile.py hyper_soc --elaborate-only --folded build/profile/hyper_soc.folded
+    python build_profile.py hfsoc --sim
+
+The profile is written as JSON, a tree of spans with their total and self seconds, and optionally as
+collapsed stacks, in microseconds of self time, for flamegraph.pl or speedscope:
+
+    flamegraph.pl build/profile/hfsoc.folded > hfsoc.svg
+
+Module spans are named by class and nest as the modules do, each including the elaboration of its
+submodules. Tools run by the platform's build script are timed by pointing its YOSYS, NEXTPNR_ICE40
+and similar variables at wrappers for them.
+"""
+import argparse
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from amaranth.back import rtlil
+from amaranth.hdl.ir import Fragment
+
+from variants import VARIANTS, get_variant
+
+TOOL_WRAPPER = """\
+#!{python}
+import json, subprocess, sys, time
+start = time.perf_counter()
+code = subprocess.call([{tool!r}] + sys.argv[1:])
+with open({log!r}, "a") as f:
+    f.write(json.dumps({{"tool": {name!r}, "seconds": time.perf_counter() - start}}) + "\\n")
+sys.exit(code)
+"""
+
+
+def tool_env_var(name):
+    """ The environment variable naming the command for a tool, as Amaranth's build scripts read it """
+    return name.upper().replace("-", "_").replace("+", "X")
+
+
+class BuildProfile:
+    """ A tree of timed spans, each a dict of its name, seconds and child spans """
+
+    def __init__(self, name="build"):
+        self.root = {"name": name, "seconds": 0.0, "children": []}
+        self._stack = [self.root]
+
+    @contextmanager
+    def span(self, name):
+        node = {"name": name, "seconds": 0.0, "children": []}
+        self._stack[-1]["children"].append(node)
+        self._stack.append(node)
+        start = time.perf_counter()
+        try:
+            yield node
+        finally:
+            node["seconds"] = time.perf_counter() - start
+            self._stack.pop()
+
+    def add(self, name, seconds):
+        """ Add a span timed elsewhere, such as by a tool wrapper, to the current span """
+        self._stack[-1]["children"].append({"name": name, "seconds": seconds, "children": []})
+
+    @staticmethod
+    def self_seconds(node):
+        return max(node["seconds"] - sum(child["seconds"] for child in node["children"]), 0.0)
+
+    def report(self):
+        """ The tree with the self time of each span added """
+        def annotate(node):
+            return {"name": node["name"], "seconds": node["seconds"], "self_seconds": self.self_seconds(node),
+                    "children": [annotate(child) for child in node["children"]]}
+        return annotate(self.root)
+
+    def collapsed(self):
+        """ Collapsed stacks of self time in microseconds, merging spans with the same stack """
+        totals = {}
+
+        def walk(node, stack):
+            stack = stack + [node["name"]]
+            key = ";".join(stack)
+            totals[key] = totals.get(key, 0) + round(self.self_seconds(node) * 1e6)
+            for child in node["children"]:
+                walk(child, stack)
+        walk(self.root, [])
+        return [f"{stack} {us}" for stack, us in totals.items() if us > 0]
+
+    def hottest(self, count=10):
+        """ The spans with the most self time, as (seconds, stack), merged by stack """
+        totals = {}
+        for line in self.collapsed():
+            stack, us = line.rsplit(" ", 1)
+            totals[stack] = totals.get(stack, 0) + int(us) / 1e6
+        return sorted(((s, stack) for stack, s in totals.items()), reverse=True)[:count]
+
+    def write(self, json_file, folded_file=None):
+        Path(json_file).parent.mkdir(parents=True, exist_ok=True)
+        Path(json_file).write_text(json.dumps(self.report(), indent=4) + "\n")
+        if folded_file:
+            Path(folded_file).parent.mkdir(parents=True, exist_ok=True)
+            Path(folded_file).write_text("\n".join(self.collapsed()) + "\n")
+
+
+@contextmanager
+def instrument(profile):
+    """ Time each elaboratable's elaboration, RTLIL emission and the subprocesses run, while active """
+    get = Fragment.get
+    convert_fragment = rtlil.convert_fragment
+    run = subprocess.run
+
+    def timed_get(obj, platform):
+        if isinstance(obj, Fragment):
+            return get(obj, platform)
+        with profile.span(type(obj).__name__):
+            return get(obj, platform)
+
+    def timed_convert_fragment(*args, **kwargs):
+        with profile.span("rtlil"):
+            return convert_fragment(*args, **kwargs)
+
+    def timed_run(args, *rest, **kwargs):
+        name = Path(str(args if isinstance(args, (str, os.PathLike)) else args[0])).name
+        with profile.span(name):
+            return run(args, *rest, **kwargs)
+
+    Fragment.get = staticmethod(timed_get)
+    rtlil.convert_fragment = timed_convert_fragment
+    subprocess.run = timed_run
+    try:
+        yield
+    finally:
+        Fragment.get = staticmethod(get)
+        rtlil.convert_fragment = convert_fragment
+        subprocess.run = run
+
+
+def tool_wrappers(platform, wrapper_dir):
+    """
+    Write a wrapper for each tool the platform's build script runs, returning the environment that
+    makes the script use them and the log they append their times to
+    """
+    wrapper_dir = Path(wrapper_dir).resolve()
+    wrapper_dir.mkdir(parents=True, exist_ok=True)
+    log = wrapper_dir / "tools.jsonl"
+    log.unlink(missing_ok=True)
+    env = dict(os.environ)
+    for name in platform.required_tools:
+        var = tool_env_var(name)
+        wrapper = wrapper_dir / name
+        wrapper.write_text(TOOL_WRAPPER.format(python=sys.executable, tool=os.environ.get(var, name),
+                                               log=str(log), name=name))
+        wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR)
+        env[var] = str(wrapper)
+    return env, log
+
+
+def profile_build(platform, soc, name="top", build_dir="build", do_build=True, do_program=False, **kwargs):
+    """
+    Build soc for platform as platform.build would, returning a BuildProfile of its phases. With
+    do_build false, only elaboration and preparing the build files are profiled, needing no tools.
+    """
+    profile = BuildProfile()
+    start = time.perf_counter()
+    with instrument(profile):
+        if getattr(platform, "is_sim", False):
+            platform.build_dir = Path(build_dir)
+            with profile.span("build_sim"):
+                if do_build:
+                    platform.build(soc, name)
+                else:
+                    rtlil.convert(soc, name=name, ports=[platform.clk, platform.rst], platform=platform)
+        else:
+            with profile.span("prepare"):
+                plan = platform.build(soc, name, build_dir=build_dir, do_build=False, **kwargs)
+            if do_build:
+                env, log = tool_wrappers(platform, Path(build_dir) / "profile_tools")
+                with profile.span("toolchain"):
+                    products = plan.execute_local(build_dir, env=env)
+                    for line in log.read_text().splitlines():
+                        record = json.loads(line)
+                        profile.add(record["tool"], record["seconds"])
+                if do_program:
+                    with profile.span("program"):
+                        platform.toolchain_program(products, name)
+    profile.root["seconds"] = time.perf_counter() - start
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the phases of building a SoC variant")
+    parser.add_argument("variant", choices=list(VARIANTS), help="variant to build")
+    parser.add_argument("--build-dir", help="directory to build in, build/profile/<variant> by default")
+    parser.add_argument("--json", help="profile to write, build/profile/<variant>.json by default")
+    parser.add_argument("--folded", help="collapsed stacks to write, for flamegraph.pl")
+    parser.add_argument("--elaborate-only", action="store_true",
+                        help="only elaborate and prepare the build files, without running the toolchain")
+    parser.add_argument("--sim", action="store_true", help="profile building the CXXRTL simulator instead")
+    parser.add_argument("--program", action="store_true", help="program the board after building")
+    args = parser.parse_args()
+
+    build_dir = args.build_dir or f"build/profile/{args.variant}"
+    if args.sim:
+        from sim.platform import SimPlatform
+        platform = SimPlatform()
+    else:
+        from mystorm_boards.icelogicbus import IceLogicBusPlatform
+        platform = IceLogicBusPlatform()
+
+    profile = profile_build(platform, get_variant(args.variant)(), build_dir=build_dir,
+                            do_build=not args.elaborate_only, do_program=args.program)
+    json_file = args.json or f"build/profile/{args.variant}.json"
+    profile.write(json_file, args.folded)
+
+    print(f"{args.variant}: {profile.root['seconds']:.2f}s in all, profile written to {json_file}")
+    for seconds, stack in profile.hottest():
+        print(f"{seconds:8.3f}s  {stack}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# Named Minerva configurations: name -> (Minerva options, -march for the firmware).
+# The cacheable regions (icache_base/limit, dcache_base/limit) depend on the memory map, so
+# they are given by each SoC rather than the profile.
+CPU_PROFILES = {
+    # No caches and no multiplier/divider: the smallest core
+    "tiny":     (dict(with_icache=False, with_dcache=False, with_muldiv=False), "rv32i"),
+    # A small instruction cache for running from slow memory
+    "small":    (dict(with_icache=True, icache_nlines=8, with_dcache=False, with_muldiv=False), "rv32i"),
+    # Instruction cache and hardware multiply/divide
+    "balanced": (dict(with_icache=True, icache_nlines=16, with_dcache=False, with_muldiv=True), "rv32im"),
+    # Instruction and data caches and hardware multiply/divide
+    "fast":     (dict(with_icache=True, icache_nlines=32, with_dcache=True, dcache_nlines=16,
+                      with_muldiv=True), "rv32im"),
+}
+
+
+def get_profile(name):
+    """ Return the Minerva options and -march string of a CPU profile """
+    if name not in CPU_PROFILES:
+        raise ValueError(f"Unknown CPU profile {name!r}, expected one of {', '.join(CPU_PROFILES)}")
+    options, march = CPU_PROFILES[name]
+    return dict(options), march
@@ -0,0 +1,87 @@
+"""
+Search for the highest sync domain frequency that meets timing for each SoC variant.
+
+Requested frequencies are snapped to those the iCE40 PLL can actually produce, and bisected
+against the nextpnr timing report. The highest passing frequency per variant is recorded in fmax.json.
+
+    python fmax.py hyper_soc --min 25 --max 80
+"""
+import argparse
+import json
+import time
+import warnings
+from pathlib import Path
+
+from mystorm_boards.icelogicbus import IceLogicBusPlatform
+
+from pll import PLL
+from reports import read_fmax, timing_passed
+from variants import VARIANTS, get_variant
+
+
+def snap(freq_in_mhz, freq_mhz):
+    """ Return the frequency in MHz that the PLL actually achieves when asked for freq_mhz """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        pll = PLL(freq_in_mhz=freq_in_mhz, freq_out_mhz=freq_mhz)
+    return pll.freq_out_actual
+
+
+def try_freq(variant, freq_mhz, build_dir):
+    """ Build a variant with its sync domain at freq_mhz and report whether the sync clock met timing """
+    platform = IceLogicBusPlatform()
+    soc = get_variant(variant)(sync_freq=freq_mhz * 1e6)
+    platform.build(soc, build_dir=build_dir, do_program=False, nextpnr_opts="--timing-allow-fail")
+    clocks = read_fmax(build_dir)
+    return timing_passed(clocks), clocks
+
+
+def search(variant, lo_mhz, hi_mhz, build_dir):
+    """ Bisect over integer MHz requests, returning the best passing (actual MHz, clocks) or None """
+    freq_in = int(IceLogicBusPlatform().default_clk_frequency / 1e6)
+    best = None
+    tried = {}
+    while lo_mhz <= hi_mhz:
+        mid = (lo_mhz + hi_mhz) // 2
+        actual = snap(freq_in, mid)
+        if actual not in tried:
+            print(f"{variant}: trying {actual:.3f} MHz (requested {mid} MHz)")
+            tried[actual] = try_freq(variant, actual, build_dir)
+        passed, clocks = tried[actual]
+        if passed:
+            if best is None or actual > best[0]:
+                best = (actual, clocks)
+            lo_mhz = mid + 1
+        else:
+            hi_mhz = mid - 1
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the maximum sync frequency of SoC variants")
+    parser.add_argument("variants", nargs="*", default=list(VARIANTS), help="variants to search")
+    parser.add_argument("--min", type=int, default=16, help="lowest frequency to try in MHz")
+    parser.add_argument("--max", type=int, default=100, help="highest frequency to try in MHz")
+    parser.add_argument("--results", default="fmax.json", help="file to record results in")
+    args = parser.parse_args()
+
+    results_file = Path(args.results)
+    results = json.loads(results_file.read_text()) if results_file.exists() else {}
+
+    for variant in args.variants:
+        best = search(variant, args.min, args.max, f"build/fmax/{variant}")
+        if best is None:
+            print(f"{variant}: no frequency between {args.min} and {args.max} MHz met timing")
+            continue
+        freq, clocks = best
+        print(f"{variant}: highest passing frequency {freq:.3f} MHz")
+        results[variant] = {
+            "sync_freq_mhz": freq,
+            "clocks": {name: {"fmax_mhz": fmax, "target_mhz": target} for name, (fmax, _, target) in clocks.items()},
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        results_file.write_text(json.dumps(results, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Compile fonts for the LCD into a packed binary, optionally keeping only the glyphs the firmware uses,
+so that LcdPeripheral only needs font ROM for those.
+
+    python fontc.py peripheral/font_bizcat8x16.mem -o font.fnt --subset 20-7e
+    python fontc.py terminus.bdf -o font.fnt --chars-from software/bios.c software/lcd_demo.c
+
+Fonts are read from BDF, PSF (versions 1 and 2), the $readmemb text of font_bizcat8x16.mem, or a
+packed font. Glyphs are 8x16, and smaller ones are placed in that cell; only character codes 0-255
+are kept, as written to the ch and console registers.
+
+A packed font is the magic "FNT0", the number of glyphs as a 16-bit little-endian count, the
+character code of each glyph, in order, then 16 bytes of rows for each, top row first and the
+leftmost pixel in bit 7. The space is always kept in a subset, and other characters missing
+from it are drawn as a space.
+"""
+import argparse
+import os
+import re
+import struct
+import sys
+
+from memimage import read_image
+
+WIDTH = 8
+HEIGHT = 16
+CODES = 256
+MAGIC = b"FNT0"
+PSF1_MAGIC = b"\x36\x04"
+PSF2_MAGIC = b"\x72\xb5\x4a\x86"
+
+
+def read_mem(filename):
+    """ The glyphs of a $readmemb font, a line for each row of each of 256 glyphs """
+    rows = read_image(filename, width=8, fmt="bin-text")
+    count = min(len(rows) // HEIGHT, CODES)
+    return list(range(count)), rows[:count * HEIGHT]
+
+
+def place(bitmap, width, top=0, left=0):
+    """
+    Place the rows of a glyph, up to 8 pixels wide with the leftmost in the top bit, in an 8x16 cell,
+    top rows down and left pixels across
+    """
+    rows = [0] * HEIGHT
+    for i, row in enumerate(bitmap):
+        if 0 <= top + i < HEIGHT:
+            row <<= WIDTH - width
+            rows[top + i] = (row >> left if left >= 0 else row << -left) & 0xff
+    return rows
+
+
+def read_psf(data):
+    """ The glyphs of a PSF font, which are numbered by character code """
+    if data.startswith(PSF1_MAGIC):
+        mode, height = data[2], data[3]
+        count, width, offset = 512 if mode & 1 else 256, 8, 4
+    else:
+        _, offset, _, count, _, height, width = struct.unpack_from("<7I", data, 4)
+    if width > WIDTH or height > HEIGHT:
+        raise ValueError(f"PSF glyphs are {width}x{height}, larger than {WIDTH}x{HEIGHT}")
+    stride = (width + 7) // 8
+    count = min(count, CODES)
+    top = (HEIGHT - height) // 2
+    glyphs = []
+    for i in range(count):
+        start = offset + i * stride * height
+        bitmap = [int.from_bytes(data[start + r * stride:start + (r + 1) * stride], "big") >> (8 * stride - width)
+                  for r in range(height)]
+        glyphs += place(bitmap, width, top)
+    return list(range(count)), glyphs
+
+
+def read_bdf(data):
+    """ The glyphs of a BDF font with encodings 0-255, placed by their bounding boxes on the font's baseline """
+    lines = iter(data.decode("latin-1").splitlines())
+    ascent = None
+    font_box = None
+    chars = {}
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "FONTBOUNDINGBOX":
+            font_box = [int(f) for f in fields[1:5]]
+        elif fields[0] == "FONT_ASCENT":
+            ascent = int(fields[1])
+        elif fields[0] == "STARTCHAR":
+            code = None
+            box = font_box
+            for line in lines:
+                fields = line.split()
+                if fields[0] == "ENCODING":
+                    code = int(fields[-1])
+                elif fields[0] == "BBX":
+                    box = [int(f) for f in fields[1:5]]
+                elif fields[0] == "BITMAP":
+                    bitmap = []
+                    for line in lines:
+                        if line.startswith("ENDCHAR"):
+                            break
+                        # Each row is padded to whole bytes
+                        bitmap.append(int(line, 16) >> (4 * len(line.strip()) - box[0]))
+                    if code is not None and 0 <= code < CODES:
+                        chars[code] = (box, bitmap)
+                    break
+    if font_box is None:
+        raise ValueError("BDF font has no FONTBOUNDINGBOX")
+    if font_box[0] > WIDTH or font_box[1] > HEIGHT:
+        raise ValueError(f"BDF glyphs are {font_box[0]}x{font_box[1]}, larger than {WIDTH}x{HEIGHT}")
+    if ascent is None:
+        ascent = font_box[1] + font_box[3]
+    # Centre the font's bounding box in the cell
+    baseline = (HEIGHT - font_box[1]) // 2 + ascent
+    codes = sorted(chars)
+    glyphs = []
+    for code in codes:
+        (width, height, x_off, y_off), bitmap = chars[code]
+        glyphs += place(bitmap, width, baseline - y_off - height, x_off - font_box[2])
+    return codes, glyphs
+
+
+def read_packed(data):
+    count, = struct.unpack_from("<H", data, len(MAGIC))
+    start = len(MAGIC) + 2
+    codes = list(data[start:start + count])
+    glyphs = list(data[start + count:start + count + count * HEIGHT])
+    return codes, glyphs
+
+
+def read_font(filename):
+    """
+    Read a font, returning the character codes of its glyphs, in ascending order, and the rows of the
+    glyphs, 16 for each
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if data.startswith(MAGIC):
+        return read_packed(data)
+    if data.startswith(PSF1_MAGIC) or data.startswith(PSF2_MAGIC):
+        return read_psf(data)
+    if data.startswith(b"STARTFONT"):
+        return read_bdf(data)
+    return read_mem(filename)
+
+
+def subset(codes, glyphs, keep):
+    """ Keep the glyphs of the characters in keep, and the space """
+    keep = set(keep) | {ord(" ")}
+    kept = [i for i, code in enumerate(codes) if code in keep]
+    return [codes[i] for i in kept], [row for i in kept for row in glyphs[i * HEIGHT:(i + 1) * HEIGHT]]
+
+
+def glyph_map(codes):
+    """ The index of each character's glyph, characters without one taking the space's, or the first """
+    index = {code: i for i, code in enumerate(codes)}
+    missing = index.get(ord(" "), 0)
+    return [index.get(code, missing) for code in range(CODES)]
+
+
+def pack(codes, glyphs):
+    return MAGIC + struct.pack("<H", len(codes)) + bytes(codes) + bytes(glyphs)
+
+
+def parse_ranges(spec):
+    """ Character codes from hex ranges, such as 20-7e,a0,b0-b3 """
+    keep = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        keep.update(range(int(first, 16), int(last or first, 16) + 1))
+    return keep
+
+
+def chars_from(filename):
+    """ The characters of the string and character literals of a C file, or the printable bytes of any other """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if os.path.splitext(filename)[1] in (".c", ".h"):
+        literals = re.findall(rb'"((?:[^"\\\n]|\\.)*)"|\'((?:[^\'\\\n]|\\.)+)\'', data)
+        data = b"".join(s or c for s, c in literals)
+    return {b for b in data if 0x20 <= b < 0x7f or b >= 0xa0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a font for the LCD into a packed binary")
+    parser.add_argument("font", help="BDF, PSF, $readmemb or packed font")
+    parser.add_argument("-o", "--output", required=True, help="packed font to write")
+    parser.add_argument("--subset", help="hex ranges of the character codes to keep, such as 20-7e")
+    parser.add_argument("--chars", default="", help="characters to keep")
+    parser.add_argument("--chars-from", nargs="+", default=[], metavar="FILE",
+                        help="keep the characters of the C string literals, or the printable bytes, in these files; "
+                             "add characters made at run time, such as digits, with --subset or --chars")
+    args = parser.parse_args()
+
+    codes, glyphs = read_font(args.font)
+    if args.subset or args.chars or args.chars_from:
+        keep = {ord(c) for c in args.chars}
+        if args.subset:
+            keep |= parse_ranges(args.subset)
+        for filename in args.chars_from:
+            keep |= chars_from(filename)
+        codes, glyphs = subset(codes, glyphs, keep)
+        if not codes:
+            sys.exit("none of the characters are in the font")
+
+    with open(args.output, "wb") as f:
+        f.write(pack(codes, glyphs))
+    print(f"{args.output}: {len(codes)} glyphs, {len(glyphs)} bytes of font ROM")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,7 @@
 from amaranth import *
 from amaranth_soc import wishbone
 
-from minerva.core import Minerva
-
 from amaranth_orchard.base.gpio import GPIOPeripheral
-from amaranth_orchard.io.uart import UARTPeripheral
 from amaranth_orchard.memory.sram import SRAMPeripheral
 
 from memory.hyperflash import HyperFlash
@@ -12,15 +9,20 @@ from memory.hyperflash import HyperFlash
 from mystorm_boards.icelogicbus import *
 
 from wrapper import SoCWrapper
-from software.soft_gen import SoftwareGenerator
+from software.soft_gen import SoftwareGenerator, read_hot_list
 
 from peripheral.seg7 import Seg7Peripheral
-from peripheral.lcd import LcdPeripheral
+from peripheral.timer import TimerPeripheral
+from peripheral.irq import InterruptController
+from peripheral.dma import DMAPeripheral
 
 
 class HfSoC(SoCWrapper):
-    def __init__(self):
-        super().__init__()
+    default_cpu_profile = "small"
+    default_uart_fifo_depth = 16
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         # Memory regions
         self.rom_base = 0x00000000
@@ -33,6 +35,9 @@ class HfSoC(SoCWrapper):
         self.uart_base = 0xb2000000
         self.seg7_base = 0xb3000000
         self.lcd_base = 0xb4000000
+        self.timer_base = 0xb6000000
+        self.irqc_base = 0xb8000000
+        self.dma_base = 0xb7000000
 
     def elaborate(self, platform):
         # Elaborate the wrapper
@@ -44,9 +49,9 @@ class HfSoC(SoCWrapper):
         # A Wishbone decoder for the memory and peripherals
         self._decoder = wishbone.Decoder(addr_width=30, data_width=32, granularity=8)
 
-        # Use a Minerva CPU without a small instruction cache and no data cache
-        self.cpu = Minerva(with_icache=True, icache_nlines=8, icache_limit=0x800,
-                           with_dcache=False, dcache_nlines=8, dcache_limit=0x400)
+        # Create the Minerva CPU from the CPU profile, with any data cache covering RAM
+        self.cpu = self.get_cpu(icache_limit=0x800,
+                                dcache_base=self.sram_base, dcache_limit=self.sram_base + self.sram_size)
 
         # Create wishbone buses for the cpu instruction and data caches. Needed even for dummy caches
         self.ibus = wishbone.Interface(addr_width=30, data_width=32, granularity=8,
@@ -57,12 +62,20 @@ class HfSoC(SoCWrapper):
         # We need a signal for an external interrupt
         self.ip   = Signal.like(self.cpu.external_interrupt)
 
+        # Create the DMA engine, which is a third bus master
+        self.dma = DMAPeripheral()
+
         # Add the buses to the arbiter
         self._arbiter.add(self.ibus)
         self._arbiter.add(self.dbus)
+        self._arbiter.add(self.dma.dma_bus)
+
+        # Create the LCD, whose framebuffer fetch streams images from HyperFlash as a fourth bus master
+        self.lcd = self.get_lcd_peripheral(m, platform, framebuffer=True)
+        self._arbiter.add(self.lcd.fb_bus)
 
         # Create a HyperFlash rom
-        self.rom = HyperFlash(pins=super().get_hflash(m, platform), init_latency=16)
+        self.rom = HyperFlash(pins=super().get_hflash(m, platform, init_file=self.bios_file), init_latency=16)
         self._decoder.add(self.rom.data_bus, addr=self.rom_base)
 
         # Create BRAM RAM and add it to the decoder
@@ -74,9 +87,7 @@ class HfSoC(SoCWrapper):
         self._decoder.add(self.gpio.bus, addr=self.led_gpio_base)
 
         # Create the uart peripheral and add it to the decoder
-        self.uart = UARTPeripheral(
-            init_divisor=(25000000//115200),
-            pins=super().get_uart(m, platform))
+        self.uart = self.get_uart_peripheral(m, platform)
         self._decoder.add(self.uart.bus, addr=self.uart_base)
 
         self.seg7 = Seg7Peripheral(
@@ -84,11 +95,20 @@ class HfSoC(SoCWrapper):
         )
         self._decoder.add(self.seg7.bus, addr=self.seg7_base)
 
-        self.lcd = LcdPeripheral(
-            pins=super().get_lcd(m, platform)
-        )
+        # Add the LCD's registers to the decoder
         self._decoder.add(self.lcd.bus, addr=self.lcd_base)
 
+        # Create the timer peripheral and add it to the decoder
+        self.timer = TimerPeripheral()
+        self._decoder.add(self.timer.bus, addr=self.timer_base)
+
+        # Create the interrupt controller and add it to the decoder
+        self.irqc = InterruptController()
+        self._decoder.add(self.irqc.bus, addr=self.irqc_base)
+
+        # Add the DMA engine's registers to the decoder
+        self._decoder.add(self.dma.bus, addr=self.dma_base)
+
         # Add all the submodules
         m.submodules.arbiter  = self._arbiter
         m.submodules.cpu      = self.cpu
@@ -99,6 +119,9 @@ class HfSoC(SoCWrapper):
         m.submodules.uart     = self.uart
         m.submodules.seg7     = self.seg7
         m.submodules.lcd      = self.lcd
+        m.submodules.timer    = self.timer
+        m.submodules.irqc     = self.irqc
+        m.submodules.dma      = self.dma
 
         m.d.comb += [
             # Connect the arbiter to the decoder
@@ -107,19 +130,56 @@ class HfSoC(SoCWrapper):
             self.cpu.ibus.connect(self.ibus),
             self.cpu.dbus.connect(self.dbus),
             # Connect the external interrupt signal
-            self.cpu.external_interrupt.eq(self.ip)
+            self.cpu.external_interrupt.eq(self.ip),
+            # The interrupt controller drives line 0, which start.S unmasks
+            self.ip[0].eq(self.irqc.irq),
+            # Connect the peripheral interrupts to the controller
+            self.irqc.irqs[0].eq(self.timer.irq),
+            self.irqc.irqs[1].eq(self.dma.irq),
+            self.irqc.irqs[3].eq(self.lcd.irq)
         ]
 
+        # The buffered UART interrupts on line 2
+        if self.uart_fifo_depth:
+            m.d.comb += self.irqc.irqs[2].eq(self.uart.irq)
+
+        # Trace the bus masters in simulation
+        self.add_bus_monitors(m, platform, self.ibus, self.dbus, self.dma.dma_bus, self.lcd.fb_bus)
+
         # Generate soc.h, start.S and the linker script
         sw = SoftwareGenerator(
             rom_start=self.rom_base, rom_size=self.rom_size,    # place BIOS in HyperFlash
             ram_start=self.sram_base, ram_size=self.sram_size,  # place BIOS data in SRAM
+            march=self.march,
         )
 
         sw.add_periph("gpio", "LED_GPIO", self.led_gpio_base)
-        sw.add_periph("uart", "UART0", self.uart_base)
+        sw.add_periph(self.uart_type, "UART0", self.uart_base)
         sw.add_periph("seg7", "SEG70", self.seg7_base)
         sw.add_periph("lcd", "LCD0", self.lcd_base)
+        sw.add_periph("timer", "TIMER0", self.timer_base)
+        sw.add_periph("irq", "IRQC0", self.irqc_base)
+        sw.add_periph("dma", "DMA0", self.dma_base)
+
+        sw.add_irq("TIMER0", 0)
+        sw.add_irq("DMA0", 1)
+        if self.uart_fifo_depth:
+            sw.add_irq("UART0", 2, handler="uart_fifo_irq_handler")
+        sw.add_irq("LCD0", 3)
+
+        # The DMA engine does not keep a data cache coherent, so only use it for bulk copies without one
+        if not self.cpu_options["with_dcache"]:
+            sw.set_copy_engine("DMA0")
+
+        # Run the functions hotlist.py found to be hot from BRAM rather than HyperFlash
+        sw.add_hot_functions(read_hot_list("software/hot_functions.txt"))
+
+        sw.add_define("CLK_FREQ", int(self.clk_freq))
+
+        sw.add_region("HYPERFLASH", self.rom_base, self.rom_size, writable=False)
+        sw.add_region("BRAM", self.sram_base, self.sram_size)
+
+        sw.add_define("LCD_FRAMEBUFFER", 1)
 
         sw.generate("software/generated")
 
@@ -0,0 +1,97 @@
+"""
+Choose the firmware functions to run from RAM, from a profile of where the CPU fetches its instructions.
+
+The profile is either a Wishbone trace recorded by the simulator with --trace, where each instruction
+bus transfer is weighted by its latency, or a text file of sampled PCs in hex, one per line.
+Functions are taken in order of cost until the RAM budget is used, and written to a hot list that
+SoftwareGenerator links into .ramfunc.
+
+    python sim_soc.py hfsoc --cycles 20000000 --trace trace.bin
+    python hotlist.py software/bios.elf --trace trace.bin --budget 2048
+"""
+import argparse
+import subprocess
+from bisect import bisect_right
+from collections import Counter
+from pathlib import Path
+
+from sim.wb_trace import read_trace
+
+
+def read_functions(elf, nm="riscv-none-embed-nm"):
+    """ Return a sorted list of (address, size, name) of the functions in an ELF file """
+    out = subprocess.run([nm, "--print-size", "--defined-only", elf],
+                         capture_output=True, text=True, check=True).stdout
+    funcs = []
+    for line in out.splitlines():
+        fields = line.split()
+        if len(fields) == 4 and fields[2] in "tT":
+            funcs.append((int(fields[0], 16), int(fields[1], 16), fields[3]))
+    return sorted(funcs)
+
+
+def trace_costs(filename, master=0):
+    """ Fetch addresses and their cost in cycles from the instruction bus transfers of a trace """
+    _, records = read_trace(filename)
+    return [(addr, latency) for _, addr, _, latency, m, write, _ in records if m == master and not write]
+
+
+def sample_costs(filename):
+    """ Sampled PCs, each costing one sample """
+    return [(int(line, 16), 1) for line in Path(filename).read_text().split()]
+
+
+def function_costs(funcs, costs):
+    """ Total the costs of the addresses falling in each function """
+    starts = [addr for addr, _, _ in funcs]
+    totals = Counter()
+    for addr, cost in costs:
+        i = bisect_right(starts, addr) - 1
+        if i >= 0 and addr < funcs[i][0] + funcs[i][1]:
+            totals[funcs[i][2]] += cost
+    return totals
+
+
+def choose(funcs, totals, budget, exclude):
+    """ Take the most costly functions, per the cost per byte, until the budget is used """
+    sizes = {name: size for _, size, name in funcs}
+    chosen = []
+    used = 0
+    for name, cost in sorted(totals.items(), key=lambda t: t[1] / max(sizes[t[0]], 1), reverse=True):
+        if name in exclude:
+            continue
+        size = (sizes[name] + 3) & ~3
+        if used + size <= budget:
+            chosen.append((name, cost, size))
+            used += size
+    return chosen, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose firmware functions to run from RAM")
+    parser.add_argument("elf", help="firmware ELF file the profile was taken from")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="Wishbone trace from the simulator")
+    source.add_argument("--samples", help="text file of sampled PCs in hex")
+    parser.add_argument("--budget", type=int, default=2048, help="bytes of RAM to give to functions")
+    parser.add_argument("--exclude", nargs="*", default=["main"], help="functions to leave in place")
+    parser.add_argument("--nm", default="riscv-none-embed-nm", help="nm for the target")
+    parser.add_argument("--output", default="software/hot_functions.txt", help="hot list to write")
+    args = parser.parse_args()
+
+    funcs = read_functions(args.elf, args.nm)
+    costs = trace_costs(args.trace) if args.trace else sample_costs(args.samples)
+    totals = function_costs(funcs, costs)
+    chosen, used = choose(funcs, totals, args.budget, set(args.exclude))
+
+    total = sum(totals.values()) or 1
+    lines = [f"# {used} of {args.budget} bytes, {sum(c for _, c, _ in chosen) * 100 / total:.1f}% of the profile"]
+    for name, cost, size in chosen:
+        print(f"{name:32} {size:6} bytes {cost * 100 / total:6.1f}%")
+        lines.append(f"{name:32} # {size} bytes, {cost * 100 / total:.1f}%")
+    Path(args.output).write_text("\n".join(lines) + "\n")
+    print(lines[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,41 @@
 from amaranth_orchard.memory.hyperram import HyperRAM
 from wrapper import SoCWrapper
+from memimage import read_firmware
 from software.soft_gen import SoftwareGenerator
 
 from amaranth import *
 from amaranth_soc import wishbone
 from amaranth.hdl.xfrm import ResetInserter
 
-from minerva.core import Minerva
-
 from amaranth_orchard.base.gpio import GPIOPeripheral
-from amaranth_orchard.io.uart import UARTPeripheral
 from peripheral.sram import SRAMPeripheral
 
 from mystorm_boards.icelogicbus import *
 
 from peripheral.seg7 import Seg7Peripheral
-from peripheral.lcd import LcdPeripheral
+from peripheral.timer import TimerPeripheral
+from peripheral.irq import InterruptController
+from peripheral.dma import DMAPeripheral
 
-from pll import PLL
 from qspimem import QspiMem
 
 import time
 
 
-def readbios():
-    """ Read bios.bin into an array of integers """
-    f = open("software/bios.bin", "rb")
-    l = []
-    while True:
-        b = f.read(4)
-        if b:
-            l.append(int.from_bytes(b, "little"))
-        else:
-            break
-    f.close()
-    return l
-
-
 class StormHyperSoC(SoCWrapper):
-    def __init__(self):
-        super().__init__()
+    default_cpu_profile = "small"
+    default_uart_fifo_depth = 16
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         # Memory regions
         self.rom_base = 0x00000000
         self.rom_size = 4 * 1024  # 4KiB
         self.hyperram_base = 0x10000000
-        self.hyperram_size = 1 * 1024  # Use just 1KiB as in SRAM version
+        self.hyperram_size = 8 * 1024 * 1024  # 8MiB, for bulk data and the heap
+        self.sram_base = 0x20000000
+        self.sram_size = 2 * 1024  # 2KiB, for the stack and small data
 
         # CSR regions
         self.led_gpio_base = 0xb1000000
@@ -53,41 +43,40 @@ class StormHyperSoC(SoCWrapper):
         self.seg7_base = 0xb3000000
         self.lcd_base = 0xb4000000
         self.hram_ctrl_base = 0xb5000000
+        self.timer_base = 0xb6000000
+        self.irqc_base = 0xb8000000
+        self.dma_base = 0xb7000000
 
     def elaborate(self, platform):
         # Elaborate the wrapper
         m = super().elaborate(platform)
 
-        # Qspi domain
-        clk_freq = 100000000
-        # Create a Pll for higher speed clock
-        m.submodules.pll = pll = PLL(freq_in_mhz=int(platform.default_clk_frequency / 1e6),
-                                     freq_out_mhz=int(clk_freq / 1e6),
-                                     domain_name="qspi")
-        # Set the sync domain to the pll domain
-        m.domains.qspi = cd_qspi = pll.domain
-        m.d.comb += pll.clk_pin.eq(ClockSignal())
-        platform.add_clock_constraint(cd_qspi.clk, clk_freq)
+        # Create a Pll for the higher speed qspi domain
+        self.add_pll_domain(m, platform, "qspi", 100000000)
 
         # Add QspiMem submodule
-        m.submodules.qspimem = qspimem = QspiMem(domain="qspi")
-
-        # Connect pins
-        qspi = platform.request("qspi")
-        led = platform.request("led")
-        m.d.comb += [
-            qspimem.qss.eq(qspi.cs),
-            qspimem.qck.eq(qspi.clk),
-            qspimem.qd_i.eq(qspi.data.i),
-            qspi.data.o.eq(qspimem.qd_o),
-            qspi.data.oe.eq(qspimem.qd_oe)
-        ]
+        m.submodules.qspimem = qspimem = QspiMem(domain="qspi", pwr_on_bits=1 if self.fast_sim(platform) else 9)
 
         cpu_reset = Signal()
         with m.If(qspimem.wr & (qspimem.addr == 0x10000)):
             m.d.qspi += cpu_reset.eq(qspimem.dout[0])
 
-        m.d.sync += led.eq(cpu_reset)
+        if self.is_sim(platform):
+            # No remote loading in simulation
+            m.d.comb += qspimem.qss.eq(1)
+        else:
+            # Connect pins
+            qspi = platform.request("qspi")
+            led = platform.request("led")
+            m.d.comb += [
+                qspimem.qss.eq(qspi.cs),
+                qspimem.qck.eq(qspi.clk),
+                qspimem.qd_i.eq(qspi.data.i),
+                qspi.data.o.eq(qspimem.qd_o),
+                qspi.data.oe.eq(qspimem.qd_oe)
+            ]
+
+            m.d.sync += led.eq(cpu_reset)
 
         # We need a Wishbone arbiter as the Minerva CPU has instruction and data cache buses, which are both master
         self._arbiter = wishbone.Arbiter(addr_width=30, data_width=32, granularity=8)
@@ -95,9 +84,11 @@ class StormHyperSoC(SoCWrapper):
         # A Wishbone decoder for the memory and peripherals
         self._decoder = wishbone.Decoder(addr_width=30, data_width=32, granularity=8)
 
-        # Use a Minerva CPU without a cache
-        self.cpu = ResetInserter(cpu_reset)(Minerva(with_icache=True, icache_nlines=8, icache_limit=0x800,
-                                                    with_dcache=False, dcache_nlines=8, dcache_limit=0x400))
+        # Create the Minerva CPU from the CPU profile, with any data cache covering RAM.
+        # Remote loading can hold it in reset
+        self.cpu = ResetInserter(cpu_reset)(
+            self.get_cpu(icache_limit=0x800,
+                         dcache_base=self.hyperram_base, dcache_limit=self.hyperram_base + self.hyperram_size))
 
         # Create wishbone buses for the cpu instruction and data caches. Needed even for dummy caches
         self.ibus = wishbone.Interface(addr_width=30, data_width=32, granularity=8,
@@ -108,13 +99,21 @@ class StormHyperSoC(SoCWrapper):
         # We need a signal for an external interrupt
         self.ip   = Signal.like(self.cpu.external_interrupt)
 
+        # Create the DMA engine, which is a third bus master
+        self.dma = DMAPeripheral()
+
         # Add the buses to the arbiter
         self._arbiter.add(self.ibus)
         self._arbiter.add(self.dbus)
+        self._arbiter.add(self.dma.dma_bus)
+
+        # Create the LCD, whose framebuffer fetch from HyperRAM is a fourth bus master
+        self.lcd = self.get_lcd_peripheral(m, platform, framebuffer=True)
+        self._arbiter.add(self.lcd.fb_bus)
 
         # Create a BRAM Rom and load the Bios into it and add it to the decoder
         self.rom =  SRAMPeripheral(size=self.rom_size, loadable=True, writable=False)
-        self.rom.init = readbios()
+        self.rom.init = read_firmware(self.bios_file, depth=self.rom_size // 4)
         self._decoder.add(self.rom.bus, addr=self.rom_base)
 
         # Load interface
@@ -128,6 +127,10 @@ class StormHyperSoC(SoCWrapper):
         with m.If(qspimem.wr & (qspimem.addr < 0x10000) & (qspimem.addr[:2] < 3)):
             m.d.qspi += din.eq(Cat(din[8:], qspimem.dout))
 
+        # Create BRAM RAM for the stack and small data and add it to the decoder
+        self.sram = SRAMPeripheral(size=self.sram_size, index=1)
+        self._decoder.add(self.sram.bus, addr=self.sram_base)
+
         self.hyperram = HyperRAM(pins=super().get_hram(m, platform), init_latency=7)
         self._decoder.add(self.hyperram.data_bus, addr=self.hyperram_base)
         self._decoder.add(self.hyperram.ctrl_bus, addr=self.hram_ctrl_base)
@@ -137,9 +140,7 @@ class StormHyperSoC(SoCWrapper):
         self._decoder.add(self.gpio.bus, addr=self.led_gpio_base)
 
         # Create the uart peripheral and add it to the decoder
-        self.uart = UARTPeripheral(
-            init_divisor=(25000000//115200),
-            pins=super().get_uart(m, platform))
+        self.uart = self.get_uart_peripheral(m, platform)
         self._decoder.add(self.uart.bus, addr=self.uart_base)
 
         self.seg7 = Seg7Peripheral(
@@ -147,21 +148,34 @@ class StormHyperSoC(SoCWrapper):
         )
         self._decoder.add(self.seg7.bus, addr=self.seg7_base)
 
-        self.lcd = LcdPeripheral(
-            pins=super().get_lcd(m, platform)
-        )
+        # Add the LCD's registers to the decoder
         self._decoder.add(self.lcd.bus, addr=self.lcd_base)
 
+        # Create the timer peripheral and add it to the decoder
+        self.timer = TimerPeripheral()
+        self._decoder.add(self.timer.bus, addr=self.timer_base)
+
+        # Create the interrupt controller and add it to the decoder
+        self.irqc = InterruptController()
+        self._decoder.add(self.irqc.bus, addr=self.irqc_base)
+
+        # Add the DMA engine's registers to the decoder
+        self._decoder.add(self.dma.bus, addr=self.dma_base)
+
         # Add all the submodules
         m.submodules.arbiter  = self._arbiter
         m.submodules.cpu      = self.cpu
         m.submodules.decoder  = self._decoder
         m.submodules.rom      = self.rom
+        m.submodules.sram     = self.sram
         m.submodules.hyperram  = self.hyperram
         m.submodules.gpio     = self.gpio
         m.submodules.uart     = self.uart
         m.submodules.seg7 = self.seg7
         m.submodules.lcd = self.lcd
+        m.submodules.timer    = self.timer
+        m.submodules.irqc     = self.irqc
+        m.submodules.dma      = self.dma
 
         m.d.comb += [
             # Connect the arbiter to the decoder
@@ -170,22 +184,57 @@ class StormHyperSoC(SoCWrapper):
             self.cpu.ibus.connect(self.ibus),
             self.cpu.dbus.connect(self.dbus),
             # Connect the external interrupt signal
-            self.cpu.external_interrupt.eq(self.ip)
+            self.cpu.external_interrupt.eq(self.ip),
+            # The interrupt controller drives line 0, which start.S unmasks
+            self.ip[0].eq(self.irqc.irq),
+            # Connect the peripheral interrupts to the controller
+            self.irqc.irqs[0].eq(self.timer.irq),
+            self.irqc.irqs[1].eq(self.dma.irq),
+            self.irqc.irqs[3].eq(self.lcd.irq)
         ]
 
-        if self.is_sim(platform):
-            m.submodules.bus_mon = platform.add_monitor("wb_mon", self._decoder.bus)
+        # The buffered UART interrupts on line 2
+        if self.uart_fifo_depth:
+            m.d.comb += self.irqc.irqs[2].eq(self.uart.irq)
+
+        # Trace the bus masters in simulation
+        self.add_bus_monitors(m, platform, self.ibus, self.dbus, self.dma.dma_bus, self.lcd.fb_bus)
 
         # Generate soc.h, start.S and the linker script
         sw = SoftwareGenerator(
             rom_start=self.rom_base, rom_size=self.rom_size, # place BIOS in SRAM
-            ram_start=self.hyperram_base, ram_size=self.hyperram_size, # place BIOS data in HyperRam
+            ram_start=self.hyperram_base, ram_size=self.hyperram_size, ram_fast=False, # place BIOS data in HyperRam
+            march=self.march,
         )
 
         sw.add_periph("gpio", "LED_GPIO", self.led_gpio_base)
-        sw.add_periph("uart", "UART0", self.uart_base)
+        sw.add_periph(self.uart_type, "UART0", self.uart_base)
         sw.add_periph("seg7", "SEG70", self.seg7_base)
         sw.add_periph("lcd", "LCD0", self.lcd_base)
+        sw.add_periph("timer", "TIMER0", self.timer_base)
+        sw.add_periph("irq", "IRQC0", self.irqc_base)
+        sw.add_periph("dma", "DMA0", self.dma_base)
+
+        sw.add_irq("TIMER0", 0)
+        sw.add_irq("DMA0", 1)
+        if self.uart_fifo_depth:
+            sw.add_irq("UART0", 2, handler="uart_fifo_irq_handler")
+        sw.add_irq("LCD0", 3)
+
+        # The DMA engine does not keep a data cache coherent, so only use it for bulk copies without one
+        if not self.cpu_options["with_dcache"]:
+            sw.set_copy_engine("DMA0")
+
+        sw.add_define("CLK_FREQ", int(self.clk_freq))
+
+        sw.add_region("BRAM_ROM", self.rom_base, self.rom_size, writable=False)
+        sw.add_region("HYPERRAM", self.hyperram_base, self.hyperram_size)
+        sw.add_region("BRAM", self.sram_base, self.sram_size)
+
+        sw.add_define("LCD_FRAMEBUFFER", 1)
+
+        # Place the stack and small data in BRAM
+        sw.add_ram("SRAM", self.sram_base, self.sram_size, fast=True)
 
         sw.generate("software/generated")
 
@@ -0,0 +1,154 @@
+"""
+Convert PNG images to RGB565 and pack them into a flash image with an index table, for the LCD to show
+straight from HyperFlash (see the image register of LcdPeripheral), or for the firmware to copy, say to
+the sprite memory.
+
+    python img2flash.py logo.png arrow.png --base 0x100000 -o images.bin --header software/images.h
+    python img2flash.py logo.png --rle --base 0x100000 --bios software/bios.bin -o flash.bin
+
+Full-screen images are stored in the order the panel scans them, 240 down each column from the right-hand
+column, so that the LCD can stream them, and with --rle are run-length encoded where that is smaller.
+Smaller images are stored row by row. Each image is a header word, the number of words of pixels in bits
+0-23 and bit 31 set if they are run-length encoded, then the pixels, two to a word, or a word for each run
+of a pixel in bits 0-15 repeated the number of times in bits 16-31, plus one.
+
+The index table at the base address is the magic "IMG0", the number of images, then for each image the
+byte offset of its header from the table, width | height << 16, and a copy of its header.
+"""
+import argparse
+import os
+import re
+import struct
+import sys
+
+WIDTH = 240
+HEIGHT = 240
+MAGIC = 0x30474d49
+RLE = 1 << 31
+MAX_RUN = 1 << 16
+
+
+def rgb565(r, g, b):
+    return ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+
+
+def load_png(filename):
+    """ Return the width, height and RGB565 pixels, row by row, of an image """
+    try:
+        from PIL import Image
+    except ImportError:
+        sys.exit("img2flash.py needs Pillow to read images: pip install pillow")
+    with Image.open(filename) as img:
+        img = img.convert("RGB")
+        return img.width, img.height, [rgb565(*p) for p in img.getdata()]
+
+
+def scan_order(width, height, pixels):
+    """ Reorder full-screen pixels from rows into the order the panel scans them """
+    return [pixels[y * width + x] for x in reversed(range(width)) for y in range(height)]
+
+
+def encode_raw(pixels):
+    if len(pixels) % 2:
+        pixels = pixels + [0]
+    return [pixels[i] | (pixels[i + 1] << 16) for i in range(0, len(pixels), 2)]
+
+
+def encode_rle(pixels):
+    words = []
+    i = 0
+    while i < len(pixels):
+        run = 1
+        while i + run < len(pixels) and run < MAX_RUN and pixels[i + run] == pixels[i]:
+            run += 1
+        words.append(pixels[i] | ((run - 1) << 16))
+        i += run
+    return words
+
+
+def encode(width, height, pixels, rle=False):
+    """ The header and pixel words of an image """
+    if (width, height) == (WIDTH, HEIGHT):
+        pixels = scan_order(width, height, pixels)
+        if rle:
+            words = encode_rle(pixels)
+            if len(words) < len(pixels) // 2:
+                return [len(words) | RLE] + words
+    words = encode_raw(pixels)
+    return [len(words)] + words
+
+
+def pack(images):
+    """
+    Pack encoded images, a list of (width, height, words), after an index table, returning the words and
+    the byte offset of each image's header
+    """
+    table = [MAGIC, len(images)]
+    offset = 4 * (2 + 3 * len(images))
+    body = []
+    offsets = []
+    for width, height, words in images:
+        offsets.append(offset)
+        table += [offset, width | (height << 16), words[0]]
+        body += words
+        offset += 4 * len(words)
+    return table + body, offsets
+
+
+def c_name(filename):
+    return "IMAGE_" + re.sub(r"\W", "_", os.path.splitext(os.path.basename(filename))[0]).upper()
+
+
+def write_header(filename, base, names, images, offsets):
+    with open(filename, "w") as f:
+        f.write("/* Generated by img2flash.py */\n")
+        f.write("#ifndef IMAGES_H\n#define IMAGES_H\n\n")
+        f.write(f"#define IMAGE_TABLE 0x{base:08x}\n")
+        for name, (width, height, _), offset in zip(names, images, offsets):
+            f.write(f"#define {name} 0x{base + offset:08x}\n")
+            f.write(f"#define {name}_WIDTH {width}\n")
+            f.write(f"#define {name}_HEIGHT {height}\n")
+        f.write("\n#endif\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack images into a flash image for the LCD")
+    parser.add_argument("images", nargs="+", help="PNG images to pack")
+    parser.add_argument("-o", "--output", required=True, help="flash image to write")
+    parser.add_argument("--base", type=lambda x: int(x, 0), default=0x100000,
+                        help="flash address of the index table")
+    parser.add_argument("--rle", action="store_true", help="run-length encode full-screen images")
+    parser.add_argument("--bios", help="firmware image to place before the images, for a whole flash image")
+    parser.add_argument("--header", help="C header of image addresses to write")
+    args = parser.parse_args()
+
+    if args.base % 4:
+        parser.error("the base address must be word aligned")
+
+    images = []
+    for filename in args.images:
+        width, height, pixels = load_png(filename)
+        images.append((width, height, encode(width, height, pixels, args.rle)))
+    words, offsets = pack(images)
+    data = struct.pack(f"<{len(words)}I", *words)
+
+    if args.bios:
+        with open(args.bios, "rb") as f:
+            bios = f.read()
+        if len(bios) > args.base:
+            sys.exit(f"{args.bios} is {len(bios)} bytes, overlapping the images at 0x{args.base:x}")
+        data = bios + bytes(args.base - len(bios)) + data
+
+    with open(args.output, "wb") as f:
+        f.write(data)
+
+    names = [c_name(filename) for filename in args.images]
+    for name, (width, height, words), offset in zip(names, images, offsets):
+        kind = "RLE" if words[0] & RLE else "raw"
+        print(f"{name}: {width}x{height} {kind}, {4 * len(words)} bytes at 0x{args.base + offset:08x}")
+    if args.header:
+        write_header(args.header, args.base, names, images, offsets)
+
+
+if __name__ == "__main__":
+    main()
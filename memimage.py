@@ -0,0 +1,130 @@
+"""
+Load the initial contents of memories: firmware images, fonts and init sequences.
+
+Images are read as a list of words, from a raw binary (little-endian), the $readmemh or $readmemb text
+used by the Verilog originals, or the loadable segments of an ELF file, laid out from the lowest. Files
+are read whole and parsed once per build: the words are cached on the path, modification time and
+size, so elaborating several SoC variants, or a SoC several times, does not parse them again.
+"""
+import array
+import os
+import struct
+import sys
+import warnings
+
+FORMATS = ("bin", "hex", "bin-text", "elf")
+
+ELF_MAGIC = b"\x7fELF"
+PT_LOAD = 1
+
+_TYPECODES = {8: "B", 16: "H", 32: "I"}
+_cache = {}
+
+
+def guess_format(filename, data):
+    if data.startswith(ELF_MAGIC):
+        return "elf"
+    ext = os.path.splitext(filename)[1]
+    if ext == ".hex":
+        return "hex"
+    if ext == ".mem":
+        raise ValueError(f"{filename}: give the format of .mem files, hex or bin-text")
+    return "bin"
+
+
+def parse_binary(data, width):
+    """ Little-endian words of width bits, the last padded with zeroes """
+    if width not in _TYPECODES:
+        raise ValueError(f"Binary images of {width}-bit words are not supported")
+    size = width // 8
+    if len(data) % size:
+        data += bytes(size - len(data) % size)
+    words = array.array(_TYPECODES[width])
+    words.frombytes(memoryview(data))
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tolist()
+
+
+def parse_text(data, base):
+    """ $readmemh or $readmemb text: values separated by white space, comments, and @address directives """
+    words = []
+    addr = 0
+    for line in data.decode().splitlines():
+        line = line.split("//", 1)[0]
+        for token in line.split():
+            if token.startswith("@"):
+                addr = int(token[1:], 16)
+                continue
+            if addr > len(words):
+                words += [0] * (addr - len(words))
+            value = int(token.replace("_", ""), base)
+            if addr == len(words):
+                words.append(value)
+            else:
+                words[addr] = value
+            addr += 1
+    return words
+
+
+def parse_elf(data, width):
+    """ The loadable segments of a 32-bit little-endian ELF file, laid out from the lowest physical address """
+    if data[4] != 1 or data[5] != 1:
+        raise ValueError("Only 32-bit little-endian ELF files are supported")
+    phoff, = struct.unpack_from("<I", data, 28)
+    phentsize, phnum = struct.unpack_from("<HH", data, 42)
+    segments = []
+    for i in range(phnum):
+        p_type, p_offset, _, p_paddr, p_filesz = struct.unpack_from("<5I", data, phoff + i * phentsize)
+        if p_type == PT_LOAD and p_filesz:
+            segments.append((p_paddr, p_offset, p_filesz))
+    if not segments:
+        return []
+    base = min(paddr for paddr, _, _ in segments)
+    image = bytearray(max(paddr + size for paddr, _, size in segments) - base)
+    view = memoryview(data)
+    for paddr, offset, size in segments:
+        image[paddr - base:paddr - base + size] = view[offset:offset + size]
+    return parse_binary(bytes(image), width)
+
+
+def _load(filename, width, fmt):
+    stat = os.stat(filename)
+    key = (os.path.realpath(filename), stat.st_mtime_ns, stat.st_size, width, fmt)
+    if key not in _cache:
+        with open(filename, "rb") as f:
+            data = f.read()
+        fmt = fmt or guess_format(filename, data)
+        if fmt == "bin":
+            words = parse_binary(data, width)
+        elif fmt == "hex":
+            words = parse_text(data, 16)
+        elif fmt == "bin-text":
+            words = parse_text(data, 2)
+        elif fmt == "elf":
+            words = parse_elf(data, width)
+        else:
+            raise ValueError(f"Unknown image format {fmt}, not one of {', '.join(FORMATS)}")
+        _cache[key] = tuple(words)
+    return _cache[key]
+
+
+def read_image(filename, width=32, depth=None, fmt=None):
+    """
+    Read a memory image of width-bit words, in fmt, one of FORMATS, or guessed from the file. With a
+    depth, the image is padded with zeroes to it, and must fit.
+    """
+    words = list(_load(filename, width, fmt))
+    if depth is not None:
+        if len(words) > depth:
+            raise ValueError(f"{filename} is {len(words)} words, more than the {depth} of the memory")
+        words += [0] * (depth - len(words))
+    return words
+
+
+def read_firmware(filename, depth=None):
+    """ Read a firmware image of 32-bit words, leaving the ROM empty if it is not built yet """
+    if not os.path.exists(filename):
+        warnings.warn(f"{filename} not found, ROM left empty")
+        return []
+    return read_image(filename, depth=depth)
@@ -0,0 +1,196 @@
+from amaranth import *
+
+from amaranth_soc import wishbone
+
+from amaranth_orchard.base.peripheral import Peripheral
+
+# Descriptor flags
+DMA_SRC_FIXED = 0  # Read every word from the same address, e.g. a peripheral data register
+DMA_DST_FIXED = 1  # Write every word to the same address, e.g. a UART or LCD CSR
+DMA_FILL      = 2  # Write the src word itself, rather than reading from src
+DMA_IRQ       = 3  # Flag done when this descriptor completes, not just at the end of the chain
+
+DESC_WORDS = 6
+
+
+class DMAPeripheral(Peripheral, Elaboratable):
+    """
+    Scatter-gather DMA engine: a Wishbone master that works through a chain of descriptors in memory.
+
+    Each descriptor is six words: next (address of the next descriptor, or 0 to end the chain), src,
+    dst, len (in bytes, a multiple of 4), flags and wait. If wait is not 0, the engine reads that address
+    before each word until it is non-zero, which paces transfers to a peripheral's ready register.
+
+    Writing the address of the first descriptor to desc and then 1 to bit 0 of ctrl starts the chain.
+    Bit 1 of ctrl enables the interrupt, raised while done is set, and bit 2 clears done.
+    status has busy in bit 0, done in bit 1 and a bus error in bit 2.
+    """
+    def __init__(self, **kwargs):
+        super().__init__()
+
+        bank            = self.csr_bank()
+        self.desc       = bank.csr(32, "w")
+        self.ctrl       = bank.csr(3, "w")
+        self.status     = bank.csr(3, "r")
+
+        self._bridge    = self.bridge(data_width=32, granularity=8, alignment=2)
+        self.bus        = self._bridge.bus
+
+        # The master bus, to add to the arbiter
+        self.dma_bus    = wishbone.Interface(addr_width=30, data_width=32, granularity=8, features={"err"})
+
+        self.irq        = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.bridge  = self._bridge
+
+        bus = self.dma_bus
+
+        first   = Signal(32)
+        ptr     = Signal(32)
+        idx     = Signal(range(DESC_WORDS))
+        nxt     = Signal(32)
+        src     = Signal(32)
+        dst     = Signal(32)
+        length  = Signal(32)
+        flags   = Signal(32)
+        wait    = Signal(32)
+        data    = Signal(32)
+
+        busy    = Signal()
+        done    = Signal()
+        error   = Signal()
+        irq_en  = Signal()
+
+        start = self.ctrl.w_stb & self.ctrl.w_data[0]
+
+        with m.If(self.desc.w_stb):
+            m.d.sync += first.eq(self.desc.w_data)
+
+        with m.If(self.ctrl.w_stb):
+            m.d.sync += irq_en.eq(self.ctrl.w_data[1])
+            with m.If(self.ctrl.w_data[2]):
+                m.d.sync += done.eq(0)
+
+        m.d.comb += [
+            bus.sel.eq(0b1111),
+            self.status.r_data.eq(Cat(busy, done, error)),
+            self.irq.eq(done & irq_en)
+        ]
+
+        def bus_error():
+            # Abandon the chain
+            with m.If(bus.err):
+                m.d.sync += [error.eq(1), done.eq(1)]
+                m.next = "IDLE"
+
+        def next_word():
+            # Wait for the peripheral, or go straight to the transfer
+            with m.If(wait != 0):
+                m.next = "POLL"
+            with m.Elif(flags[DMA_FILL]):
+                m.d.sync += data.eq(src)
+                m.next = "WRITE"
+            with m.Else():
+                m.next = "READ"
+
+        with m.FSM() as fsm:
+            m.d.comb += busy.eq(~fsm.ongoing("IDLE"))
+
+            with m.State("IDLE"):
+                with m.If(start):
+                    m.d.sync += [
+                        ptr.eq(first),
+                        idx.eq(0),
+                        done.eq(0),
+                        error.eq(0)
+                    ]
+                    m.next = "FETCH"
+
+            with m.State("FETCH"):
+                m.d.comb += [
+                    bus.cyc.eq(1),
+                    bus.stb.eq(1),
+                    bus.adr.eq(ptr[2:] + idx)
+                ]
+                with m.If(bus.ack):
+                    with m.Switch(idx):
+                        for i, field in enumerate([nxt, src, dst, length, flags, wait]):
+                            with m.Case(i):
+                                m.d.sync += field.eq(bus.dat_r)
+                    m.d.sync += idx.eq(idx + 1)
+                    with m.If(idx == DESC_WORDS - 1):
+                        m.next = "CHECK"
+                bus_error()
+
+            with m.State("CHECK"):
+                with m.If(length[2:] == 0):
+                    m.next = "NEXT"
+                with m.Else():
+                    next_word()
+
+            with m.State("POLL"):
+                m.d.comb += [
+                    bus.cyc.eq(1),
+                    bus.stb.eq(1),
+                    bus.adr.eq(wait[2:])
+                ]
+                with m.If(bus.ack & (bus.dat_r != 0)):
+                    with m.If(flags[DMA_FILL]):
+                        m.d.sync += data.eq(src)
+                        m.next = "WRITE"
+                    with m.Else():
+                        m.next = "READ"
+                bus_error()
+
+            with m.State("READ"):
+                m.d.comb += [
+                    bus.cyc.eq(1),
+                    bus.stb.eq(1),
+                    bus.adr.eq(src[2:])
+                ]
+                with m.If(bus.ack):
+                    m.d.sync += data.eq(bus.dat_r)
+                    m.next = "WRITE"
+                bus_error()
+
+            with m.State("WRITE"):
+                m.d.comb += [
+                    bus.cyc.eq(1),
+                    bus.stb.eq(1),
+                    bus.we.eq(1),
+                    bus.adr.eq(dst[2:]),
+                    bus.dat_w.eq(data)
+                ]
+                with m.If(bus.ack):
+                    m.d.sync += length.eq(length - 4)
+                    with m.If(~flags[DMA_SRC_FIXED] & ~flags[DMA_FILL]):
+                        m.d.sync += src.eq(src + 4)
+                    with m.If(~flags[DMA_DST_FIXED]):
+                        m.d.sync += dst.eq(dst + 4)
+                    with m.If(length[2:] == 1):
+                        m.next = "NEXT"
+                    with m.Elif(wait != 0):
+                        m.next = "POLL"
+                    with m.Elif(flags[DMA_FILL]):
+                        # Keep writing the same word
+                        m.next = "WRITE"
+                    with m.Else():
+                        m.next = "READ"
+                bus_error()
+
+            with m.State("NEXT"):
+                with m.If(flags[DMA_IRQ]):
+                    m.d.sync += done.eq(1)
+                with m.If(nxt == 0):
+                    m.d.sync += done.eq(1)
+                    m.next = "IDLE"
+                with m.Else():
+                    m.d.sync += [
+                        ptr.eq(nxt),
+                        idx.eq(0)
+                    ]
+                    m.next = "FETCH"
+
+        return m
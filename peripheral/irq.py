@@ -0,0 +1,54 @@
+from amaranth import *
+
+from amaranth_orchard.base.peripheral import Peripheral
+
+
+class InterruptController(Peripheral, Elaboratable):
+    """
+    Aggregates level-sensitive peripheral interrupt lines into a single CPU interrupt.
+
+    pending shows the lines that are raised, enable masks them, and vector reads the number of the
+    lowest numbered line that is both pending and enabled, or all ones if there is none, so that
+    the trap handler can dispatch straight from it. Lines are cleared at their peripheral.
+    """
+    def __init__(self, n_irqs=32, **kwargs):
+        super().__init__()
+
+        self.n_irqs     = n_irqs
+
+        bank            = self.csr_bank()
+        self.pending    = bank.csr(n_irqs, "r")
+        self.enable     = bank.csr(n_irqs, "rw")
+        self.vector     = bank.csr(32, "r")
+
+        self._bridge    = self.bridge(data_width=32, granularity=8, alignment=2)
+        self.bus        = self._bridge.bus
+
+        self.irqs       = Signal(n_irqs)
+        self.irq        = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.bridge  = self._bridge
+
+        enable = Signal(self.n_irqs)
+        with m.If(self.enable.w_stb):
+            m.d.sync += enable.eq(self.enable.w_data)
+
+        active = Signal(self.n_irqs)
+        m.d.comb += active.eq(self.irqs & enable)
+
+        # Lowest numbered active line wins
+        vector = Signal(32, reset=0xffffffff)
+        for i in reversed(range(self.n_irqs)):
+            with m.If(active[i]):
+                m.d.comb += vector.eq(i)
+
+        m.d.comb += [
+            self.pending.r_data.eq(self.irqs),
+            self.enable.r_data.eq(enable),
+            self.vector.r_data.eq(vector),
+            self.irq.eq(active.any())
+        ]
+
+        return m
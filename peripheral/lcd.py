@@ -1,9 +1,51 @@
 from amaranth import *
+from amaranth.utils import bits_for
+from amaranth.lib.fifo import SyncFIFOBuffered, AsyncFIFO
+
+from amaranth_soc import wishbone
 
 from amaranth_orchard.base.peripheral import Peripheral
 
-from peripheral.st7789 import ST7789
-from readbin import readbin
+from peripheral.st7789 import ST7789, C_X_SIZE, C_Y_SIZE
+from fontc import read_font, glyph_map as font_glyph_map
+
+# The text grid: 30 columns of 8x16 glyphs across and 15 rows down the 240x240 panel
+COLS = 30
+ROWS = 15
+
+# Each cell's attribute: foreground and background palette indices and a font bank
+ATTR_FG = slice(0, 4)
+ATTR_BG = slice(4, 8)
+ATTR_BANK = slice(8, 10)
+ATTR_BITS = 10
+DEFAULT_ATTR = 0x001
+
+# A font bank is 256 glyphs of 16 rows, or fewer for a subset font from fontc.py
+CHARS = 256
+FONT_BANK_SIZE = 4096
+MAX_FONT_BANKS = 4
+
+# The 16 colour palette, in RGB565: black, white, then the CGA colours
+DEFAULT_PALETTE = [
+    0x0000, 0xffff, 0x0015, 0x0540, 0x0555, 0xa800, 0xa815, 0xaaa0,
+    0x52aa, 0x52bf, 0x57ea, 0x57ff, 0xfaaa, 0xfabf, 0xffea, 0xad55
+]
+
+# Hardware sprites, of up to 16x16 pixels, each row 16 pixels on from the last in the sprite memory
+SPRITES = 4
+SPRITE_WORDS = 1024
+
+# The framebuffer: 240x240 RGB565 pixels, two to a word, read in bursts of FB_BURST words
+FB_WORDS = 240 * 240 // 2
+FB_BURST = 8
+
+# An image header: the number of words of pixels following it, and whether they are run-length encoded
+IMAGE_WORDS = slice(0, 24)
+IMAGE_RLE = 31
+
+# Entries queued for the panel, and the stages of the pixel pipeline in flight behind the queue
+SPI_FIFO_DEPTH = 16
+PIPELINE_STAGES = 3
 
 
 class LcdPins(Record):
@@ -18,60 +60,789 @@ class LcdPins(Record):
         super().__init__(layout)
 
 
+def row_add(row, offset):
+    """ Add a row offset to a row, modulo the rows of the tile map """
+    total = row + offset
+    return Mux(total >= ROWS, total - ROWS, total)[:4]
+
+
+class Scan(Elaboratable):
+    """
+    Steps x, y through the pixels to send to the panel, in the order it scans them, one each cycle that
+    room is high, pulsing next_pixel for each and eof for the first pixel of a frame.
+
+    While continuous is high, whole frames are scanned one after another. Otherwise, at the end of the
+    frame it waits for a window from win_x0, win_y0 to win_x1, win_y1 (inclusive, in panel
+    coordinates), which is taken when win_valid and win_ready are both high. Starting a window, or
+    going back to whole frames, pulses start rather than next_pixel, with the window in window as
+    x0 | y0 << 8 | x1 << 16 | y1 << 24, to send to the panel before its pixels.
+    """
+    def __init__(self):
+        self.room = Signal()
+        self.x = Signal(8)
+        self.y = Signal(8)
+        self.next_pixel = Signal()
+        self.eof = Signal()
+        self.start = Signal()
+        self.window = Signal(32)
+        self.continuous = Signal(reset=1)
+        self.win_x0 = Signal(8)
+        self.win_y0 = Signal(8)
+        self.win_x1 = Signal(8)
+        self.win_y1 = Signal(8)
+        self.win_valid = Signal()
+        self.win_ready = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # The window being scanned, initially the whole frame set up by the panel's init sequence
+        x0 = Signal(8)
+        y0 = Signal(8)
+        x1 = Signal(8, reset=C_X_SIZE - 1)
+        y1 = Signal(8, reset=C_Y_SIZE - 1)
+
+        m.d.comb += self.eof.eq(self.next_pixel & (self.x == 0) & (self.y == 0))
+
+        with m.FSM():
+            with m.State("PIXELS"):
+                with m.If(self.room):
+                    m.d.comb += self.next_pixel.eq(1)
+                    with m.If(self.x == x1):
+                        m.d.sync += self.x.eq(x0)
+                        with m.If(self.y == y1):
+                            m.d.sync += self.y.eq(y0)
+                            with m.If(~self.continuous):
+                                m.next = "IDLE"
+                        with m.Else():
+                            m.d.sync += self.y.eq(self.y + 1)
+                    with m.Else():
+                        m.d.sync += self.x.eq(self.x + 1)
+            with m.State("IDLE"):  # Wait for a window, or to go back to whole frames
+                m.d.comb += self.win_ready.eq(~self.continuous & self.room)
+                with m.If(self.room & self.continuous):
+                    m.d.comb += [
+                        self.start.eq(1),
+                        self.window.eq(Cat(Const(0, 8), Const(0, 8), Const(C_X_SIZE - 1, 8), Const(C_Y_SIZE - 1, 8)))
+                    ]
+                    m.d.sync += [
+                        x0.eq(0), y0.eq(0), x1.eq(C_X_SIZE - 1), y1.eq(C_Y_SIZE - 1),
+                        self.x.eq(0), self.y.eq(0)
+                    ]
+                    m.next = "PIXELS"
+                with m.Elif(self.room & self.win_valid):
+                    m.d.comb += [
+                        self.start.eq(1),
+                        self.window.eq(Cat(self.win_x0, self.win_y0, self.win_x1, self.win_y1))
+                    ]
+                    m.d.sync += [
+                        x0.eq(self.win_x0), y0.eq(self.win_y0),
+                        x1.eq(self.win_x1), y1.eq(self.win_y1),
+                        self.x.eq(self.win_x0), self.y.eq(self.win_y0)
+                    ]
+                    m.next = "PIXELS"
+
+        return m
+
+
 class LcdPeripheral(Peripheral, Elaboratable):
-    def __init__(self, pins, font_file="peripheral/font_bizcat8x16.mem", **kwargs):
+    """
+    Text display on an ST7789 panel, drawing each cell of a 30x15 tile map from an 8x16 font.
+
+    Each cell has an attribute as well as a character: foreground and background indices into a 16
+    colour palette, in bits 0-3 and 4-7, and a font bank in bits 8-9. Cells written take the
+    attribute last written to attr. Writing palette sets an entry, to bits 0-15 for the entry in
+    bits 16-19; color sets entry 1, the foreground of the default attribute. Cells past the end of
+    their row are drawn in entry 0. font_file is a font, or a list of up to four, one per bank.
+    Fonts compiled by fontc.py to a subset of the characters only take font ROM for those glyphs, with
+    each cell written holding the index of its glyph, found from a map of the characters.
+
+    Four sprites are drawn over the text or framebuffer, from RGB565 images in a 1024 pixel sprite
+    memory, loaded by writing the address to sprite_addr and then the pixels to sprite_data, which
+    steps the address. The registers of the sprite selected by writing sprite are sprite_pos, as
+    x | y << 8 in pixels from the top left, sprite_size, as w | h << 8 of up to 16x16 pixels, with
+    0 hiding it, sprite_src, the address in sprite memory of its top left pixel, with each row 16 pixels
+    on, and sprite_key, its transparent colour. Where sprites overlap, the lowest numbered is drawn,
+    with the layer beneath it showing through its transparent pixels.
+
+    Writing ch puts a character in the cell at x, y. Writing console puts it at the console cursor
+    instead, which then advances, wrapping at the end of the row, with newline moving to the next row,
+    carriage return to the start of the row and form feed clearing the screen. Writing x or y moves
+    the cursor too.
+
+    scroll is the tile map row shown at the top of the screen. Rows are scrolled by changing it rather
+    than by moving the tile map, so when the console moves past the bottom row it steps scroll and
+    blanks the row brought in, in a cycle. Blanking works by keeping a valid bit for each cell, set when
+    it is written, and a flag for each row, cleared to blank it. The first write to a blanked row clears
+    the valid bits of its other cells, so cells are only drawn once written since the row was blanked.
+
+    Setting bit 0 of refresh sends the panel only the parts of the screen that have changed, rather
+    than whole frames continuously: the text rows written to, all of them when the screen scrolls or
+    the palette changes, and the rectangle last written to rect, as x0 | y0 << 8 | x1 << 16 | y1 << 24
+    in pixels from the top left, inclusive. dirty has a bit for each text row still to be sent, and
+    bit 15 for the rectangle.
+
+    If framebuffer is set, fb_bus is a Wishbone master that can instead fetch the pixels from a
+    240x240 RGB565 framebuffer in memory, such as HyperRAM, in bursts of sequential reads. The pixels
+    are stored in the order the panel scans them, 240 down each column from the right-hand column.
+    Writing a buffer's address to fb_addr shows it from the next frame: the fetch switches to it when it
+    finishes the current frame, after which the old buffer is free to draw into, and the swap pending
+    bit 0 of fb_status clears. Bit 0 of fb_ctrl enables the framebuffer from the next frame, and bit 1
+    the interrupt, raised while no swap is pending. Bit 1 of fb_status flags a fetch that could not
+    keep up, and is cleared by writing fb_ctrl.
+
+    Writing the address of an image header to image instead enables the framebuffer and shows the
+    image from the next frame, in the same way, so a full-screen image in HyperFlash costs a single
+    write. The header word has the number of words of pixels that follow it in bits 0-23, and bit 31
+    set if they are run-length encoded, each word a pixel in bits 0-15 repeated the number of times
+    in bits 16-31, plus one, rather than two pixels (see img2flash.py).
+
+    The pixels are looked up in a pipeline, registering the tile map and font reads, and queued for the
+    SPI serializer. That can run in a faster clock domain, spi_domain at spi_clk_freq, to drive the panel
+    at up to half that frequency, with the queue crossing into it.
+    """
+    def __init__(self, pins, font_file="peripheral/font_bizcat8x16.mem", clk_freq=None, fast_init=False,
+                 framebuffer=False, spi_domain="sync", spi_clk_freq=None, **kwargs):
         super().__init__()
 
         self.pins       = pins
         self.font_file  = font_file
+        self.clk_freq   = clk_freq
+        self.fast_init  = fast_init
+        self.framebuffer = framebuffer
+        self.spi_domain = spi_domain
+        self.spi_clk_freq = spi_clk_freq if spi_domain != "sync" else clk_freq
 
         bank            = self.csr_bank()
         self.ch         = bank.csr(8, "w")
         self.x          = bank.csr(8, "w")
         self.y          = bank.csr(8, "w")
         self.color      = bank.csr(16, "w")
+        self.console    = bank.csr(8, "w")
+        self.scroll     = bank.csr(4, "rw")
+        self.cursor     = bank.csr(16, "r")
+        self.refresh    = bank.csr(1, "w")
+        self.rect       = bank.csr(32, "w")
+        self.dirty      = bank.csr(16, "r")
+        self.attr       = bank.csr(ATTR_BITS, "w")
+        self.palette    = bank.csr(20, "w")
+        self.sprite     = bank.csr(2, "w")
+        self.sprite_pos = bank.csr(16, "w")
+        self.sprite_size = bank.csr(16, "w")
+        self.sprite_src = bank.csr(10, "w")
+        self.sprite_key = bank.csr(16, "w")
+        self.sprite_addr = bank.csr(10, "w")
+        self.sprite_data = bank.csr(16, "w")
+        if framebuffer:
+            self.fb_addr    = bank.csr(32, "w")
+            self.fb_ctrl    = bank.csr(2, "w")
+            self.fb_status  = bank.csr(2, "r")
+            self.image      = bank.csr(32, "w")
 
         self._bridge    = self.bridge(data_width=32, granularity=8, alignment=2)
         self.bus        = self._bridge.bus
 
+        if framebuffer:
+            # The master bus, to add to the arbiter
+            self.fb_bus = wishbone.Interface(addr_width=30, data_width=32, granularity=8)
+            self.irq    = Signal()
+
     def elaborate(self, platform):
         m = Module()
         m.submodules.bridge  = self._bridge
 
-        m.submodules.lcd = lcd = ST7789(reset_delay=10000, reset_period=10000)
+        if self.fast_init:
+            # Skip the reset and initialisation delays in simulation
+            lcd = ST7789(reset_delay=1, reset_period=1, clk_freq=self.spi_clk_freq, init_delays=False)
+        else:
+            lcd = ST7789(reset_delay=10000, reset_period=10000, clk_freq=self.spi_clk_freq)
+
+        # The queue of pixels and windows for the panel, crossing into the serializer's domain
+        if self.spi_domain == "sync":
+            m.submodules.lcd = lcd
+            m.submodules.spi_fifo = spi_fifo = SyncFIFOBuffered(width=33, depth=SPI_FIFO_DEPTH)
+            level = spi_fifo.level
+        else:
+            m.submodules.lcd = DomainRenamer(self.spi_domain)(lcd)
+            m.submodules.spi_fifo = spi_fifo = AsyncFIFO(width=33, depth=SPI_FIFO_DEPTH,
+                                                         r_domain=self.spi_domain, w_domain="sync")
+            level = spi_fifo.w_level
 
         m.d.comb += [
             self.pins.resn.eq(lcd.spi_resn),
             self.pins.csn.eq(lcd.spi_csn),
             self.pins.dc.eq(lcd.spi_dc),
             self.pins.sclk.eq(lcd.spi_clk),
-            self.pins.copi.eq(lcd.spi_mosi)
+            self.pins.copi.eq(lcd.spi_mosi),
+            lcd.data.eq(spi_fifo.r_data[:32]),
+            lcd.cmd.eq(spi_fifo.r_data[32]),
+            lcd.valid.eq(spi_fifo.r_rdy),
+            spi_fifo.r_en.eq(lcd.ready)
         ]
 
+        # Scan a pixel into the pipeline while the queue has room for it and those already in it, allowing
+        # for the AsyncFIFO's w_level lagging a cycle behind its writes
+        m.submodules.scan = scan = Scan()
+        m.d.comb += scan.room.eq(level < SPI_FIFO_DEPTH - PIPELINE_STAGES)
+
+        # Read in the fonts. A subset font's cells hold the index of their glyph rather than the character
+        font, glyph_map, bank_bits = self.read_fonts()
+        font_data = Memory(width=8, depth=len(font), init=font)
+        m.submodules.fr = fr = font_data.read_port()
+        cell_bits = 8 if glyph_map is None else bits_for(len(font) // 16 - 1)
+
         # Create the tile map
-        tile_data = Memory(width=8, depth=30 * 15)
+        tile_data = Memory(width=cell_bits, depth=COLS * ROWS)
         m.submodules.tr = tr = tile_data.read_port()
         m.submodules.tw = tw = tile_data.write_port()
 
-        # Read in the font
-        font = readbin(self.font_file)
-        font_data = Memory(width=8, depth=4096, init=font)
-        m.submodules.fr = fr = font_data.read_port()
+        # And the attributes of the cells alongside it
+        attr_data = Memory(width=ATTR_BITS, depth=COLS * ROWS)
+        m.submodules.ar = ar = attr_data.read_port()
+        m.submodules.aw = aw = attr_data.write_port()
+
+        # The attribute of cells written, and the palette
+        attr = Signal(ATTR_BITS, reset=DEFAULT_ATTR)
+        palette = Array(Signal(16, reset=c, name=f"palette{i}") for i, c in enumerate(DEFAULT_PALETTE))
+
+        with m.If(self.attr.w_stb):
+            m.d.sync += attr.eq(self.attr.w_data)
+        with m.If(self.palette.w_stb):
+            m.d.sync += palette[self.palette.w_data[16:20]].eq(self.palette.w_data[:16])
+        with m.If(self.color.w_stb):
+            m.d.sync += palette[1].eq(self.color.w_data)
+
+        m.d.comb += [
+            aw.addr.eq(tw.addr),
+            aw.data.eq(attr),
+            aw.en.eq(tw.en)
+        ]
+
+        # The tile map row at the top of the screen, the tile map rows written to since they were blanked,
+        # and a valid bit for each cell of those rows, a word per row
+        scroll = Signal(4)
+        row_on = Array(Signal(name=f"row_on{i}") for i in range(ROWS))
+        valid_data = Memory(width=COLS, depth=ROWS)
+        m.submodules.vr = vr = valid_data.read_port()
+        m.submodules.vw = vw = valid_data.write_port(granularity=1)
+
+        with m.If(self.scroll.w_stb):
+            m.d.sync += scroll.eq(self.scroll.w_data)
+
+        # The screen rows to send to the panel, with a partial refresh
+        mark_row = Signal(ROWS)
+        mark_all = Signal()
+
+        with m.If(self.scroll.w_stb | self.color.w_stb | self.palette.w_stb):
+            m.d.comb += mark_all.eq(1)
+
+        # The cell written and its character, and whether its row is being blanked
+        cell_row = Signal(4)
+        cell_col = Signal(8)
+        cell_addr = Signal.like(tw.addr)
+        cell_ch = Signal(8)
+        cell_en = Signal()
+        cell_blank = Signal()
+        m.d.comb += cell_addr.eq(cell_row * COLS + cell_col)
+        if glyph_map is None:
+            m.d.comb += [
+                tw.addr.eq(cell_addr),
+                tw.data.eq(cell_ch),
+                tw.en.eq(cell_en)
+            ]
+        else:
+            # Look up the glyph of the character in its bank, and write it a cycle later
+            glyph_data = Memory(width=cell_bits, depth=len(glyph_map), init=glyph_map)
+            m.submodules.gr = gr = glyph_data.read_port()
+            m.d.comb += [
+                gr.addr.eq(Cat(cell_ch, attr[ATTR_BANK][:bank_bits])),
+                tw.data.eq(gr.data)
+            ]
+            m.d.sync += [
+                tw.addr.eq(cell_addr),
+                tw.en.eq(cell_en)
+            ]
+
+        # Direct writes to the cell at x, y on the screen
+        row = row_add(self.y.w_data[:4], scroll)
+        with m.If(self.ch.w_stb):
+            m.d.comb += [
+                mark_row.eq(1 << self.y.w_data[:4]),
+                cell_row.eq(row),
+                cell_col.eq(self.x.w_data),
+                cell_ch.eq(self.ch.w_data),
+                cell_en.eq(1)
+            ]
 
+        # Console writes at the cursor, cx, cy on the screen
+        cx = Signal(range(COLS + 1))
+        cy = Signal(range(ROWS))
+        c = self.console.w_data
+        printable = c >= 0x20
+        # A newline, or a character past the end of the row
+        newline = Signal()
+        bottom = Signal()
+        new_scroll = Signal(4)
+        new_cy = Signal.like(cy)
+        new_cx = Signal.like(cx)
+        m.d.comb += [
+            newline.eq((c == ord("\n")) | (printable & (cx == COLS))),
+            bottom.eq(newline & (cy == ROWS - 1)),
+            new_scroll.eq(Mux(bottom, row_add(scroll, 1), scroll)),
+            new_cy.eq(Mux(newline & ~bottom, cy + 1, cy)),
+            new_cx.eq(Mux(newline, 0, cx)),
+            self.cursor.r_data.eq(Cat(cx, Const(0, 8 - len(cx)), cy)),
+            self.scroll.r_data.eq(scroll)
+        ]
+        console_row = row_add(new_cy, new_scroll)
+
+        with m.If(self.x.w_stb):
+            m.d.sync += cx.eq(self.x.w_data)
+        with m.If(self.y.w_stb):
+            m.d.sync += cy.eq(self.y.w_data)
+
+        with m.If(self.console.w_stb):
+            with m.If(c == ord("\f")):
+                m.d.comb += mark_all.eq(1)
+                m.d.sync += [cx.eq(0), cy.eq(0), scroll.eq(0)]
+                m.d.sync += [on.eq(0) for on in row_on]
+            with m.Elif(c == ord("\r")):
+                m.d.sync += cx.eq(0)
+            with m.Elif(newline | printable):
+                m.d.sync += [cx.eq(new_cx), cy.eq(new_cy), scroll.eq(new_scroll)]
+                with m.If(bottom):
+                    # The row brought in at the bottom is the old top row
+                    m.d.comb += [
+                        mark_all.eq(1),
+                        cell_blank.eq(1)
+                    ]
+                    m.d.sync += row_on[scroll].eq(0)
+                with m.If(printable):
+                    m.d.comb += [
+                        mark_row.eq(1 << new_cy),
+                        cell_row.eq(console_row),
+                        cell_col.eq(new_cx),
+                        cell_ch.eq(c),
+                        cell_en.eq(1)
+                    ]
+                    m.d.sync += cx.eq(new_cx + 1)
+
+        # Mark the cell written valid, first clearing the rest of its row if the row is blank. This follows
+        # the blanking above, so a row blanked and written in the same cycle is left on
+        with m.If(cell_en):
+            fresh = cell_blank | ~row_on[cell_row]
+            m.d.comb += [
+                vw.addr.eq(cell_row),
+                vw.data.eq(Mux(fresh, 1 << cell_col, (1 << COLS) - 1)),
+                vw.en.eq(Mux(fresh, (1 << COLS) - 1, 1 << cell_col))
+            ]
+            m.d.sync += row_on[cell_row].eq(1)
+
+        # First stage: look up the tile at the scan position. Text rows run down the panel's x and
+        # columns along its reversed y
         y = Signal(8)
+        scan_row = Signal(4)
+        m.d.comb += [
+            y.eq(239 - scan.y),
+            scan_row.eq(row_add(scan.x[4:], scroll)),
+            tr.addr.eq(scan_row * COLS + y[3:]),
+            ar.addr.eq(tr.addr),
+            vr.addr.eq(scan_row)
+        ]
+
+        # Second stage: look up the glyph row of the tile
+        valid1   = Signal()
+        start1   = Signal()
+        window1  = Signal(32)
+        line1    = Signal(4)
+        bit1     = Signal(3)
+        row_on1  = Signal()
+        col1     = Signal(5)
+        m.d.sync += [
+            valid1.eq(scan.next_pixel | scan.start),
+            start1.eq(scan.start),
+            window1.eq(scan.window),
+            line1.eq(scan.x[:4]),
+            bit1.eq(~y[:3]),
+            row_on1.eq(row_on[scan_row]),
+            col1.eq(y[3:])
+        ]
+        if glyph_map is None:
+            m.d.comb += fr.addr.eq(Cat(line1, tr.data, ar.data[ATTR_BANK][:bank_bits]))
+        else:
+            m.d.comb += fr.addr.eq(Cat(line1, tr.data))
+
+        # Third stage: pick the pixel from the glyph row, and queue it
+        valid2   = Signal()
+        start2   = Signal()
+        window2  = Signal(32)
+        bit2     = Signal(3)
+        visible2 = Signal()
+        fg2      = Signal(4)
+        bg2      = Signal(4)
+        m.d.sync += [
+            valid2.eq(valid1),
+            start2.eq(start1),
+            window2.eq(window1),
+            bit2.eq(bit1),
+            visible2.eq(row_on1 & vr.data.bit_select(col1, 1)),
+            fg2.eq(ar.data[ATTR_FG]),
+            bg2.eq(ar.data[ATTR_BG])
+        ]
+
+        # The sprites, looked up alongside the tiles, a stage behind
+        sprite_on, sprite_pixel = self.elaborate_sprites(m, y, scan.x, mark_row)
+
+        under = Signal(16)
+        color = Signal(16)
+        text_color = palette[Mux(visible2, Mux(fr.data.bit_select(bit2, 1), fg2, bg2), 0)]
+        if self.framebuffer:
+            # The framebuffer pixel is fetched as the pixel is scanned, so is a stage ahead
+            fb_pixel, showing, fb_enable = self.elaborate_framebuffer(m, scan)
+            fb_pixel2 = Signal(16)
+            showing2  = Signal()
+            m.d.sync += [fb_pixel2.eq(fb_pixel), showing2.eq(showing)]
+            m.d.comb += under.eq(Mux(showing2, fb_pixel2, text_color))
+        else:
+            fb_enable = 0
+            m.d.comb += under.eq(text_color)
+        m.d.comb += color.eq(Mux(sprite_on, sprite_pixel, under))
 
-        # Connect tilemap
         m.d.comb += [
-            tw.addr.eq(self.y.w_data * 30 + self.x.w_data),
-            tw.en.eq(self.ch.w_stb),
-            tw.data.eq(self.ch.w_data),
-            y.eq(239 - lcd.y),
-            tr.addr.eq(lcd.x[4:] * 30 + y[3:]),
-            fr.addr.eq(Cat(lcd.x[:4], tr.data)),
-            lcd.color.eq(Mux(fr.data.bit_select(~y[:3], 1), self.color.w_data, 0x0000))
+            spi_fifo.w_data.eq(Mux(start2, Cat(window2, 1), color)),
+            spi_fifo.w_en.eq(valid2)
         ]
 
+        self.elaborate_refresh(m, scan, mark_row, mark_all, fb_enable)
+
         return m
 
+    def read_fonts(self):
+        """
+        Read the fonts, returning the font ROM, the glyph of each character in each bank for subset
+        fonts or None, and the bits of the bank number
+        """
+        font_files = [self.font_file] if isinstance(self.font_file, str) else list(self.font_file)
+        if not 1 <= len(font_files) <= MAX_FONT_BANKS:
+            raise ValueError(f"Between 1 and {MAX_FONT_BANKS} font banks are supported, not {len(font_files)}")
+        bank_bits = bits_for(len(font_files) - 1) if len(font_files) > 1 else 0
+        fonts = [read_font(font_file) for font_file in font_files]
+
+        if all(codes == list(range(len(codes))) for codes, _ in fonts):
+            # Glyphs indexed by character, a whole bank each
+            font = []
+            for _, glyphs in fonts:
+                glyphs = glyphs[:FONT_BANK_SIZE]
+                font += glyphs + [0] * (FONT_BANK_SIZE - len(glyphs))
+            return font, None, bank_bits
+
+        # Only the glyphs of the subsets, one after another, with a map of each bank's characters to them
+        font = []
+        glyph_map = []
+        for codes, glyphs in fonts:
+            glyph_map += [len(font) // 16 + i for i in font_glyph_map(codes)]
+            font += glyphs
+        glyph_map += [0] * ((CHARS << bank_bits) - len(glyph_map))
+        return font, glyph_map, bank_bits
+
+    def elaborate_sprites(self, m, x, y, mark_row):
+        """
+        Add the sprites, given the screen position of the pixel scanned, and return whether a sprite
+        covers it and the sprite's pixel, two stages on
+        """
+        pos  = Array(Signal(16, name=f"sprite_pos{i}") for i in range(SPRITES))
+        size = Array(Signal(16, name=f"sprite_size{i}") for i in range(SPRITES))
+        src  = Array(Signal(range(SPRITE_WORDS), name=f"sprite_src{i}") for i in range(SPRITES))
+        key  = Array(Signal(16, name=f"sprite_key{i}") for i in range(SPRITES))
+
+        sprite_data = Memory(width=16, depth=SPRITE_WORDS)
+        m.submodules.sr = sr = sprite_data.read_port()
+        m.submodules.sw = sw = sprite_data.write_port()
+
+        # Load the sprite memory, stepping the address
+        addr = Signal(range(SPRITE_WORDS))
+        with m.If(self.sprite_addr.w_stb):
+            m.d.sync += addr.eq(self.sprite_addr.w_data)
+        with m.If(self.sprite_data.w_stb):
+            m.d.comb += [
+                sw.addr.eq(addr),
+                sw.data.eq(self.sprite_data.w_data),
+                sw.en.eq(1)
+            ]
+            m.d.sync += addr.eq(addr + 1)
+
+        def rows(pos, size):
+            """ The text rows a sprite covers, to send to the panel when it moves """
+            top, h = pos[8:16], size[8:16]
+            bottom = Signal(9)
+            m.d.comb += bottom.eq(top + h - 1)
+            return Cat((top[4:] <= r) & (r <= bottom[4:]) & (h != 0) for r in range(ROWS))
+
+        sel = Signal(range(SPRITES))
+        with m.If(self.sprite.w_stb):
+            m.d.sync += sel.eq(self.sprite.w_data)
+        with m.If(self.sprite_pos.w_stb):
+            m.d.sync += pos[sel].eq(self.sprite_pos.w_data)
+            m.d.comb += mark_row.eq(rows(pos[sel], size[sel]) | rows(self.sprite_pos.w_data, size[sel]))
+        with m.If(self.sprite_size.w_stb):
+            m.d.sync += size[sel].eq(self.sprite_size.w_data)
+            m.d.comb += mark_row.eq(rows(pos[sel], size[sel]) | rows(pos[sel], self.sprite_size.w_data))
+        with m.If(self.sprite_src.w_stb):
+            m.d.sync += src[sel].eq(self.sprite_src.w_data)
+            m.d.comb += mark_row.eq(rows(pos[sel], size[sel]))
+        with m.If(self.sprite_key.w_stb):
+            m.d.sync += key[sel].eq(self.sprite_key.w_data)
+            m.d.comb += mark_row.eq(rows(pos[sel], size[sel]))
+
+        # First stage: find the lowest numbered sprite covering the pixel
+        hit1  = Signal()
+        sel1  = Signal(range(SPRITES))
+        addr1 = Signal(range(SPRITE_WORDS))
+        m.d.sync += hit1.eq(0)
+        for i in reversed(range(SPRITES)):
+            dx = Signal(9, name=f"sprite_dx{i}")
+            dy = Signal(9, name=f"sprite_dy{i}")
+            m.d.comb += [
+                dx.eq(x - pos[i][0:8]),
+                dy.eq(y - pos[i][8:16])
+            ]
+            with m.If((dx < size[i][0:8]) & (dy < size[i][8:16])):
+                m.d.sync += [
+                    hit1.eq(1),
+                    sel1.eq(i),
+                    addr1.eq(src[i] + Cat(dx[:4], dy[:4]))
+                ]
+
+        # Second stage: read its pixel
+        hit2 = Signal()
+        sel2 = Signal(range(SPRITES))
+        m.d.comb += sr.addr.eq(addr1)
+        m.d.sync += [hit2.eq(hit1), sel2.eq(sel1)]
+
+        return hit2 & (sr.data != key[sel2]), sr.data
+
+    def elaborate_refresh(self, m, lcd, mark_row, mark_all, fb_enable):
+        """ Add the tracking of the changed parts of the screen, and send them to the panel as windows """
+        partial = Signal()
+        dirty = Signal(ROWS, reset=(1 << ROWS) - 1)
+        rect = Signal(32)
+        rect_pending = Signal()
+        taken = Signal(ROWS)
+
+        with m.If(self.refresh.w_stb):
+            m.d.sync += partial.eq(self.refresh.w_data[0])
+            # The screen may be out of date with the panel when partial refresh starts
+            m.d.comb += mark_all.eq(1)
+        with m.If(self.rect.w_stb):
+            m.d.sync += [rect.eq(self.rect.w_data), rect_pending.eq(1)]
+
+        # The first changed row
+        first = Signal(range(ROWS))
+        for i in reversed(range(ROWS)):
+            with m.If(dirty[i]):
+                m.d.comb += first.eq(i)
+
+        # Text rows run down the panel's x and columns along its reversed y
+        x0, y0, x1, y1 = rect[0:8], rect[8:16], rect[16:24], rect[24:32]
+        m.d.comb += [
+            self.dirty.r_data.eq(Cat(dirty, Const(0, 15 - ROWS), rect_pending)),
+            lcd.continuous.eq(~partial | fb_enable)
+        ]
+        with m.If(rect_pending):
+            m.d.comb += [
+                lcd.win_x0.eq(y0),
+                lcd.win_x1.eq(y1),
+                lcd.win_y0.eq(239 - x1),
+                lcd.win_y1.eq(239 - x0),
+                lcd.win_valid.eq(1)
+            ]
+            with m.If(lcd.win_ready):
+                m.d.sync += rect_pending.eq(0)
+        with m.Elif(dirty.any()):
+            m.d.comb += [
+                lcd.win_x0.eq(first << 4),
+                lcd.win_x1.eq((first << 4) + 15),
+                lcd.win_y0.eq(0),
+                lcd.win_y1.eq(239),
+                lcd.win_valid.eq(1)
+            ]
+            with m.If(lcd.win_ready):
+                m.d.comb += taken.eq(1 << first)
+
+        # A row changed as it is taken stays dirty
+        m.d.sync += dirty.eq(Mux(mark_all, (1 << ROWS) - 1, (dirty & ~taken) | mark_row))
+
+    def elaborate_framebuffer(self, m, lcd):
+        """ Add the framebuffer fetch, returning the pixel to show and whether to show it """
+        bus = self.fb_bus
+
+        enable   = Signal()
+        irq_en   = Signal()
+        underrun = Signal()
+        # Fetching, which starts at the end of a frame, and showing, from the end of the next
+        active   = Signal()
+        showing  = Signal()
+
+        # The buffer being fetched and its length, and the one to switch to at the end of the frame,
+        # which may be an image with a header to read first
+        base     = Signal(30)
+        length   = Signal(range(1 << 24), reset=FB_WORDS)
+        next_base = Signal(30)
+        next_image = Signal()
+        pending  = Signal()
+
+        # Whether the frame being fetched, and the one being shown, are run-length encoded. Words are
+        # queued with the format of their frame, for the swap to take effect in step
+        fetch_rle = Signal()
+        rle      = Signal()
+
+        with m.If(self.fb_ctrl.w_stb):
+            m.d.sync += [
+                enable.eq(self.fb_ctrl.w_data[0]),
+                irq_en.eq(self.fb_ctrl.w_data[1]),
+                underrun.eq(0)
+            ]
+        m.d.comb += [
+            self.fb_status.r_data.eq(Cat(pending, underrun)),
+            self.irq.eq(irq_en & active & ~pending)
+        ]
+
+        flush = Signal()
+        m.submodules.fb_fifo = fifo = ResetInserter(flush)(SyncFIFOBuffered(width=34, depth=2 * FB_BURST))
+
+        with m.If(~enable):
+            m.d.sync += [active.eq(0), showing.eq(0)]
+        with m.Elif(lcd.eof):
+            m.d.sync += [active.eq(1), showing.eq(active)]
+
+        # Fetch bursts of sequential words, while the FIFO has room for a whole burst
+        offset = Signal(range(1 << 24))
+        burst  = Signal(range(FB_BURST))
+        m.d.comb += [
+            bus.adr.eq(base + offset),
+            bus.sel.eq(0xf),
+            bus.we.eq(0),
+            # Each word is queued with the format of its frame and whether it is the frame's first
+            fifo.w_data.eq(Cat(bus.dat_r, fetch_rle, offset == 0))
+        ]
+
+        # The frames the fetch is ahead of the scan, kept to one so that a short run-length encoded frame
+        # is not queued many times over, delaying a swap
+        ahead  = Signal(2)
+        start  = Signal()
+        wrap   = Signal()
+        scanned = lcd.next_pixel & lcd.eof & active
+        with m.If(start):
+            m.d.sync += ahead.eq(1)
+        with m.Elif(wrap & ~scanned):
+            m.d.sync += ahead.eq(ahead + 1)
+        with m.Elif(~wrap & scanned):
+            m.d.sync += ahead.eq(ahead - 1)
+
+        def swap():
+            """ Switch to the next buffer, or read the header of the next image """
+            m.d.sync += [base.eq(next_base), pending.eq(0), offset.eq(0)]
+            with m.If(next_image):
+                m.next = "HEADER"
+            with m.Else():
+                m.d.sync += [length.eq(FB_WORDS), fetch_rle.eq(0)]
+                m.next = "IDLE"
+
+        with m.FSM():
+            with m.State("IDLE"):
+                m.d.comb += flush.eq(~active)
+                with m.If(enable & ~active & lcd.eof):
+                    # Start fetching the first frame
+                    m.d.comb += start.eq(1)
+                    swap()
+                with m.Elif(active & (fifo.level <= FB_BURST) & (ahead <= 1)):
+                    m.d.sync += burst.eq(0)
+                    m.next = "READ"
+            with m.State("HEADER"):
+                m.d.comb += [bus.cyc.eq(1), bus.stb.eq(1)]
+                with m.If(bus.ack):
+                    m.d.sync += [
+                        base.eq(base + 1),
+                        length.eq(bus.dat_r[IMAGE_WORDS]),
+                        fetch_rle.eq(bus.dat_r[IMAGE_RLE])
+                    ]
+                    m.next = "IDLE"
+            with m.State("READ"):
+                m.d.comb += [bus.cyc.eq(1), bus.stb.eq(1)]
+                with m.If(bus.ack):
+                    m.d.comb += fifo.w_en.eq(1)
+                    m.d.sync += [offset.eq(offset + 1), burst.eq(burst + 1)]
+                    with m.If(offset == length - 1):
+                        # The end of the frame, and the point the swap takes effect
+                        m.d.comb += wrap.eq(1)
+                        m.d.sync += offset.eq(0)
+                        m.next = "IDLE"
+                        with m.If(pending):
+                            swap()
+                    with m.Elif(burst == FB_BURST - 1):
+                        m.next = "IDLE"
+                with m.If(~enable):
+                    m.next = "IDLE"
+
+        # After the fetch, so that an address written as the frame ends is not lost
+        with m.If(self.fb_addr.w_stb):
+            m.d.sync += [next_base.eq(self.fb_addr.w_data[2:]), next_image.eq(0), pending.eq(1)]
+        with m.If(self.image.w_stb):
+            m.d.sync += [next_base.eq(self.image.w_data[2:]), next_image.eq(1), pending.eq(1), enable.eq(1)]
 
+        # Take a word for every two pixels scanned, or for every run. Each frame starts from the word queued
+        # as its first, dropping any left over from the last, so a decoder that has lost its place is back
+        # in step by the next frame. If the FIFO runs dry within a frame, the words missed are dropped when
+        # they arrive, but a run-length encoded frame cannot be followed past a missed run and is left blank.
+        word   = Signal(32)
+        pixel  = Signal(16)
+        second = Signal()
+        run    = Signal(16)
+        missed = Signal(4)
+        lost   = Signal()
+        first  = fifo.r_data[33]
+        with m.If(lcd.next_pixel & (showing | (active & lcd.eof))):
+            with m.If(lcd.eof):
+                # The decoder starts afresh, in the format of the frame's first word
+                m.d.sync += [second.eq(1), missed.eq(0)]
+                with m.If(fifo.r_rdy & first):
+                    m.d.comb += fifo.r_en.eq(1)
+                    m.d.sync += [
+                        lost.eq(0),
+                        rle.eq(fifo.r_data[32]),
+                        word.eq(fifo.r_data),
+                        pixel.eq(fifo.r_data[:16]),
+                        run.eq(fifo.r_data[16:32])
+                    ]
+                with m.Else():
+                    m.d.sync += [lost.eq(1), pixel.eq(0), underrun.eq(1)]
+            with m.Elif(lost):
+                m.d.sync += pixel.eq(0)
+            with m.Elif(rle):
+                m.d.sync += run.eq(run - 1)
+                with m.If(run == 0):
+                    with m.If(fifo.r_rdy & ~first):
+                        m.d.comb += fifo.r_en.eq(1)
+                        m.d.sync += [pixel.eq(fifo.r_data[:16]), run.eq(fifo.r_data[16:32])]
+                    with m.Else():
+                        m.d.sync += [lost.eq(1), pixel.eq(0), underrun.eq(1)]
+            with m.Else():
+                m.d.sync += second.eq(~second)
+                with m.If(~second):
+                    with m.If(fifo.r_rdy & ~first & (missed == 0)):
+                        m.d.comb += fifo.r_en.eq(1)
+                        m.d.sync += [word.eq(fifo.r_data), pixel.eq(fifo.r_data[:16])]
+                    with m.Else():
+                        m.d.sync += [pixel.eq(0), underrun.eq(1)]
+                        with m.If(missed != 0xf):
+                            m.d.sync += missed.eq(missed + 1)
+                with m.Else():
+                    m.d.sync += pixel.eq(word[16:])
+        with m.Elif(fifo.r_rdy & ~first & (lost | (missed != 0))):
+            m.d.comb += fifo.r_en.eq(1)
+            with m.If(missed != 0):
+                m.d.sync += missed.eq(missed - 1)
+        with m.If(~active):
+            m.d.sync += [missed.eq(0), lost.eq(0)]
 
+        return pixel, showing, enable
@@ -1,6 +1,8 @@
 from amaranth import *
 from amaranth.utils import bits_for
 
+from memimage import read_image
+
 C_COLOR_BITS = 16
 C_X_SIZE = 240
 C_Y_SIZE = 240
@@ -11,28 +13,28 @@ C_CLK_POLARITY = 1
 C_NOP = 0
 C_INIT_FILE = "peripheral/st7789_linit.mem"
 C_INIT_SIZE = 38
-
-
-def readhex(filename):
-    f = open(filename, "r")
-    l = []
-    while True:
-        s = f.readline()
-        if s:
-            if s[0] != "/":
-                l.append(int(s, 16))
-        else:
-            break
-    f.close()
-    return l
+# With the MADCTL of the init sequence, the 240 visible rows start at row address 80
+C_Y_OFFSET = 80
+C_CASET = 0x2A
+C_RASET = 0x2B
+C_RAMWR = 0x2C
 
 
 class ST7789(Elaboratable):
-    def __init__(self, reset_delay, reset_period=100000):
-        self.color = Signal(C_COLOR_BITS)
-        self.x = Signal(C_X_BITS)
-        self.y = Signal(C_Y_BITS)
-        self.next_pixel = Signal()
+    """
+    Drives an ST7789 panel over SPI, sending it a stream of entries taken when valid and ready are
+    both high, two clocks per bit, so sixteen per byte.
+
+    An entry with cmd low is a pixel, the RGB565 colour in bits 0 to 15 of data. An entry with cmd high
+    starts a window, from data as x0 | y0 << 8 | x1 << 16 | y1 << 24 (inclusive, in panel coordinates),
+    sent as CASET, RASET and RAMWR; the pixels that follow fill it. After initialisation the window is
+    the whole frame. While no entry is valid the panel is deselected and not clocked.
+    """
+    def __init__(self, reset_delay, reset_period=100000, clk_freq=None, init_delays=True):
+        self.data = Signal(32)
+        self.cmd = Signal()
+        self.valid = Signal()
+        self.ready = Signal()
         self.spi_csn = Signal()
         self.spi_clk = Signal()
         self.spi_mosi = Signal()
@@ -40,22 +42,24 @@ class ST7789(Elaboratable):
         self.spi_resn = Signal()
         self.reset_delay = reset_delay
         self.reset_period = reset_period
-        self.eof = Signal()
+        self.clk_freq = clk_freq
+        self.init_delays = init_delays
 
     # Used for simulation
     def ports(self):
-        return [self.color, self.x, self.y, self.next_pixel,
+        return [self.data, self.cmd, self.valid, self.ready,
                 self.spi_csn, self.spi_clk, self.spi_mosi, self.spi_dc, self.spi_resn]
 
     def elaborate(self, platform):
         m = Module()
 
-        C_CLK_MHZ = int(platform.default_clk_frequency / 1000000)
+        # Delays are counted in cycles of the domain this runs in
+        clk_freq = self.clk_freq or platform.default_clk_frequency
+        C_CLK_MHZ = int(clk_freq / 1000000)
 
         index = Signal(11, reset=0)
         data = Signal(8, reset=C_NOP)
         dc = Signal(1, reset=1)
-        byte_toggle = Signal(1, reset=0)
         init = Signal(1, reset=1)
         num_args = Signal(5, reset=0)
         delay_cnt = Signal(bits_for(self.reset_delay * C_CLK_MHZ), reset=self.reset_delay * C_CLK_MHZ)
@@ -67,7 +71,22 @@ class ST7789(Elaboratable):
         clken = Signal(1, reset=0)
         next_byte = Signal(8)
 
-        init_data = readhex(C_INIT_FILE)
+        # The window being set, and the low byte of the pixel being sent
+        x0 = Signal(C_X_BITS)
+        y0 = Signal(C_Y_BITS)
+        x1 = Signal(C_X_BITS)
+        y1 = Signal(C_Y_BITS)
+        step = Signal(4)
+        low = Signal(8)
+        y0_addr = y0 + C_Y_OFFSET
+        y1_addr = y1 + C_Y_OFFSET
+        window_cmd = Array([
+            C_CASET, 0, x0, 0, x1,
+            C_RASET, y0_addr[8:], y0_addr[:8], y1_addr[8:], y1_addr[:8],
+            C_RAMWR
+        ])
+
+        init_data = read_image(C_INIT_FILE, width=8, depth=C_INIT_SIZE, fmt="hex")
         oled_init = Memory(width=8, depth=C_INIT_SIZE, init=init_data)
 
         m.d.comb += [
@@ -76,8 +95,7 @@ class ST7789(Elaboratable):
             self.spi_dc.eq(dc),
             self.spi_clk.eq(((index[0] ^ ~C_CLK_PHASE) | ~clken) ^ ~C_CLK_POLARITY),
             self.spi_mosi.eq(data[7]),
-            next_byte.eq(oled_init[index[4:]]),
-            self.eof.eq((self.x == 0) & (self.y == 0) & self.next_pixel)
+            next_byte.eq(oled_init[index[4:]])
         ]
 
         with m.If(reset_cnt > 0):  # Reset period
@@ -122,40 +140,58 @@ class ST7789(Elaboratable):
                         with m.If((arg == num_args + 1) & ~delay_set):
                             m.d.sync += arg.eq(0)
                     with m.Elif(delay_set):
+                        # 2^n us delay, or n cycles if delays are disabled for simulation
+                        delay = (C_CLK_MHZ << next_byte[0:5]) if self.init_delays else next_byte[0:5]
                         m.d.sync += [
-                            delay_cnt.eq(C_CLK_MHZ << next_byte[0:5]),  # 2^n us delay
+                            delay_cnt.eq(delay),
                             data.eq(C_NOP),
                             clken.eq(0),
                             delay_set.eq(0),
                             arg.eq(0)
                         ]
-                with m.Else():  # Send pixels and set x, y and next_pixel
-                    m.d.sync += [
-                        dc.eq(1),
-                        byte_toggle.eq(~byte_toggle),
-                        clken.eq(1),
-                        index[4:].eq(0)
-                    ]
-                    with m.If(byte_toggle):
-                        m.d.sync += [
-                            data.eq(self.color[0:8]),
-                            self.next_pixel.eq(1)
-                        ]
-                        with m.If(self.x == C_X_SIZE - 1):
-                            m.d.sync += self.x.eq(0)
-                            with m.If(self.y == C_Y_SIZE - 1):
-                                m.d.sync += self.y.eq(0)
+                with m.Else():
+                    m.d.sync += index[4:].eq(0)
+                    with m.FSM():
+                        with m.State("NEXT"):  # Take the next entry, and send its first byte
+                            with m.If(self.valid):
+                                m.d.comb += self.ready.eq(1)
+                                m.d.sync += [
+                                    dc.eq(~self.cmd),
+                                    clken.eq(1)
+                                ]
+                                with m.If(self.cmd):
+                                    m.d.sync += [
+                                        Cat(x0, y0, x1, y1).eq(self.data),
+                                        data.eq(C_CASET),
+                                        step.eq(1)
+                                    ]
+                                    m.next = "WINDOW"
+                                with m.Else():
+                                    m.d.sync += [
+                                        data.eq(self.data[8:16]),
+                                        low.eq(self.data[0:8])
+                                    ]
+                                    m.next = "LOW"
                             with m.Else():
-                                m.d.sync += self.y.eq(self.y + 1)
-                        with m.Else():
-                            m.d.sync += self.x.eq(self.x + 1)
-                    with m.Else():
-                        m.d.sync += data.eq(self.color[8:])
+                                m.d.sync += [
+                                    data.eq(C_NOP),
+                                    clken.eq(0)
+                                ]
+                        with m.State("LOW"):  # The second byte of a pixel
+                            m.d.sync += data.eq(low)
+                            m.next = "NEXT"
+                        with m.State("WINDOW"):  # The rest of CASET, RASET and RAMWR
+                            m.d.sync += [
+                                data.eq(window_cmd[step]),
+                                dc.eq((step != 5) & (step != 10)),
+                                step.eq(step + 1)
+                            ]
+                            with m.If(step == 10):
+                                m.next = "NEXT"
             with m.Else():  # Shift out byte
-                m.d.sync += self.next_pixel.eq(0)
                 with m.If(index[0] == 0):
                     m.d.sync += data.eq(Cat(0b0, data[0:7]))
-        with m.Else():  # Initialization done, start sending pixels
+        with m.Else():  # Initialization done, start sending the stream
             m.d.sync += [
                 init.eq(0),
                 index[4:].eq(0)
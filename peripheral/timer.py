@@ -0,0 +1,72 @@
+from amaranth import *
+
+from amaranth_orchard.base.peripheral import Peripheral
+
+
+class TimerPeripheral(Peripheral, Elaboratable):
+    """
+    Free running cycle counter with a compare interrupt.
+
+    The interrupt is pending once cycles reaches compare. If period is not 0, compare then advances
+    by period, giving a periodic interrupt without drift; otherwise it fires once, until compare is
+    written again. Bit 0 of ctrl enables the interrupt and bit 1 clears pending, though a compare
+    matching in the same cycle leaves it pending.
+    """
+    def __init__(self, **kwargs):
+        super().__init__()
+
+        bank            = self.csr_bank()
+        self.cycles     = bank.csr(32, "r")
+        self.compare    = bank.csr(32, "w")
+        self.period     = bank.csr(32, "w")
+        self.ctrl       = bank.csr(2, "w")
+        self.pending    = bank.csr(1, "r")
+
+        self._bridge    = self.bridge(data_width=32, granularity=8, alignment=2)
+        self.bus        = self._bridge.bus
+
+        self.irq        = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.bridge  = self._bridge
+
+        # Free running cycle counter
+        count = Signal(32)
+        m.d.sync += count.eq(count + 1)
+
+        compare = Signal(32)
+        period  = Signal(32)
+        enable  = Signal()
+        pending = Signal()
+        # Cleared when a one-shot compare fires, so that it does not fire again when the counter wraps
+        armed   = Signal()
+
+        with m.If(self.period.w_stb):
+            m.d.sync += period.eq(self.period.w_data)
+
+        with m.If(self.ctrl.w_stb):
+            m.d.sync += enable.eq(self.ctrl.w_data[0])
+            with m.If(self.ctrl.w_data[1]):
+                m.d.sync += pending.eq(0)
+
+        # After the clear, so that a compare in the same cycle wins over it
+        with m.If(self.compare.w_stb):
+            m.d.sync += [
+                compare.eq(self.compare.w_data),
+                armed.eq(1),
+            ]
+        with m.Elif(armed & (count == compare)):
+            m.d.sync += pending.eq(1)
+            with m.If(period != 0):
+                m.d.sync += compare.eq(compare + period)
+            with m.Else():
+                m.d.sync += armed.eq(0)
+
+        m.d.comb += [
+            self.cycles.r_data.eq(count),
+            self.pending.r_data.eq(pending),
+            self.irq.eq(pending & enable)
+        ]
+
+        return m
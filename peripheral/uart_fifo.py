@@ -0,0 +1,234 @@
+from amaranth import *
+from amaranth.lib.fifo import SyncFIFOBuffered
+
+from amaranth_orchard.base.peripheral import Peripheral
+
+# Fraction bits of the baud divisor, which is in units of 1/256 of a clock
+FRAC_BITS = 8
+
+
+def divisor_from_baud(clk_freq, baud, frac_bits=FRAC_BITS):
+    """ The fractional divisor, clock cycles per bit in units of 2**-frac_bits, for baud at clk_freq """
+    return int(round(clk_freq * (1 << frac_bits) / baud))
+
+
+def bit_period(divisor, acc, frac_bits):
+    """
+    The reload value of a bit counter and the next fraction accumulator, for a fractional divisor.
+    Bit periods alternate between the whole cycles either side of the divisor, so that the error
+    never exceeds a clock, whatever the baud rate.
+    """
+    whole = divisor[frac_bits:]
+    if frac_bits == 0:
+        return whole - 1, acc
+    frac_sum = acc + divisor[:frac_bits]
+    return whole - 1 + frac_sum[frac_bits], frac_sum[:frac_bits]
+
+
+class UartTx(Elaboratable):
+    """
+    8N1 transmitter, taking a byte when ready and valid are both high.
+    The divisor is clock cycles per bit, with frac_bits fraction bits.
+    """
+    def __init__(self, divisor, frac_bits=FRAC_BITS):
+        self.divisor = divisor
+        self.frac_bits = frac_bits
+        self.data    = Signal(8)
+        self.valid   = Signal()
+        self.ready   = Signal()
+        self.tx      = Signal(reset=1)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        sr      = Signal(10)
+        bits    = Signal(4)
+        counter = Signal(len(self.divisor) - self.frac_bits)
+        acc     = Signal(self.frac_bits)
+        period, next_acc = bit_period(self.divisor, acc, self.frac_bits)
+
+        # Ready once the stop bit has been sent for its full period
+        m.d.comb += self.ready.eq((bits == 0) & (counter == 0))
+
+        with m.If(counter != 0):
+            m.d.sync += counter.eq(counter - 1)
+        with m.Elif(bits != 0):
+            m.d.sync += [
+                self.tx.eq(sr[0]),
+                sr.eq(sr >> 1),
+                bits.eq(bits - 1),
+                counter.eq(period),
+                acc.eq(next_acc)
+            ]
+        with m.Elif(self.valid):
+            m.d.sync += [
+                sr.eq(Cat(0, self.data, 1)),
+                bits.eq(10)
+            ]
+
+        return m
+
+
+class UartRx(Elaboratable):
+    """
+    8N1 receiver, sampling in the middle of each bit and strobing valid for each good byte.
+    The divisor is clock cycles per bit, with frac_bits fraction bits.
+    """
+    def __init__(self, divisor, frac_bits=FRAC_BITS):
+        self.divisor = divisor
+        self.frac_bits = frac_bits
+        self.rx      = Signal(reset=1)
+        self.data    = Signal(8)
+        self.valid   = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        rx = Signal(reset=1)
+        rx_sync = Signal(reset=1)
+        m.d.sync += [rx_sync.eq(self.rx), rx.eq(rx_sync)]
+
+        sr      = Signal(8)
+        bits    = Signal(4)
+        counter = Signal(len(self.divisor) - self.frac_bits)
+        acc     = Signal(self.frac_bits)
+        period, next_acc = bit_period(self.divisor, acc, self.frac_bits)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                with m.If(~rx):
+                    m.d.sync += [
+                        counter.eq(self.divisor[self.frac_bits + 1:]),
+                        acc.eq(0)
+                    ]
+                    m.next = "START"
+            with m.State("START"):
+                with m.If(counter == 0):
+                    m.d.sync += [counter.eq(period), acc.eq(next_acc), bits.eq(0)]
+                    # A glitch rather than a start bit if the line is high again
+                    with m.If(rx):
+                        m.next = "IDLE"
+                    with m.Else():
+                        m.next = "DATA"
+                with m.Else():
+                    m.d.sync += counter.eq(counter - 1)
+            with m.State("DATA"):
+                with m.If(counter == 0):
+                    m.d.sync += [
+                        sr.eq(Cat(sr[1:], rx)),
+                        bits.eq(bits + 1),
+                        counter.eq(period),
+                        acc.eq(next_acc)
+                    ]
+                    with m.If(bits == 7):
+                        m.next = "STOP"
+                with m.Else():
+                    m.d.sync += counter.eq(counter - 1)
+            with m.State("STOP"):
+                with m.If(counter == 0):
+                    m.d.comb += self.valid.eq(rx)
+                    m.next = "IDLE"
+                with m.Else():
+                    m.d.sync += counter.eq(counter - 1)
+
+        m.d.comb += self.data.eq(sr)
+
+        return m
+
+
+class UARTFifoPeripheral(Peripheral, Elaboratable):
+    """
+    UART with transmit and receive FIFOs and FIFO level interrupts.
+
+    The first four registers match UARTPeripheral, so polled drivers work unchanged: tx_data, rx_data,
+    tx_ready (transmit FIFO not full) and rx_avail (receive FIFO not empty). Reading rx_data pops the
+    receive FIFO. The transmit interrupt is pending while the transmit FIFO holds no more than
+    tx_threshold bytes, and the receive interrupt while the receive FIFO holds at least rx_threshold,
+    enabled by bits 0 and 1 of irq_en. tx_idle is set once the transmit FIFO is empty and the stop bit
+    of the last byte has been sent, so the line can be handed over or the divisor changed.
+
+    The divisor register, and init_divisor, are clock cycles per bit in units of 1/256 (see
+    divisor_from_baud), so that rates of several megabaud are accurate at any clock frequency.
+    """
+    def __init__(self, *, pins, init_divisor, tx_depth=16, rx_depth=16, **kwargs):
+        super().__init__()
+
+        self.pins           = pins
+        self.init_divisor   = init_divisor
+        self.tx_depth       = tx_depth
+        self.rx_depth       = rx_depth
+
+        bank                = self.csr_bank()
+        self.tx_data        = bank.csr(8, "w")
+        self.rx_data        = bank.csr(8, "r")
+        self.tx_ready       = bank.csr(1, "r")
+        self.rx_avail       = bank.csr(1, "r")
+        self.divisor        = bank.csr(16 + FRAC_BITS, "w")
+        self.tx_level       = bank.csr(8, "r")
+        self.rx_level       = bank.csr(8, "r")
+        self.tx_threshold   = bank.csr(8, "w")
+        self.rx_threshold   = bank.csr(8, "w")
+        self.irq_en         = bank.csr(2, "w")
+        self.irq_pending    = bank.csr(2, "r")
+        self.tx_idle        = bank.csr(1, "r")
+
+        self._bridge        = self.bridge(data_width=32, granularity=8, alignment=2)
+        self.bus            = self._bridge.bus
+
+        self.irq            = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.bridge  = self._bridge
+
+        divisor = Signal(16 + FRAC_BITS, reset=self.init_divisor)
+        with m.If(self.divisor.w_stb):
+            m.d.sync += divisor.eq(self.divisor.w_data)
+
+        m.submodules.tx = tx = UartTx(divisor)
+        m.submodules.rx = rx = UartRx(divisor)
+        m.submodules.tx_fifo = tx_fifo = SyncFIFOBuffered(width=8, depth=self.tx_depth)
+        m.submodules.rx_fifo = rx_fifo = SyncFIFOBuffered(width=8, depth=self.rx_depth)
+
+        m.d.comb += [
+            self.pins.tx_o.eq(tx.tx),
+            rx.rx.eq(self.pins.rx_i),
+
+            # CPU to transmit FIFO to transmitter
+            tx_fifo.w_data.eq(self.tx_data.w_data),
+            tx_fifo.w_en.eq(self.tx_data.w_stb),
+            tx.data.eq(tx_fifo.r_data),
+            tx.valid.eq(tx_fifo.r_rdy),
+            tx_fifo.r_en.eq(tx.ready),
+
+            # Receiver to receive FIFO to CPU; bytes arriving when it is full are dropped
+            rx_fifo.w_data.eq(rx.data),
+            rx_fifo.w_en.eq(rx.valid),
+            self.rx_data.r_data.eq(rx_fifo.r_data),
+            rx_fifo.r_en.eq(self.rx_data.r_stb),
+
+            self.tx_ready.r_data.eq(tx_fifo.w_rdy),
+            self.rx_avail.r_data.eq(rx_fifo.r_rdy),
+            self.tx_level.r_data.eq(tx_fifo.level),
+            self.rx_level.r_data.eq(rx_fifo.level),
+            self.tx_idle.r_data.eq((tx_fifo.level == 0) & tx.ready),
+        ]
+
+        tx_threshold = Signal(8)
+        rx_threshold = Signal(8, reset=1)
+        irq_en = Signal(2)
+        with m.If(self.tx_threshold.w_stb):
+            m.d.sync += tx_threshold.eq(self.tx_threshold.w_data)
+        with m.If(self.rx_threshold.w_stb):
+            m.d.sync += rx_threshold.eq(self.rx_threshold.w_data)
+        with m.If(self.irq_en.w_stb):
+            m.d.sync += irq_en.eq(self.irq_en.w_data)
+
+        pending = Signal(2)
+        m.d.comb += [
+            pending.eq(Cat(tx_fifo.level <= tx_threshold, rx_fifo.level >= rx_threshold)),
+            self.irq_pending.r_data.eq(pending),
+            self.irq.eq((pending & irq_en).any())
+        ]
+
+        return m
@@ -39,6 +39,12 @@ class PLL(Elaboratable):
         ]
         self.locked = Signal()
 
+    @property
+    def freq_out_actual(self):
+        """ The output frequency in MHz given by the chosen coefficients """
+        pfd = self.freq_in / (self.coeff.divr + 1)
+        return pfd * (self.coeff.divf + 1) * 2 ** -self.coeff.divq
+
     def _calc_freq_coefficients(self):
         # cribbed from Icestorm's icepll.
         f_in, f_req = self.freq_in, self.freq_out
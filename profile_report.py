@@ -0,0 +1,90 @@
+"""
+Compare the CPU profiles of a SoC variant: resource use and Fmax from a full build against the
+firmware benchmark cycle counts in simulation, to choose the fastest profile that fits the FPGA.
+
+    python profile_report.py hyper_soc --profiles tiny small balanced fast
+"""
+import argparse
+import json
+import subprocess
+from pathlib import Path
+
+from bench_run import build_firmware, run_sim
+from cpu_profiles import CPU_PROFILES
+from reports import clock_of_domain
+from resource_bench import measure
+from variants import VARIANTS
+
+
+def evaluate(variant, profile, max_cycles):
+    """ Return the build figures and benchmark results of a variant with a CPU profile """
+    try:
+        figures = measure(variant, f"build/profiles/{variant}/{profile}/hw", cpu_profile=profile)
+    except subprocess.CalledProcessError:
+        # Most likely the design no longer fits the device
+        figures = None
+
+    build_firmware(variant, cpu_profile=profile)
+    results = run_sim(variant, max_cycles, build_dir=f"build/profiles/{variant}/{profile}/sim",
+                      cpu_profile=profile)
+    return figures, results
+
+
+def sync_fmax(figures):
+    """ The Fmax of the sync clock, which the CPU and the benchmarks run on, or None """
+    clock = clock_of_domain(figures["fmax_mhz"])
+    return figures["fmax_mhz"][clock] if clock is not None else None
+
+
+def report(variant, evaluated):
+    """ Format the comparison as a markdown table, with total cycles over all kernels """
+    out = f"## {variant}\n\n"
+    out += "| profile | fits | LCs | RAMs | Fmax (MHz) | total cycles | time (ms) |\n"
+    out += "|---|---|---|---|---|---|---|\n"
+    for profile, (figures, results) in evaluated.items():
+        cycles = sum(results.values())
+        if figures is None:
+            out += f"| {profile} | no | | | | {cycles} | |\n"
+            continue
+        lcs = figures["utilisation"].get("ICESTORM_LC", "")
+        rams = figures["utilisation"].get("ICESTORM_RAM", "")
+        fmax = sync_fmax(figures)
+        time_ms = f"{cycles / fmax / 1e3:.2f}" if fmax else ""
+        out += f"| {profile} | yes | {lcs} | {rams} | {fmax or ''} | {cycles} | {time_ms} |\n"
+    return out
+
+
+def best_profile(evaluated):
+    """ The profile that fits and runs the benchmarks in the shortest time at its sync clock's Fmax """
+    fitting = {p: sum(r.values()) / sync_fmax(f)
+               for p, (f, r) in evaluated.items() if f is not None and sync_fmax(f)}
+    return min(fitting, key=fitting.get) if fitting else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the CPU profiles of SoC variants")
+    parser.add_argument("variants", nargs="*", default=list(VARIANTS), help="variants to compare")
+    parser.add_argument("--profiles", nargs="+", choices=list(CPU_PROFILES), default=list(CPU_PROFILES),
+                        help="CPU profiles to compare")
+    parser.add_argument("--cycles", type=int, default=200000000, help="cycle limit in simulation")
+    parser.add_argument("--output", default="profile_report.md", help="file to write the report to")
+    parser.add_argument("--json", help="also write the raw figures to this file")
+    args = parser.parse_args()
+
+    out = ""
+    raw = {}
+    for variant in args.variants:
+        evaluated = {profile: evaluate(variant, profile, args.cycles) for profile in args.profiles}
+        out += report(variant, evaluated)
+        out += f"\nFastest profile that fits: {best_profile(evaluated)}\n\n"
+        raw[variant] = {profile: {"figures": f, "bench": {",".join(map(str, k)): v for k, v in r.items()}}
+                        for profile, (f, r) in evaluated.items()}
+
+    print(out)
+    Path(args.output).write_text(out)
+    if args.json:
+        Path(args.json).write_text(json.dumps(raw, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    main()
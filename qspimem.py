@@ -3,9 +3,10 @@ from amaranth.hdl.ast import Rose, Fell
 from amaranth.lib.cdc import FFSynchronizer
 
 class QspiMem(Elaboratable):
-    def __init__(self, domain="sync", addr_bits=23, data_bits=8):
+    def __init__(self, domain="sync", addr_bits=23, data_bits=8, pwr_on_bits=9):
         # parameters
         self.domain       = domain
+        self.pwr_on_bits  = pwr_on_bits
         self.addr_bits    = addr_bits
         self.data_bits    = data_bits
         self.addr_nibbles = 4
@@ -41,7 +42,7 @@ class QspiMem(Elaboratable):
         r_qss          = Signal()
 
         # Ignore spurious QSPI data after programming
-        pwr_on_reset = Signal(9)
+        pwr_on_reset = Signal(self.pwr_on_bits)
         with m.If(~pwr_on_reset.all()):
             m.d[self.domain] += pwr_on_reset.eq(pwr_on_reset + 1)
 
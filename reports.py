@@ -0,0 +1,83 @@
+import re
+from pathlib import Path
+
+FMAX_RE = re.compile(r"Max frequency for clock '([^']+)': ([\d.]+) MHz \((PASS|FAIL) at ([\d.]+) MHz\)")
+
+
+def parse_fmax(text):
+    """
+    Parse the nextpnr log for the achieved frequency of each clock.
+    Returns a dict of clock name to (fmax_mhz, passed, target_mhz), using the last (post-route) report.
+    """
+    clocks = {}
+    for name, fmax, result, target in FMAX_RE.findall(text):
+        clocks[name] = (float(fmax), result == "PASS", float(target))
+    return clocks
+
+
+def read_fmax(build_dir, name="top"):
+    return parse_fmax((Path(build_dir) / f"{name}.tim").read_text())
+
+
+def clock_of_domain(clocks, domain="sync"):
+    """
+    The name of a domain's clock among those of a report, or None. Amaranth names the clock signal of
+    the sync domain clk and of others <domain>_clk, which nextpnr may prefix with $glbnet$ or a hierarchy.
+    """
+    signal = "clk" if domain == "sync" else f"{domain}_clk"
+    return next((name for name in clocks if re.split(r"[$.]", name)[-1] == signal), None)
+
+
+def timing_passed(clocks, domain="sync"):
+    """ Whether the clock of a domain met timing; clocks of other domains, at fixed frequencies, are not judged """
+    name = clock_of_domain(clocks, domain)
+    return name is not None and clocks[name][1]
+
+
+UTIL_RE = re.compile(r"^Info:\s+(\w+):\s+(\d+)/\s*(\d+)\s+\d+%", re.MULTILINE)
+MODULE_RE = re.compile(r"^=== (\S+) ===$", re.MULTILINE)
+CELL_RE = re.compile(r"^\s+(\$?\w+)\s+(\d+)$", re.MULTILINE)
+
+# Yosys cell types summarised in the per-module figures
+CELL_GROUPS = {
+    "lut": ("SB_LUT4",),
+    "carry": ("SB_CARRY",),
+    "ram": ("SB_RAM40_4K",),
+}
+
+
+def parse_utilisation(text):
+    """ Parse the nextpnr log for device utilisation, as a dict of bel type to (used, available) """
+    util = {}
+    for bel, used, avail in UTIL_RE.findall(text):
+        util[bel] = (int(used), int(avail))
+    return util
+
+
+def parse_stat(text):
+    """ Parse a Yosys stat report of a hierarchical design into a dict of module name to cell counts """
+    modules = {}
+    sections = MODULE_RE.split(text)
+    for name, body in zip(sections[1::2], sections[2::2]):
+        # The design hierarchy summary follows the last module
+        body = body.split("=== design hierarchy ===")[0]
+        modules[name.lstrip("\\")] = {cell: int(n) for cell, n in CELL_RE.findall(body)}
+    return modules
+
+
+def module_figures(modules, top="top"):
+    """
+    Sum cell counts over each top level submodule and everything below it.
+    Returns a dict of submodule name to figures for each of CELL_GROUPS plus flip-flops.
+    """
+    figures = {}
+    for name, cells in modules.items():
+        parts = name.split(".")
+        if parts[0] != top:
+            continue
+        key = parts[1] if len(parts) > 1 else top
+        fig = figures.setdefault(key, {"lut": 0, "carry": 0, "ram": 0, "ff": 0})
+        for group, types in CELL_GROUPS.items():
+            fig[group] += sum(cells.get(t, 0) for t in types)
+        fig["ff"] += sum(n for cell, n in cells.items() if cell.startswith("SB_DFF"))
+    return figures
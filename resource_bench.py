@@ -0,0 +1,109 @@
+"""
+Resource and timing regression benchmark.
+
+Builds each SoC variant, records total and per-module resource use and Fmax in a JSON history,
+and flags any change worse than a threshold compared with the previous record for that variant.
+Per-module figures come from a separate, non-flattening Yosys synthesis of the same RTLIL.
+
+    python resource_bench.py soc hyper_soc --threshold 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from mystorm_boards.icelogicbus import IceLogicBusPlatform
+
+from reports import module_figures, parse_fmax, parse_stat, parse_utilisation
+from variants import VARIANTS, get_variant
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(variant, build_dir, **soc_args):
+    """ Build a variant and return its resource and timing figures """
+    platform = IceLogicBusPlatform()
+    platform.build(get_variant(variant)(**soc_args), build_dir=build_dir, do_program=False,
+                   nextpnr_opts="--timing-allow-fail")
+
+    build_dir = Path(build_dir)
+    tim = (build_dir / "top.tim").read_text()
+
+    # Re-synthesise without flattening to attribute cells to modules
+    subprocess.run(["yosys", "-q", "-p",
+                    "read_ilang top.il; synth_ice40 -noflatten -top top; tee -q -o top.hier.rpt stat"],
+                   cwd=build_dir, check=True)
+    modules = parse_stat((build_dir / "top.hier.rpt").read_text())
+
+    return {
+        "utilisation": {bel: used for bel, (used, _) in parse_utilisation(tim).items()},
+        "fmax_mhz": {clk: fmax for clk, (fmax, _, _) in parse_fmax(tim).items()},
+        "modules": module_figures(modules),
+    }
+
+
+def regressions(prev, cur, threshold):
+    """ List the figures in cur that are more than threshold percent worse than in prev """
+    found = []
+
+    def check(what, old, new, higher_is_worse=True):
+        if not old:
+            return
+        change = (new - old) / old * 100
+        if (change if higher_is_worse else -change) > threshold:
+            found.append(f"{what}: {old} -> {new} ({change:+.1f}%)")
+
+    for bel, used in cur["utilisation"].items():
+        check(bel, prev["utilisation"].get(bel), used)
+    for clk, fmax in cur["fmax_mhz"].items():
+        check(f"fmax {clk}", prev["fmax_mhz"].get(clk), fmax, higher_is_worse=False)
+    for mod, fig in cur["modules"].items():
+        for group, n in fig.items():
+            check(f"{mod} {group}", prev["modules"].get(mod, {}).get(group), n)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record resource use and Fmax of SoC variants")
+    parser.add_argument("variants", nargs="*", default=list(VARIANTS), help="variants to build")
+    parser.add_argument("--history", default="resource_history.json", help="history file")
+    parser.add_argument("--threshold", type=float, default=5.0, help="regression threshold in percent")
+    parser.add_argument("--no-record", action="store_true", help="compare only, do not add to the history")
+    args = parser.parse_args()
+
+    history_file = Path(args.history)
+    history = json.loads(history_file.read_text()) if history_file.exists() else []
+
+    failed = False
+    for variant in args.variants:
+        figures = measure(variant, f"build/bench/{variant}")
+        record = {"variant": variant, "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                  "revision": git_revision(), **figures}
+
+        print(f"{variant}: {figures['utilisation']}, fmax {figures['fmax_mhz']}")
+        for mod, fig in sorted(figures["modules"].items()):
+            print(f"    {mod:12} lut {fig['lut']:6} carry {fig['carry']:5} ff {fig['ff']:6} ram {fig['ram']:3}")
+
+        previous = [r for r in history if r["variant"] == variant]
+        if previous:
+            for reg in regressions(previous[-1], record, args.threshold):
+                print(f"    REGRESSION {reg}")
+                failed = True
+
+        if not args.no_record:
+            history.append(record)
+            history_file.write_text(json.dumps(history, indent=4) + "\n")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
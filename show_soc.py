@@ -1,40 +1,27 @@
 from amaranth import *
 from amaranth_soc import wishbone
 
-from minerva.core import Minerva
-
 from amaranth_orchard.base.gpio import GPIOPeripheral
-from amaranth_orchard.io.uart import UARTPeripheral
 from amaranth_orchard.memory.sram import SRAMPeripheral
 
 from mystorm_boards.icelogicbus import *
 
 from wrapper import SoCWrapper
+from memimage import read_firmware
 from software.soft_gen import SoftwareGenerator
 
 from peripheral.seg7 import Seg7Peripheral
-from peripheral.lcd import LcdPeripheral
+from peripheral.timer import TimerPeripheral
+from peripheral.irq import InterruptController
 
 from memory.hyperflash import HyperFlash
 
 
-def readbios():
-    """ Read bios.bin into an array of integers """
-    f = open("software/bios.bin", "rb")
-    l = []
-    while True:
-        b = f.read(4)
-        if b:
-            l.append(int.from_bytes(b, "little"))
-        else:
-            break
-    f.close()
-    return l
-
-
 class ShowSoC(SoCWrapper):
-    def __init__(self):
-        super().__init__()
+    default_cpu_profile = "tiny"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         # Memory regions
         self.rom_base = 0x00000000
@@ -48,6 +35,8 @@ class ShowSoC(SoCWrapper):
         self.uart_base = 0xb2000000
         self.seg7_base = 0xb3000000
         self.lcd_base = 0xb4000000
+        self.timer_base = 0xb6000000
+        self.irqc_base = 0xb8000000
 
     def elaborate(self, platform):
         # Elaborate the wrapper
@@ -59,9 +48,9 @@ class ShowSoC(SoCWrapper):
         # A Wishbone decoder for the memory and peripherals
         self._decoder = wishbone.Decoder(addr_width=30, data_width=32, granularity=8)
 
-        # Use a Minerva CPU without a cache
-        self.cpu = Minerva(with_icache=False, icache_nlines=8, icache_limit=0x800,
-                           with_dcache=False, dcache_nlines=8, dcache_limit=0x400)
+        # Create the Minerva CPU from the CPU profile, with any data cache covering RAM
+        self.cpu = self.get_cpu(icache_limit=0x800,
+                                dcache_base=self.sram_base, dcache_limit=self.sram_base + self.sram_size)
 
         # Create wishbone buses for the cpu instruction and data caches. Needed even for dummy caches
         self.ibus = wishbone.Interface(addr_width=30, data_width=32, granularity=8,
@@ -78,7 +67,7 @@ class ShowSoC(SoCWrapper):
 
         # Create a BRAM Rom and load the Bios into it and add it to the decoder
         self.rom =  SRAMPeripheral(size=self.rom_size, writable=False)
-        self.rom.init = readbios()
+        self.rom.init = read_firmware(self.bios_file, depth=self.rom_size // 4)
         self._decoder.add(self.rom.bus, addr=self.rom_base)
 
         # Create BRAM RAM and add it to the decoder
@@ -94,9 +83,7 @@ class ShowSoC(SoCWrapper):
         self._decoder.add(self.gpio.bus, addr=self.led_gpio_base)
 
         # Create the uart peripheral and add it to the decoder
-        self.uart = UARTPeripheral(
-            init_divisor=(25000000//115200),
-            pins=super().get_uart(m, platform))
+        self.uart = self.get_uart_peripheral(m, platform)
         self._decoder.add(self.uart.bus, addr=self.uart_base)
 
         self.seg7 = Seg7Peripheral(
@@ -104,11 +91,17 @@ class ShowSoC(SoCWrapper):
         )
         self._decoder.add(self.seg7.bus, addr=self.seg7_base)
 
-        self.lcd = LcdPeripheral(
-            pins=super().get_lcd(m, platform)
-        )
+        self.lcd = self.get_lcd_peripheral(m, platform)
         self._decoder.add(self.lcd.bus, addr=self.lcd_base)
 
+        # Create the timer peripheral and add it to the decoder
+        self.timer = TimerPeripheral()
+        self._decoder.add(self.timer.bus, addr=self.timer_base)
+
+        # Create the interrupt controller and add it to the decoder
+        self.irqc = InterruptController()
+        self._decoder.add(self.irqc.bus, addr=self.irqc_base)
+
         # Add all the submodules
         m.submodules.arbiter  = self._arbiter
         m.submodules.cpu      = self.cpu
@@ -119,6 +112,8 @@ class ShowSoC(SoCWrapper):
         m.submodules.uart     = self.uart
         m.submodules.seg7     = self.seg7
         m.submodules.lcd      = self.lcd
+        m.submodules.timer    = self.timer
+        m.submodules.irqc     = self.irqc
         m.submodules.hf       = self.hf
 
         m.d.comb += [
@@ -128,19 +123,43 @@ class ShowSoC(SoCWrapper):
             self.cpu.ibus.connect(self.ibus),
             self.cpu.dbus.connect(self.dbus),
             # Connect the external interrupt signal
-            self.cpu.external_interrupt.eq(self.ip)
+            self.cpu.external_interrupt.eq(self.ip),
+            # The interrupt controller drives line 0, which start.S unmasks
+            self.ip[0].eq(self.irqc.irq),
+            # Connect the peripheral interrupts to the controller
+            self.irqc.irqs[0].eq(self.timer.irq)
         ]
 
+        # The buffered UART interrupts on line 2
+        if self.uart_fifo_depth:
+            m.d.comb += self.irqc.irqs[2].eq(self.uart.irq)
+
+        # Trace the bus masters in simulation
+        self.add_bus_monitors(m, platform, self.ibus, self.dbus)
+
         # Generate soc.h, start.S and the linker script
         sw = SoftwareGenerator(
             rom_start=self.rom_base, rom_size=self.rom_size, # place BIOS in SRAM
             ram_start=self.sram_base, ram_size=self.sram_size, # place BIOS data in SRAM
+            march=self.march,
         )
 
         sw.add_periph("gpio", "LED_GPIO", self.led_gpio_base)
-        sw.add_periph("uart", "UART0", self.uart_base)
+        sw.add_periph(self.uart_type, "UART0", self.uart_base)
         sw.add_periph("seg7", "SEG70", self.seg7_base)
         sw.add_periph("lcd", "LCD0", self.lcd_base)
+        sw.add_periph("timer", "TIMER0", self.timer_base)
+        sw.add_periph("irq", "IRQC0", self.irqc_base)
+
+        sw.add_irq("TIMER0", 0)
+        if self.uart_fifo_depth:
+            sw.add_irq("UART0", 2, handler="uart_fifo_irq_handler")
+
+        sw.add_define("CLK_FREQ", int(self.clk_freq))
+
+        sw.add_region("BRAM_ROM", self.rom_base, self.rom_size, writable=False)
+        sw.add_region("BRAM", self.sram_base, self.sram_size)
+        sw.add_region("HYPERFLASH", self.hf_base, self.hf.size, writable=False)
 
         sw.generate("software/generated")
 
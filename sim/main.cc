@@ -0,0 +1,163 @@
+// Test bench for the compiled SoC: drives the clock and reset, reports the simulation speed,
+// and saves or restores snapshots of the simulation state taken when main() is entered
+
+#include <chrono>
+#include <csignal>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+
+#include "top.h"
+#include "models.h"
+
+uint64_t sim_cycle = 0;
+FILE *sim_trace = nullptr;
+uint32_t sim_clk_hz = 25000000;
+const char *sim_lcd_frames = nullptr;
+
+static volatile sig_atomic_t interrupted = 0;
+
+static void on_interrupt(int) {
+    interrupted = 1;
+}
+
+static const char snapshot_magic[8] = {'S', 'T', 'S', 'N', 'A', 'P', '0', '1'};
+
+// Call fn(item, chunks) for each item holding design state: all wires and memories
+template<class F>
+static void for_each_state(cxxrtl_design::p_top &top, F fn) {
+    cxxrtl::debug_items items;
+    top.debug_info(items);
+    for (auto &it : items.table)
+        for (auto &item : it.second)
+            if (item.type == cxxrtl::debug_item::WIRE || item.type == cxxrtl::debug_item::MEMORY)
+                fn(item, item.depth * ((item.width + 31) / 32));
+}
+
+static bool save_snapshot(cxxrtl_design::p_top &top, const char *filename) {
+    FILE *f = fopen(filename, "wb");
+    if (!f)
+        return false;
+    fwrite(snapshot_magic, 1, sizeof(snapshot_magic), f);
+    fwrite(&sim_cycle, sizeof(sim_cycle), 1, f);
+    for_each_state(top, [&](cxxrtl::debug_item &item, size_t chunks) {
+        fwrite(item.curr, sizeof(*item.curr), chunks, f);
+    });
+    save_model_states(f);
+    return fclose(f) == 0;
+}
+
+static bool load_snapshot(cxxrtl_design::p_top &top, const char *filename) {
+    FILE *f = fopen(filename, "rb");
+    if (!f)
+        return false;
+    char magic[sizeof(snapshot_magic)];
+    bool ok = fread(magic, 1, sizeof(magic), f) == sizeof(magic) &&
+        !memcmp(magic, snapshot_magic, sizeof(magic)) &&
+        fread(&sim_cycle, sizeof(sim_cycle), 1, f) == 1;
+    for_each_state(top, [&](cxxrtl::debug_item &item, size_t chunks) {
+        ok = ok && fread(item.curr, sizeof(*item.curr), chunks, f) == chunks;
+        if (ok && item.next)
+            memcpy(item.next, item.curr, chunks * sizeof(*item.curr));
+    });
+    ok = ok && load_model_states(f);
+    fclose(f);
+    return ok;
+}
+
+static int usage(const char *prog) {
+    fprintf(stderr, "usage: %s [--cycles N] [--save-snapshot FILE | --load-snapshot FILE] "
+            "[--trace FILE] [--clk-hz HZ] [--lcd-frames DIR] [--exit-on-eot]\n", prog);
+    return 1;
+}
+
+int main(int argc, char **argv) {
+    uint64_t max_cycles = 0; // 0 to run until interrupted
+    const char *save_file = nullptr;
+    const char *load_file = nullptr;
+    const char *trace_file = nullptr;
+    bool exit_on_eot = false;
+
+    for (int i = 1; i < argc; i++) {
+        if (!strcmp(argv[i], "--exit-on-eot")) {
+            exit_on_eot = true;
+            continue;
+        }
+        if (i + 1 == argc)
+            return usage(argv[0]);
+        if (!strcmp(argv[i], "--cycles"))
+            max_cycles = strtoull(argv[++i], nullptr, 0);
+        else if (!strcmp(argv[i], "--save-snapshot"))
+            save_file = argv[++i];
+        else if (!strcmp(argv[i], "--load-snapshot"))
+            load_file = argv[++i];
+        else if (!strcmp(argv[i], "--trace"))
+            trace_file = argv[++i];
+        else if (!strcmp(argv[i], "--clk-hz"))
+            sim_clk_hz = strtoul(argv[++i], nullptr, 0);
+        else if (!strcmp(argv[i], "--lcd-frames"))
+            sim_lcd_frames = argv[++i];
+        else
+            return usage(argv[0]);
+    }
+
+    signal(SIGINT, on_interrupt);
+
+    if (trace_file) {
+        sim_trace = fopen(trace_file, "wb");
+        if (!sim_trace) {
+            fprintf(stderr, "cannot open trace %s\n", trace_file);
+            return 1;
+        }
+        trace_header header = {{'W', 'B', 'T', 'R', 'A', 'C', 'E', '1'}, sizeof(trace_record), sim_clk_hz};
+        fwrite(&header, sizeof(header), 1, sim_trace);
+    }
+
+    cxxrtl_design::p_top top;
+    auto start = std::chrono::steady_clock::now();
+    uint64_t start_cycle = 0;
+
+    top.p_rst.set<bool>(true);
+    if (load_file) {
+        // Continue from the state after boot, rather than from reset
+        if (!load_snapshot(top, load_file)) {
+            fprintf(stderr, "cannot load snapshot %s\n", load_file);
+            return 1;
+        }
+        top.p_rst.set<bool>(false);
+        start_cycle = sim_cycle;
+    }
+
+    for (; !interrupted && (max_cycles == 0 || sim_cycle < max_cycles); sim_cycle++) {
+        if (sim_cycle == 4)
+            top.p_rst.set<bool>(false);
+        top.p_clk.set<bool>(false);
+        top.step();
+        top.p_clk.set<bool>(true);
+        top.step();
+
+        if (exit_on_eot && sim_finished) {
+            sim_cycle++;
+            break;
+        }
+
+        if (save_file && sim_main_entered) {
+            sim_cycle++;
+            if (!save_snapshot(top, save_file)) {
+                fprintf(stderr, "cannot save snapshot %s\n", save_file);
+                return 1;
+            }
+            fprintf(stderr, "\nsaved snapshot at cycle %llu\n", (unsigned long long)sim_cycle);
+            break;
+        }
+    }
+
+    if (sim_trace)
+        fclose(sim_trace);
+
+    double secs = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    uint64_t cycles = sim_cycle - start_cycle;
+    fprintf(stderr, "\nsimulated %llu cycles in %.2fs (%.3f MHz)\n",
+            (unsigned long long)cycles, secs, cycles / secs / 1e6);
+    return 0;
+}
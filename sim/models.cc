@@ -0,0 +1,481 @@
+// C++ implementations of the black box models added by SimPlatform.add_model and add_monitor
+
+#include <algorithm>
+#include <cstdio>
+#include <string>
+#include <vector>
+
+#include "top.h"
+#include "models.h"
+
+bool sim_main_entered = false;
+bool sim_finished = false;
+
+static std::vector<model_state *> &model_states() {
+    static std::vector<model_state *> states;
+    return states;
+}
+
+model_state::model_state() {
+    model_states().push_back(this);
+}
+
+void save_model_states(FILE *f) {
+    for (auto state : model_states())
+        state->save(f);
+}
+
+bool load_model_states(FILE *f) {
+    for (auto state : model_states())
+        if (!state->load(f))
+            return false;
+    return true;
+}
+
+// Save and load a model's plain data members
+#define MODEL_STATE(...) \
+    void save(FILE *f) override { save_fields(f, __VA_ARGS__); } \
+    bool load(FILE *f) override { return load_fields(f, __VA_ARGS__); }
+
+static void save_fields(FILE *f) {}
+
+template<class T, class... Ts>
+static void save_fields(FILE *f, const T &field, const Ts &...fields) {
+    fwrite(&field, sizeof(T), 1, f);
+    save_fields(f, fields...);
+}
+
+static bool load_fields(FILE *f) {
+    return true;
+}
+
+template<class T, class... Ts>
+static bool load_fields(FILE *f, T &field, Ts &...fields) {
+    return fread(&field, sizeof(T), 1, f) == 1 && load_fields(f, fields...);
+}
+
+namespace cxxrtl_design {
+
+static std::string param_string(const cxxrtl::metadata_map &parameters, const std::string &name) {
+    auto it = parameters.find(name);
+    return it == parameters.end() ? "" : it->second.as_string();
+}
+
+static uint64_t param_uint(const cxxrtl::metadata_map &parameters, const std::string &name, uint64_t dflt) {
+    auto it = parameters.find(name);
+    return it == parameters.end() ? dflt : it->second.as_uint();
+}
+
+#ifdef MODEL_uart_model
+
+// UART: decodes the 8N1 transmit line and streams the characters to stdout, except EOT which flags
+// the end of the run. The divisor is clock cycles per bit in units of 1/256, matching the fractional
+// divisor of UARTFifoPeripheral.
+
+struct uart_model : public bb_p_uart__model, public model_state {
+    uint32_t divisor;
+    enum { IDLE, DATA, STOP } state = IDLE;
+    // Time since the start bit, and of the next sample, in 1/256 cycles
+    uint64_t now = 0;
+    uint64_t sample = 0;
+    int bit = 0;
+    uint8_t sr = 0;
+
+    uart_model(uint32_t divisor) : divisor(divisor) {}
+
+    MODEL_STATE(state, now, sample, bit, sr)
+
+    bool eval() override {
+        if (posedge_p_clk()) {
+            bool tx = p_tx__o.get<bool>();
+            now += 256;
+            switch (state) {
+            case IDLE:
+                if (!tx) {
+                    // Start bit, sample in the middle of each data bit
+                    now = 0;
+                    sample = divisor + divisor / 2;
+                    bit = 0;
+                    sr = 0;
+                    state = DATA;
+                }
+                break;
+            case DATA:
+                if (now >= sample) {
+                    sr |= tx << bit;
+                    sample += divisor;
+                    if (++bit == 8) {
+                        if (sr == 0x04) {
+                            sim_finished = true;
+                        } else {
+                            putchar(sr);
+                            fflush(stdout);
+                        }
+                        state = STOP;
+                    }
+                }
+                break;
+            case STOP:
+                if (now >= sample)
+                    state = IDLE;
+                break;
+            }
+        }
+        p_rx__i.next.set<bool>(true);
+        return bb_p_uart__model::eval();
+    }
+};
+
+std::unique_ptr<bb_p_uart__model>
+bb_p_uart__model::create(std::string name, cxxrtl::metadata_map parameters, cxxrtl::metadata_map attributes) {
+    return std::unique_ptr<bb_p_uart__model>(new uart_model(param_uint(parameters, "divisor", 217 * 256)));
+}
+
+#endif
+
+#ifdef MODEL_hyperram_model
+
+// HyperRAM and HyperFlash: a byte per clock edge, with the fixed latency used by the controllers.
+// An init file is stored so that the controller reads it back as little-endian 32-bit words.
+
+struct hyperram_model : public bb_p_hyperram__model, public model_state {
+    std::vector<uint8_t> mem;
+    uint32_t latency;
+    uint32_t edges = 0;
+    uint64_t ca = 0;
+    uint32_t addr = 0;
+    bool read = false, reg_space = false;
+
+    hyperram_model(uint32_t size, uint32_t latency, const std::string &init_file) :
+            mem(size), latency(latency) {
+        if (init_file.empty())
+            return;
+        FILE *f = fopen(init_file.c_str(), "rb");
+        if (!f) {
+            fprintf(stderr, "hyperram_model: cannot open %s\n", init_file.c_str());
+            return;
+        }
+        std::vector<uint8_t> data(size);
+        size_t len = fread(data.data(), 1, size, f);
+        fclose(f);
+        for (size_t i = 0; i < len; i++)
+            mem[i ^ 3] = data[i];
+    }
+
+    void save(FILE *f) override {
+        fwrite(mem.data(), 1, mem.size(), f);
+        save_fields(f, edges, ca, addr, read, reg_space);
+    }
+
+    bool load(FILE *f) override {
+        return fread(mem.data(), 1, mem.size(), f) == mem.size() &&
+            load_fields(f, edges, ca, addr, read, reg_space);
+    }
+
+    bool eval() override {
+        if (p_csn__o.get<bool>()) {
+            edges = 0;
+        } else if (posedge_p_clk__o() || negedge_p_clk__o()) {
+            uint8_t dq = p_dq__o.get<uint8_t>();
+            edges++;
+            if (edges <= 6) {
+                // Command-address
+                ca = (ca << 8) | dq;
+                if (edges == 6) {
+                    read = (ca >> 47) & 1;
+                    reg_space = (ca >> 46) & 1;
+                    addr = ((((ca >> 16) & 0x1fffffff) << 3) | (ca & 7)) * 2;
+                }
+            } else if (edges > 6 + 2 * latency - 2 && !reg_space) {
+                uint32_t a = addr++ % mem.size();
+                if (read)
+                    p_dq__i.next.set<uint8_t>(mem[a]);
+                else if (!p_rwds__o.get<bool>())
+                    mem[a] = dq;
+            }
+        }
+        return bb_p_hyperram__model::eval();
+    }
+};
+
+std::unique_ptr<bb_p_hyperram__model>
+bb_p_hyperram__model::create(std::string name, cxxrtl::metadata_map parameters, cxxrtl::metadata_map attributes) {
+    return std::unique_ptr<bb_p_hyperram__model>(new hyperram_model(
+        param_uint(parameters, "size", 8 << 20),
+        param_uint(parameters, "latency", 7),
+        param_string(parameters, "init_file")));
+}
+
+#endif
+
+#ifdef MODEL_wb_mon
+
+// Wishbone bus monitor: adds each completed transfer to the binary trace, and flags when the
+// firmware reaches main() by watching for the write to main_marker made by start.S
+
+struct wb_mon : public bb_p_wb__mon, public model_state {
+    uint8_t master;
+    uint32_t main_marker;
+    bool active = false;
+    uint64_t start = 0;
+    uint64_t transfers = 0;
+
+    wb_mon(uint8_t master, uint32_t main_marker) : master(master), main_marker(main_marker) {}
+
+    MODEL_STATE(active, start, transfers)
+
+    bool eval() override {
+        if (posedge_p_clk()) {
+            bool req = p_cyc.get<bool>() && p_stb.get<bool>();
+            if (req && !active) {
+                active = true;
+                start = sim_cycle;
+            }
+            if (active && p_ack.get<bool>()) {
+                bool we = p_we.get<bool>();
+                uint32_t addr = p_adr.get<uint32_t>() << 2;
+                transfers++;
+                if (we && main_marker && addr == main_marker)
+                    sim_main_entered = true;
+                if (sim_trace) {
+                    trace_record rec = {};
+                    rec.start = start;
+                    rec.addr = addr;
+                    rec.data = we ? p_dat__w.get<uint32_t>() : p_dat__r.get<uint32_t>();
+                    rec.latency = sim_cycle - start;
+                    rec.master = master;
+                    rec.flags = we | (p_sel.get<uint8_t>() << 4);
+                    fwrite(&rec, sizeof(rec), 1, sim_trace);
+                }
+                active = false;
+            }
+        }
+        return bb_p_wb__mon::eval();
+    }
+};
+
+std::unique_ptr<bb_p_wb__mon>
+bb_p_wb__mon::create(std::string name, cxxrtl::metadata_map parameters, cxxrtl::metadata_map attributes) {
+    return std::unique_ptr<bb_p_wb__mon>(new wb_mon(param_uint(parameters, "master", 0),
+                                                   param_uint(parameters, "main_marker", 0)));
+}
+
+#endif
+
+#ifdef MODEL_st7789_model
+
+// ST7789 panel: decodes the SPI stream, sampled on the rising edge of sclk while csn is low with dc
+// taken at the last bit of each byte, and follows CASET, RASET, MADCTL and RAMWR into a 240x320
+// frame memory. Each time the pixels written fill the window it is a frame: its bytes, commands
+// included, and the time since the last frame are reported, and it is written as a PNG if frames
+// are being saved. Rows 80-319 are shown, turned to the screen orientation LcdPeripheral draws.
+
+static uint32_t crc32(uint32_t crc, const uint8_t *data, size_t len) {
+    crc = ~crc;
+    while (len--) {
+        crc ^= *data++;
+        for (int i = 0; i < 8; i++)
+            crc = (crc >> 1) ^ (0xedb88320 & -(crc & 1));
+    }
+    return ~crc;
+}
+
+static void put_be32(std::vector<uint8_t> &out, uint32_t v) {
+    for (int shift = 24; shift >= 0; shift -= 8)
+        out.push_back(v >> shift);
+}
+
+static void png_chunk(FILE *f, const char *type, const std::vector<uint8_t> &data) {
+    std::vector<uint8_t> chunk;
+    put_be32(chunk, data.size());
+    chunk.insert(chunk.end(), type, type + 4);
+    chunk.insert(chunk.end(), data.begin(), data.end());
+    put_be32(chunk, crc32(0, chunk.data() + 4, chunk.size() - 4));
+    fwrite(chunk.data(), 1, chunk.size(), f);
+}
+
+// Write 8-bit RGB rows, each starting with its filter byte, as a PNG, deflated with stored blocks
+static bool write_png(const char *filename, uint32_t width, uint32_t height, const std::vector<uint8_t> &raw) {
+    FILE *f = fopen(filename, "wb");
+    if (!f)
+        return false;
+    static const uint8_t signature[8] = {0x89, 'P', 'N', 'G', '\r', '\n', 0x1a, '\n'};
+    fwrite(signature, 1, sizeof(signature), f);
+
+    std::vector<uint8_t> ihdr;
+    put_be32(ihdr, width);
+    put_be32(ihdr, height);
+    ihdr.insert(ihdr.end(), {8, 2, 0, 0, 0});
+    png_chunk(f, "IHDR", ihdr);
+
+    std::vector<uint8_t> idat = {0x78, 0x01};
+    uint32_t a = 1, b = 0;
+    for (size_t pos = 0; pos < raw.size(); pos += 0xffff) {
+        uint16_t len = std::min<size_t>(raw.size() - pos, 0xffff);
+        idat.push_back(pos + len == raw.size());
+        idat.insert(idat.end(), {(uint8_t)len, (uint8_t)(len >> 8), (uint8_t)~len, (uint8_t)(~len >> 8)});
+        idat.insert(idat.end(), raw.begin() + pos, raw.begin() + pos + len);
+    }
+    for (uint8_t byte : raw) {
+        a = (a + byte) % 65521;
+        b = (b + a) % 65521;
+    }
+    put_be32(idat, (b << 16) | a);
+    png_chunk(f, "IDAT", idat);
+    png_chunk(f, "IEND", {});
+    return fclose(f) == 0;
+}
+
+struct st7789_model : public bb_p_st7789__model, public model_state {
+    enum { COLS = 240, ROWS = 320, ROW_OFFSET = 80 };
+    enum { CASET = 0x2a, RASET = 0x2b, RAMWR = 0x2c, MADCTL = 0x36 };
+
+    uint16_t mem[ROWS][COLS] = {};
+    uint8_t sr = 0;
+    int bits = 0;
+    uint8_t cmd = 0;
+    int nargs = 0;
+    uint8_t args[4] = {};
+    uint8_t madctl = 0;
+    uint16_t x0 = 0, x1 = COLS - 1, y0 = 0, y1 = ROWS - 1;
+    uint16_t x = 0, y = 0;
+    bool high = true;
+    uint16_t pixel = 0;
+    uint64_t bytes = 0;
+    uint32_t frames = 0;
+    uint64_t first_frame = 0, last_frame = 0;
+    uint64_t total_bytes = 0;
+
+    MODEL_STATE(mem, sr, bits, cmd, nargs, args, madctl, x0, x1, y0, y1, x, y, high, pixel,
+                bytes, frames, first_frame, last_frame, total_bytes)
+
+    ~st7789_model() {
+        if (frames > 1) {
+            double secs = (last_frame - first_frame) / (double)sim_clk_hz;
+            fprintf(stderr, "st7789_model: %u frames, %.2f fps, %.0f bytes per frame\n",
+                    frames, (frames - 1) / secs, (double)total_bytes / frames);
+        }
+    }
+
+    void command(uint8_t byte) {
+        cmd = byte;
+        nargs = 0;
+        if (cmd == RAMWR) {
+            x = x0;
+            y = y0;
+            high = true;
+        }
+    }
+
+    void argument(uint8_t byte) {
+        if (cmd == RAMWR) {
+            pixel = (pixel << 8) | byte;
+            high = !high;
+            if (high)
+                write_pixel();
+            return;
+        }
+        if (nargs < 4)
+            args[nargs++] = byte;
+        if (cmd == MADCTL) {
+            madctl = byte;
+        } else if (nargs == 4 && (cmd == CASET || cmd == RASET)) {
+            uint16_t start = (args[0] << 8) | args[1], end = (args[2] << 8) | args[3];
+            if (cmd == CASET) {
+                x0 = start;
+                x1 = end;
+            } else {
+                y0 = start;
+                y1 = end;
+            }
+        }
+    }
+
+    void write_pixel() {
+        if (y < ROWS && x < COLS)
+            mem[y][x] = pixel;
+        // Columns first, or rows first with MADCTL MV, wrapping back to the start of the window
+        bool row_first = madctl & 0x20;
+        uint16_t &inner = row_first ? y : x, &outer = row_first ? x : y;
+        uint16_t inner0 = row_first ? y0 : x0, inner1 = row_first ? y1 : x1;
+        uint16_t outer0 = row_first ? x0 : y0, outer1 = row_first ? x1 : y1;
+        if (inner != inner1) {
+            inner++;
+            return;
+        }
+        inner = inner0;
+        if (outer != outer1) {
+            outer++;
+            return;
+        }
+        outer = outer0;
+        end_frame();
+    }
+
+    void end_frame() {
+        uint64_t interval = sim_cycle - last_frame;
+        if (frames++ == 0)
+            first_frame = sim_cycle;
+        if (sim_lcd_frames) {
+            fprintf(stderr, "st7789_model: frame %u at cycle %llu, %ux%u window, %llu bytes",
+                    frames, (unsigned long long)sim_cycle, x1 - x0 + 1, y1 - y0 + 1, (unsigned long long)bytes);
+            if (frames > 1)
+                fprintf(stderr, ", %.2f fps", sim_clk_hz / (double)interval);
+            fprintf(stderr, "\n");
+            save_frame();
+        }
+        last_frame = sim_cycle;
+        total_bytes += bytes;
+        bytes = 0;
+    }
+
+    void save_frame() {
+        char filename[4096];
+        snprintf(filename, sizeof(filename), "%s/frame%05u.png", sim_lcd_frames, frames);
+        // The screen's x runs up the rows, and its y along the columns
+        std::vector<uint8_t> raw;
+        for (int sy = 0; sy < COLS; sy++) {
+            raw.push_back(0);
+            for (int sx = 0; sx < ROWS - ROW_OFFSET; sx++) {
+                uint16_t p = mem[ROWS - 1 - sx][sy];
+                uint8_t r = p >> 11, g = (p >> 5) & 0x3f, b = p & 0x1f;
+                raw.push_back((r << 3) | (r >> 2));
+                raw.push_back((g << 2) | (g >> 4));
+                raw.push_back((b << 3) | (b >> 2));
+            }
+        }
+        if (!write_png(filename, ROWS - ROW_OFFSET, COLS, raw))
+            fprintf(stderr, "st7789_model: cannot write %s\n", filename);
+    }
+
+    bool eval() override {
+        if (!p_resn.get<bool>()) {
+            madctl = 0;
+            x0 = 0, x1 = COLS - 1, y0 = 0, y1 = ROWS - 1;
+            cmd = 0;
+        }
+        if (p_csn.get<bool>()) {
+            bits = 0;
+        } else if (posedge_p_sclk()) {
+            sr = (sr << 1) | p_copi.get<bool>();
+            if (++bits == 8) {
+                bits = 0;
+                bytes++;
+                if (p_dc.get<bool>())
+                    argument(sr);
+                else
+                    command(sr);
+            }
+        }
+        return bb_p_st7789__model::eval();
+    }
+};
+
+std::unique_ptr<bb_p_st7789__model>
+bb_p_st7789__model::create(std::string name, cxxrtl::metadata_map parameters, cxxrtl::metadata_map attributes) {
+    return std::unique_ptr<bb_p_st7789__model>(new st7789_model());
+}
+
+#endif
+
+} // namespace cxxrtl_design
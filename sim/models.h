@@ -0,0 +1,54 @@
+#ifndef MODELS_H
+#define MODELS_H
+
+#include <cstdint>
+#include <cstdio>
+
+// Number of sync clock cycles simulated so far, maintained by main.cc
+extern uint64_t sim_cycle;
+
+// Frequency of the sync clock, to convert cycles to time
+extern uint32_t sim_clk_hz;
+
+// Directory the LCD model writes each frame to as a PNG, or null to only report the frame rate at the end
+extern const char *sim_lcd_frames;
+
+// Binary trace of bus transfers written by the bus monitors, or null if not tracing.
+// The file starts with a trace_header, followed by a trace_record for each completed transfer.
+extern FILE *sim_trace;
+
+struct trace_header {
+    char magic[8];          // "WBTRACE1"
+    uint32_t record_size;   // sizeof(trace_record)
+    uint32_t clk_hz;        // sync clock frequency, to convert cycles to time
+};
+
+struct trace_record {
+    uint64_t start;         // cycle the transfer was requested in
+    uint32_t addr;          // byte address
+    uint32_t data;          // data written or read
+    uint32_t latency;       // cycles from request to acknowledge
+    uint8_t master;         // position of the master bus
+    uint8_t flags;          // bit 0: write, bits 4-7: byte select
+    uint8_t reserved[2];
+};
+
+static_assert(sizeof(trace_record) == 24, "trace records must be packed");
+
+// Set by the UART model when the firmware sends an EOT character, to end the run if requested
+extern bool sim_finished;
+
+// Set by a bus monitor when start.S writes its marker to the LEDs just before calling main()
+extern bool sim_main_entered;
+
+// Model state outside the design, included in snapshots. Models register themselves on construction.
+struct model_state {
+    model_state();
+    virtual void save(FILE *f) = 0;
+    virtual bool load(FILE *f) = 0;
+};
+
+void save_model_states(FILE *f);
+bool load_model_states(FILE *f);
+
+#endif
@@ -0,0 +1,151 @@
+import json
+import subprocess
+from pathlib import Path
+
+from amaranth import *
+from amaranth.back import rtlil
+
+
+SIM_DIR = Path(__file__).parent
+
+# The Wishbone signals seen by the bus monitors, whatever optional features a bus has
+WB_MONITOR_FIELDS = {"adr": 30, "dat_w": 32, "dat_r": 32, "sel": 4, "cyc": 1, "stb": 1, "we": 1, "ack": 1}
+
+
+class SimPlatform:
+    """
+    Simulation platform that compiles the whole SoC into a C++ model with Yosys' CXXRTL backend.
+
+    Off-chip devices and bus monitors are added with add_model and add_monitor. They become
+    black box instances, implemented in C++ in sim/models.cc, which the design is linked against
+    together with the sim/main.cc test bench.
+
+    With fast_boot, SoCs collapse their power-on delays (LCD reset and init, QSPI power-on) at elaboration.
+    """
+    is_sim = True
+    default_clk_frequency = 25e6
+
+    def __init__(self, build_dir="build/sim", fast_boot=False):
+        self.build_dir = Path(build_dir)
+        self.fast_boot = fast_boot
+        self.clk = Signal()
+        self.rst = Signal()
+        self._blackboxes = {}
+
+    def add_resources(self, resources):
+        pass
+
+    def add_clock_constraint(self, clk, frequency):
+        pass
+
+    def _add_blackbox(self, inst_type, ports, params):
+        # The values of the parameters are given per instance, but their names and types are declared once
+        decl = (ports, tuple(sorted((name, isinstance(value, str)) for name, value in params.items())))
+        prev = self._blackboxes.setdefault(inst_type, decl)
+        if prev[0] != ports:
+            raise ValueError(f"Model {inst_type} instantiated with different ports")
+        if prev[1] != decl[1]:
+            raise ValueError(f"Model {inst_type} instantiated with different parameters")
+
+    def add_model(self, inst_type, rec, edge_det=[], **params):
+        """
+        Add a model of an off-chip device connected to the pins in rec.
+        Fields ending in _i are driven by the model; all others are inputs to it.
+        The fields named in edge_det get edge detection on both edges in the C++ model.
+        """
+        conns = {"i_clk": ClockSignal()}
+        ports = [("input", "clk", 1, "p")]
+        for name, sig in rec.fields.items():
+            if name.endswith("_i"):
+                conns[f"o_{name}"] = sig
+                ports.append(("output", name, len(sig), None))
+            else:
+                conns[f"i_{name}"] = sig
+                ports.append(("input", name, len(sig), "a" if name in edge_det else None))
+        self._add_blackbox(inst_type, ports, params)
+        return Instance(inst_type, **{f"p_{k}": v for k, v in params.items()}, **conns)
+
+    def add_monitor(self, inst_type, bus, fields=WB_MONITOR_FIELDS, **params):
+        """
+        Add a monitor that observes the signals of a bus. Every instance of a monitor has the same ports,
+        fields, a dict of name to width: the bus's signals are zero-extended to them, and any it lacks tied off.
+        """
+        conns = {"i_clk": ClockSignal()}
+        ports = [("input", "clk", 1, "p")]
+        for name, width in fields.items():
+            sig = bus.fields.get(name, Const(0, width))
+            if len(sig) > width:
+                raise ValueError(f"Monitor {inst_type} port {name} is {width} bits, narrower than the bus")
+            conns[f"i_{name}"] = Cat(sig, Const(0, width - len(sig)))
+            ports.append(("input", name, width, None))
+        self._add_blackbox(inst_type, ports, params)
+        return Instance(inst_type, **{f"p_{k}": v for k, v in params.items()}, **conns)
+
+    @staticmethod
+    def regions(soc):
+        """ The address regions of a SoC, from its <name>_base and <name>_size attributes, for trace analysis """
+        regions = {}
+        for attr, value in vars(soc).items():
+            if attr.endswith("_base") and isinstance(value, int):
+                name = attr[:-len("_base")]
+                regions[name] = {"base": value, "size": getattr(soc, f"{name}_size", None)}
+        return regions
+
+    @property
+    def models_v(self):
+        """ Verilog declarations of the black boxes, annotated for CXXRTL """
+        result = ""
+        for inst_type, (ports, params) in self._blackboxes.items():
+            decls = []
+            for direction, name, width, edge in ports:
+                attr = f'(* cxxrtl_edge = "{edge}" *) ' if edge else ""
+                if direction == "output":
+                    attr = "(* cxxrtl_sync *) "
+                decls.append(f"    {attr}{direction} [{width - 1}:0] {name}")
+            result += "(* cxxrtl_blackbox *)\n"
+            result += f"module {inst_type}(\n" + ",\n".join(decls) + "\n);\n"
+            for name, is_str in params:
+                default = '""' if is_str else "0"
+                result += f"    parameter {name} = {default};\n"
+            result += "endmodule\n\n"
+        return result
+
+    def build(self, elaboratable, name="top"):
+        """
+        Elaborate and compile the design, returning the path of the simulator executable.
+        The C++ sources include the generated design as "top.h", so name should be left as top.
+        """
+        self.build_dir.mkdir(parents=True, exist_ok=True)
+
+        with open(self.build_dir / f"{name}.il", "w") as f:
+            f.write(rtlil.convert(elaboratable, name=name, ports=[self.clk, self.rst], platform=self))
+        with open(self.build_dir / "models.v", "w") as f:
+            f.write(self.models_v)
+        with open(self.build_dir / "regions.json", "w") as f:
+            json.dump(self.regions(elaboratable), f, indent=4)
+
+        subprocess.run(["yosys", "-q", "-p",
+                        f"read_rtlil {name}.il; read_verilog models.v; hierarchy -top {name}; proc; "
+                        f"write_cxxrtl -header {name}.cc"],
+                       cwd=self.build_dir, check=True)
+
+        datdir = subprocess.run(["yosys-config", "--datdir"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        exe = self.build_dir / "sim_soc"
+        # Only the models used by the design are compiled
+        defines = [f"-DMODEL_{inst_type}" for inst_type in self._blackboxes]
+        subprocess.run(["g++", "-O3", "-std=c++14", *defines,
+                        f"-I{datdir}/include", f"-I{datdir}/include/backends/cxxrtl/runtime",
+                        f"-I{self.build_dir.resolve()}", f"-I{SIM_DIR.resolve()}",
+                        "-o", str(exe),
+                        str(self.build_dir / f"{name}.cc"), str(SIM_DIR / "models.cc"), str(SIM_DIR / "main.cc")],
+                       check=True)
+        self.exe = exe
+        return exe
+
+    def run(self, args=[]):
+        """
+        Run the simulator; UART output from the firmware is streamed to stdout.
+        Pass ["--trace", file] to record a binary log of the bus transfers, to be analysed with sim/wb_trace.py.
+        """
+        return subprocess.run([str(self.exe), *args], check=True)
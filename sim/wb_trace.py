@@ -0,0 +1,101 @@
+"""
+Analyse a binary Wishbone transaction trace recorded by the simulation bus monitors.
+
+Reports per-slave latency histograms, throughput over time and the slowest transfers.
+Slaves are named from the regions.json written alongside the simulator by SimPlatform.build.
+
+    python sim/wb_trace.py trace.bin --regions build/sim/regions.json --window 100000 --top 20
+"""
+import argparse
+import json
+import struct
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<QIIIBB2x")
+MAGIC = b"WBTRACE1"
+
+
+def read_trace(filename):
+    """ Return the clock frequency and a list of (start, addr, data, latency, master, write, sel) records """
+    with open(filename, "rb") as f:
+        data = f.read()
+    magic, record_size, clk_hz = HEADER.unpack_from(data)
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{filename} is not a Wishbone trace")
+    body = memoryview(data)[HEADER.size:]
+    body = body[:len(body) - len(body) % RECORD.size]
+    return clk_hz, [(start, addr, dat, lat, master, flags & 1, flags >> 4)
+                    for start, addr, dat, lat, master, flags in RECORD.iter_unpack(body)]
+
+
+class RegionMap:
+    """ Map addresses to region names, given a dict of name to {"base", "size"} """
+    def __init__(self, regions):
+        self.regions = sorted((r["base"], r["size"], name) for name, r in regions.items())
+        self.bases = [base for base, _, _ in self.regions]
+
+    def name(self, addr):
+        i = bisect_right(self.bases, addr) - 1
+        if i >= 0:
+            base, size, name = self.regions[i]
+            # Regions without a size extend to the end of their 16MiB window
+            if addr < base + (size or 0x1000000):
+                return name
+        return f"0x{addr & 0xff000000:08x}"
+
+
+def histogram(values):
+    """ Bucket values into powers of two, as (low, high, count) with high inclusive, 0 in a bucket of its own """
+    buckets = Counter(v.bit_length() for v in values)
+    return [((1 << b) >> 1, (1 << b) - 1, n) for b, n in sorted(buckets.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a Wishbone transaction trace")
+    parser.add_argument("trace", help="binary trace file")
+    parser.add_argument("--regions", default="build/sim/regions.json", help="region map of the SoC")
+    parser.add_argument("--window", type=int, default=100000, help="throughput window in cycles")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest transfers to list")
+    args = parser.parse_args()
+
+    clk_hz, records = read_trace(args.trace)
+    with open(args.regions) as f:
+        regions = RegionMap(json.load(f))
+
+    print(f"{len(records)} transfers, clock {clk_hz / 1e6:.3f} MHz")
+    if not records:
+        return
+
+    by_slave = defaultdict(list)
+    for rec in records:
+        by_slave[regions.name(rec[1])].append(rec)
+
+    print("\nLatency per slave (cycles)")
+    for slave, recs in sorted(by_slave.items()):
+        lats = [r[3] for r in recs]
+        reads = sum(1 for r in recs if not r[5])
+        print(f"  {slave}: {len(recs)} transfers ({reads} reads, {len(recs) - reads} writes), "
+              f"min {min(lats)}, mean {sum(lats) / len(lats):.1f}, max {max(lats)}")
+        for low, high, n in histogram(lats):
+            print(f"    {low:6}-{high:<6} {n:8} {'#' * min(60, n * 60 // len(lats))}")
+
+    print(f"\nThroughput per {args.window} cycles ({args.window / clk_hz * 1e3:.3f} ms)")
+    windows = defaultdict(Counter)
+    for start, _, _, _, master, _, sel in records:
+        windows[start // args.window][master] += bin(sel).count("1")
+    masters = sorted(set(r[4] for r in records))
+    print("  window " + "".join(f"   master {m} (MB/s)" for m in masters))
+    seconds = args.window / clk_hz
+    for w in range(min(windows), max(windows) + 1):
+        print(f"  {w:6} " + "".join(f"{windows[w][m] / seconds / 1e6:20.3f}" for m in masters))
+
+    print(f"\nSlowest {args.top} transfers")
+    for start, addr, data, lat, master, write, sel in sorted(records, key=lambda r: -r[3])[:args.top]:
+        print(f"  cycle {start:12} master {master} {'W' if write else 'R'} {addr:08x} ({regions.name(addr)}) "
+              f"data {data:08x} sel {sel:x} latency {lat}")
+
+
+if __name__ == "__main__":
+    main()
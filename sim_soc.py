@@ -0,0 +1,64 @@
+"""
+Compile a SoC variant into a CXXRTL simulation and run its firmware, with the UART output streamed to stdout.
+
+    python sim_soc.py hyper_soc --cycles 50000000
+
+To start each run from main() rather than from reset, boot once with the power-on delays collapsed
+and save a snapshot, then restore it for every run:
+
+    python sim_soc.py hyper_soc --fast-boot --save-snapshot boot.snap
+    python sim_soc.py hyper_soc --fast-boot --no-build --load-snapshot boot.snap --cycles 1000000
+
+The LCD panel model reports the frame rate at the end of the run, and with --lcd-frames writes every
+frame it receives as a PNG:
+
+    python sim_soc.py hyper_soc --fast-boot --cycles 20000000 --lcd-frames frames
+"""
+import argparse
+import os
+
+from cpu_profiles import CPU_PROFILES
+from sim.platform import SimPlatform
+from variants import VARIANTS, get_variant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a SoC variant")
+    parser.add_argument("variant", choices=list(VARIANTS), help="variant to simulate")
+    parser.add_argument("--cycles", type=int, default=0, help="cycles to run, or 0 to run until interrupted")
+    parser.add_argument("--bios", default="software/bios.bin", help="firmware image to run")
+    parser.add_argument("--cpu-profile", choices=list(CPU_PROFILES), help="CPU profile, instead of the variant's default")
+    parser.add_argument("--uart-baud", type=int, help="UART baud rate, instead of the variant's default")
+    parser.add_argument("--build-dir", default="build/sim", help="directory to build the simulator in")
+    parser.add_argument("--no-build", action="store_true", help="run the previously built simulator")
+    parser.add_argument("--fast-boot", action="store_true", help="collapse power-on delays")
+    parser.add_argument("--save-snapshot", metavar="FILE", help="run until main() is entered and save the state")
+    parser.add_argument("--load-snapshot", metavar="FILE", help="start from a saved state")
+    parser.add_argument("--trace", metavar="FILE", help="record a binary trace of the bus transfers")
+    parser.add_argument("--lcd-frames", metavar="DIR", help="write each frame sent to the LCD as a PNG")
+    args = parser.parse_args()
+
+    platform = SimPlatform(build_dir=args.build_dir, fast_boot=args.fast_boot)
+    soc = get_variant(args.variant)(bios_file=args.bios, cpu_profile=args.cpu_profile,
+                                       uart_baud=args.uart_baud)
+    if args.no_build:
+        platform.exe = platform.build_dir / "sim_soc"
+    else:
+        platform.build(soc)
+
+    clk_hz = soc.sync_freq or platform.default_clk_frequency
+    sim_args = ["--cycles", str(args.cycles), "--clk-hz", str(int(clk_hz))]
+    if args.trace:
+        sim_args += ["--trace", args.trace]
+    if args.lcd_frames:
+        os.makedirs(args.lcd_frames, exist_ok=True)
+        sim_args += ["--lcd-frames", args.lcd_frames]
+    if args.save_snapshot:
+        sim_args += ["--save-snapshot", args.save_snapshot]
+    if args.load_snapshot:
+        sim_args += ["--load-snapshot", args.load_snapshot]
+    platform.run(sim_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#include <stdint.h>
+
+#include "generated/soc.h"
+
+/*
+ * Benchmarks of CPU kernels and memory bandwidth and latency for each memory region of the SoC.
+ * Results are reported over the UART, one per line, as
+ *
+ *     BENCH,<kernel>,<region>,<bytes or iterations in hex>,<cycles in hex>
+ *
+ * followed by BENCH,done and an EOT character, which ends a simulation run.
+ */
+
+#define CYCLES() (TIMER0->cycles)
+
+/* Keep clear of the stack when writing to the RAM holding the program's data */
+#define STACK_RESERVE 256
+#define MAX_SWEEP 4096
+
+typedef struct {
+	const char *name;
+	uint32_t base;
+	uint32_t size;
+	int writable;
+} region_t;
+
+#define REGION(name, base, size, writable) { #name, base, size, writable },
+static const region_t regions[] = { SOC_REGIONS(REGION) };
+
+extern uint32_t _heap_start, _efastbss, _sbss, _ebss;
+
+/*
+ * When there is room, a large .bss so that the boot time shows the cost of zeroing it. It is placed
+ * in the bulk RAM, the one .bss is linked into, and being NOBITS adds nothing to bench.bin.
+ */
+#if BULK_RAM_SIZE >= 0x100000
+#define BOOT_BSS_BYTES 0x10000
+__bulk_bss static uint32_t boot_bss[BOOT_BSS_BYTES / 4];
+#endif
+
+#define CONTAINS(r, addr) ((uint32_t)(addr) >= (r)->base && (uint32_t)(addr) < (r)->base + (r)->size)
+
+static void report(const char *kernel, const char *region, uint32_t n, uint32_t cycles) {
+	puts("BENCH,");
+	puts(kernel);
+	putc(',');
+	puts(region);
+	putc(',');
+	puthex(n);
+	putc(',');
+	puthex(cycles);
+	putc('\n');
+}
+
+/* CPU kernels */
+
+static uint32_t crc32(const uint8_t *p, uint32_t len) {
+	uint32_t crc = 0xffffffff;
+	while (len--) {
+		crc ^= *p++;
+		for (int i = 0; i < 8; i++)
+			crc = (crc >> 1) ^ (0xedb88320 & -(crc & 1));
+	}
+	return ~crc;
+}
+
+#define N 4
+
+static int32_t mat_a[N][N], mat_b[N][N], mat_c[N][N];
+
+static void matmul(void) {
+	for (int i = 0; i < N; i++)
+		for (int j = 0; j < N; j++) {
+			int32_t sum = 0;
+			for (int k = 0; k < N; k++)
+				sum += mat_a[i][k] * mat_b[k][j];
+			mat_c[i][j] = sum;
+		}
+}
+
+#define SORT_LEN 32
+
+static uint32_t sort_data[SORT_LEN];
+
+static void sort(void) {
+	uint32_t x = 12345;
+	for (int i = 0; i < SORT_LEN; i++) {
+		x = x * 1103515245 + 12345;
+		sort_data[i] = x >> 16;
+	}
+	for (int i = 1; i < SORT_LEN; i++) {
+		uint32_t v = sort_data[i];
+		int j = i - 1;
+		while (j >= 0 && sort_data[j] > v) {
+			sort_data[j + 1] = sort_data[j];
+			j--;
+		}
+		sort_data[j + 1] = v;
+	}
+}
+
+static void cpu_kernels(void) {
+	uint32_t t;
+
+	t = CYCLES();
+	crc32((const uint8_t *)ROM_BASE, 256);
+	report("crc32", "-", 256, CYCLES() - t);
+
+	for (int i = 0; i < N; i++)
+		for (int j = 0; j < N; j++) {
+			mat_a[i][j] = i + j;
+			mat_b[i][j] = i - j;
+		}
+	t = CYCLES();
+	matmul();
+	report("matmul4", "-", 1, CYCLES() - t);
+
+	t = CYCLES();
+	sort();
+	report("sort32", "-", SORT_LEN, CYCLES() - t);
+}
+
+/* Memory kernels */
+
+static uint32_t read_words(volatile uint32_t *p, uint32_t words) {
+	uint32_t sum = 0;
+	for (uint32_t i = 0; i < words; i += 4)
+		sum += p[i] + p[i + 1] + p[i + 2] + p[i + 3];
+	return sum;
+}
+
+static void write_words(volatile uint32_t *p, uint32_t words) {
+	for (uint32_t i = 0; i < words; i += 4) {
+		p[i] = i;
+		p[i + 1] = i;
+		p[i + 2] = i;
+		p[i + 3] = i;
+	}
+}
+
+/*
+ * Link the words into a ring, each holding the index of the next, 17 words on so that the chain
+ * defeats sequential access. As words is a power of two, the odd stride visits every word.
+ */
+static void chase_ring(volatile uint32_t *p, uint32_t words) {
+	for (uint32_t i = 0; i < words; i++)
+		p[i] = (i + 17) & (words - 1);
+}
+
+/* Follow the ring, each load's address depending on the previous load, so the loads cannot overlap */
+static uint32_t chase(volatile uint32_t *p, uint32_t n) {
+	uint32_t idx = 0;
+	for (uint32_t i = 0; i < n; i++)
+		idx = p[idx];
+	return idx;
+}
+
+static void memory_kernels(const region_t *r) {
+	uint32_t base = r->base;
+	uint32_t limit = r->base + r->size;
+	uint32_t t;
+
+	/* Only use the free space in the RAM regions holding the program's data and stack */
+	if (CONTAINS(r, &_heap_start))
+		base = ((uint32_t)&_heap_start + 15) & ~15;
+	if (CONTAINS(r, &_efastbss) && (uint32_t)&_efastbss > base)
+		base = ((uint32_t)&_efastbss + 15) & ~15;
+	if (CONTAINS(r, STACK_TOP - 1))
+		limit = STACK_TOP - STACK_RESERVE;
+
+	for (uint32_t bytes = 64; bytes <= MAX_SWEEP && base + bytes <= limit; bytes *= 4) {
+		volatile uint32_t *p = (volatile uint32_t *)base;
+
+		t = CYCLES();
+		read_words(p, bytes / 4);
+		report("read", r->name, bytes, CYCLES() - t);
+
+		if (r->writable) {
+			t = CYCLES();
+			write_words(p, bytes / 4);
+			report("write", r->name, bytes, CYCLES() - t);
+
+			t = CYCLES();
+			memset((void *)p, 0, bytes);
+			report("memset", r->name, bytes, CYCLES() - t);
+
+			t = CYCLES();
+			memset_bulk((void *)p, 0, bytes);
+			report("memset_bulk", r->name, bytes, CYCLES() - t);
+
+			t = CYCLES();
+			memcpy((void *)p, (void *)(p + bytes / 8), bytes / 2);
+			report("memcpy", r->name, bytes / 2, CYCLES() - t);
+
+			/* The ring has to be written first, so latency is only measured in writable regions */
+			chase_ring(p, bytes / 4);
+			t = CYCLES();
+			chase(p, 64);
+			report("latency", r->name, 64, CYCLES() - t);
+		}
+	}
+}
+
+void main() {
+	/* The timer counts from reset, so this is the cycles taken by the startup code */
+	uint32_t boot = CYCLES();
+	uint32_t t = CYCLES();
+	report("timer", "-", 0, CYCLES() - t);
+	report("boot", "-", (uint32_t)&_ebss - (uint32_t)&_sbss, boot);
+#ifdef BOOT_BSS_BYTES
+	boot_bss[0] = boot;
+#endif
+
+	cpu_kernels();
+
+	for (unsigned i = 0; i < sizeof(regions) / sizeof(regions[0]); i++)
+		memory_kernels(&regions[i]);
+
+	puts("BENCH,done\n");
+	putc(4);
+
+	while (1)
+		;
+}
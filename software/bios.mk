@@ -1,18 +1,32 @@
 LINKER_SCR=generated/sections.lds
 CC=riscv-none-embed-gcc
 CINC=-I.
-CFLAGS=-g -march=rv32ima -mabi=ilp32 -Wl,--build-id=none,-Bstatic,-T,$(LINKER_SCR),--strip-debug -static -ffreestanding -nostdlib $(CINC)
+MARCH=rv32i
+-include generated/arch.mk
+CFLAGS=-g -march=$(MARCH) -mabi=ilp32 -Wl,--build-id=none,-Bstatic,-T,$(LINKER_SCR),--strip-debug,--gc-sections -static -ffunction-sections -fdata-sections -ffreestanding -nostdlib $(CINC)
+# make BLOG=1 logs binary frames for blog_decode.py rather than text
+ifdef BLOG
+CFLAGS+=-DBLOG
+endif
+BENCH_CFLAGS=$(CFLAGS) -O2
+LIBS=-lgcc
 OBJCOPY=riscv-none-embed-objcopy
 
 BIOS_START=generated/start.S
 DRV_SOURCES=$(wildcard drivers/*.c) $(wildcard drivers/*.S)
 DRV_HEADERS=$(wildcard drivers/*.h)
 
-bios.elf: $(BIOS_START) $(DRV_SOURCES) $(DRV_HEADERS) $(BIOS_HEADERS) $(BIOS_SOURCES) $(LINKER_SCR)
-	riscv-none-embed-gcc $(CFLAGS) -o bios.elf $(BIOS_START) $(DRV_SOURCES) $(BIOS_SOURCES)
+bios.elf: $(BIOS_START) $(DRV_SOURCES) $(DRV_HEADERS) $(BIOS_HEADERS) $(BIOS_SOURCES) $(LINKER_SCR) generated/arch.mk
+	riscv-none-embed-gcc $(CFLAGS) -o bios.elf $(BIOS_START) $(DRV_SOURCES) $(BIOS_SOURCES) $(LIBS)
 
 bios.bin: bios.elf
 	riscv-none-embed-objcopy -O binary bios.elf bios.bin
 
+bench.elf: $(BIOS_START) $(DRV_SOURCES) $(DRV_HEADERS) $(BIOS_HEADERS) $(BENCH_SOURCES) $(LINKER_SCR) generated/arch.mk
+	riscv-none-embed-gcc $(BENCH_CFLAGS) -o bench.elf $(BIOS_START) $(DRV_SOURCES) $(BENCH_SOURCES) $(LIBS)
+
+bench.bin: bench.elf
+	riscv-none-embed-objcopy -O binary bench.elf bench.bin
+
 clean:
-	rm -f bios.bin bios.elf
+	rm -f bios.bin bios.elf bench.bin bench.elf
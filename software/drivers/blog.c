@@ -0,0 +1,20 @@
+#include "blog.h"
+
+#include "generated/soc.h"
+
+void blog_write(uint16_t id, const uint32_t *args, uint32_t n) {
+	uint8_t sum = (id & 0xff) + (id >> 8) + n;
+
+	putb(BLOG_SYNC);
+	putb(id & 0xff);
+	putb(id >> 8);
+	putb(n);
+	for (uint32_t i = 0; i < n; i++) {
+		for (int shift = 0; shift < 32; shift += 8) {
+			uint8_t b = args[i] >> shift;
+			sum += b;
+			putb(b);
+		}
+	}
+	putb(sum);
+}
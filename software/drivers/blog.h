@@ -0,0 +1,38 @@
+#ifndef BLOG_H
+#define BLOG_H
+
+#include <stdint.h>
+
+#include "log_messages.h"
+
+/*
+ * Binary logging: rather than formatting text on the CPU, each message is sent as its id and its
+ * raw 32-bit arguments, and formatted on the host by blog_decode.py from log_messages.h. A frame is
+ *
+ *     0xA5, id (16 bits), argument count (8 bits), arguments (32 bits each), checksum (8 bits)
+ *
+ * all little-endian, where the checksum is the sum of the bytes after the sync byte. Text sent with
+ * puts between frames is passed through by the decoder.
+ *
+ * Frames are not locked against interrupts, as the buffered UART needs its interrupt to drain, so
+ * log from either interrupt handlers or the main loop, not both.
+ */
+
+#define BLOG_SYNC 0xA5
+/* More would be hard to tell from text that happens to contain the sync byte */
+#define BLOG_MAX_ARGS 16
+
+#define BLOG_ID(name, fmt) name,
+enum { LOG_MESSAGES(BLOG_ID) LOG_MESSAGE_COUNT };
+#undef BLOG_ID
+
+void blog_write(uint16_t id, const uint32_t *args, uint32_t n);
+
+/* blog(LOG_X, a, b, ...) logs message LOG_X with up to BLOG_MAX_ARGS arguments, each converted to uint32_t */
+#define blog(id, ...) do { \
+	const uint32_t _blog_args[] = { 0, ##__VA_ARGS__ }; \
+	_Static_assert(sizeof(_blog_args) / sizeof(uint32_t) - 1 <= BLOG_MAX_ARGS, "too many blog arguments"); \
+	blog_write(id, _blog_args + 1, sizeof(_blog_args) / sizeof(uint32_t) - 1); \
+} while (0)
+
+#endif
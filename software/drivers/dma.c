@@ -0,0 +1,53 @@
+#include "dma.h"
+#include "mem.h"
+
+void dma_start(volatile dma_regs_t *dma, const dma_desc_t *chain, int irq) {
+	dma->desc = (uint32_t)chain;
+	dma->ctrl = DMA_CTRL_START | (irq ? DMA_CTRL_IRQ_EN : 0);
+}
+
+/* Wait for the chain to finish, returning non-zero on a bus error */
+int dma_wait(volatile dma_regs_t *dma) {
+	while (dma->status & DMA_STATUS_BUSY)
+		;
+	return dma->status & DMA_STATUS_ERROR;
+}
+
+static void dma_run(volatile dma_regs_t *dma, uint32_t dst, uint32_t src, uint32_t len, uint32_t flags,
+                    uint32_t wait) {
+	/* The descriptor is only needed until the transfer finishes, so it can live on the stack */
+	volatile dma_desc_t desc = { 0, src, dst, len, flags, wait };
+	dma_start(dma, (const dma_desc_t *)&desc, 0);
+	dma_wait(dma);
+}
+
+void dma_copy(volatile dma_regs_t *dma, void *dst, const void *src, size_t n) {
+	/* The engine moves whole aligned words; anything else is left to the CPU */
+	if (((uint32_t)dst | (uint32_t)src) & 3) {
+		memcpy(dst, src, n);
+		return;
+	}
+	size_t words = n & ~3;
+	dma_run(dma, (uint32_t)dst, (uint32_t)src, words, 0, 0);
+	memcpy((char *)dst + words, (const char *)src + words, n - words);
+}
+
+void dma_fill(volatile dma_regs_t *dma, void *dst, int c, size_t n) {
+	size_t head = -(uint32_t)dst & 3;
+	if (head > n)
+		head = n;
+	memset(dst, c, head);
+	dst = (char *)dst + head;
+	n -= head;
+
+	uint32_t word = (c & 0xff) * 0x01010101;
+	size_t words = n & ~3;
+	dma_run(dma, (uint32_t)dst, word, words, DMA_FILL, 0);
+	memset((char *)dst + words, c, n - words);
+}
+
+/* Write words to a peripheral register, waiting for its ready register before each one if given */
+void dma_to_periph(volatile dma_regs_t *dma, volatile uint32_t *reg, const uint32_t *src, size_t words,
+                   volatile uint32_t *ready) {
+	dma_run(dma, (uint32_t)reg, (uint32_t)src, words * 4, DMA_DST_FIXED, (uint32_t)ready);
+}
@@ -0,0 +1,49 @@
+#ifndef DMA_H
+#define DMA_H
+
+#include <stdint.h>
+#include <stddef.h>
+
+typedef struct __attribute__((packed)) {
+	uint32_t desc;
+	uint32_t ctrl;
+	uint32_t status;
+} dma_regs_t;
+
+/* A transfer, which can be chained to others through next */
+typedef struct {
+	uint32_t next;
+	uint32_t src;
+	uint32_t dst;
+	uint32_t len;    /* bytes, a multiple of 4 */
+	uint32_t flags;
+	uint32_t wait;   /* address to poll for non-zero before each word, or 0 */
+} dma_desc_t;
+
+#define DMA_SRC_FIXED (1 << 0)
+#define DMA_DST_FIXED (1 << 1)
+#define DMA_FILL      (1 << 2)
+#define DMA_IRQ       (1 << 3)
+
+#define DMA_CTRL_START  (1 << 0)
+#define DMA_CTRL_IRQ_EN (1 << 1)
+#define DMA_CTRL_CLEAR  (1 << 2)
+
+#define DMA_STATUS_BUSY  (1 << 0)
+#define DMA_STATUS_DONE  (1 << 1)
+#define DMA_STATUS_ERROR (1 << 2)
+
+/*
+ * The CPU data cache does not see DMA writes, so with a CPU profile that has one, read DMA
+ * destinations in cached RAM only through addresses outside the cached region.
+ */
+
+void dma_start(volatile dma_regs_t *dma, const dma_desc_t *chain, int irq);
+int dma_wait(volatile dma_regs_t *dma);
+
+void dma_copy(volatile dma_regs_t *dma, void *dst, const void *src, size_t n);
+void dma_fill(volatile dma_regs_t *dma, void *dst, int c, size_t n);
+void dma_to_periph(volatile dma_regs_t *dma, volatile uint32_t *reg, const uint32_t *src, size_t words,
+                   volatile uint32_t *ready);
+
+#endif
@@ -0,0 +1,39 @@
+#ifndef IRQ_H
+#define IRQ_H
+
+#include <stdint.h>
+
+typedef struct __attribute__((packed)) {
+	uint32_t pending;
+	uint32_t enable;
+	uint32_t vector;
+} irq_regs_t;
+
+static inline void irq_enable(volatile irq_regs_t *irqc, int line) {
+	irqc->enable |= 1u << line;
+}
+
+static inline void irq_disable(volatile irq_regs_t *irqc, int line) {
+	irqc->enable &= ~(1u << line);
+}
+
+/* Disable interrupts at the CPU, returning the previous state for irq_restore */
+static inline uint32_t irq_save(void) {
+	uint32_t mstatus;
+	asm volatile ("csrrci %0, mstatus, 8" : "=r"(mstatus));
+	return mstatus & 8;
+}
+
+static inline void irq_restore(uint32_t state) {
+	asm volatile ("csrs mstatus, %0" :: "r"(state));
+}
+
+/*
+ * Pause in a wait loop. Minerva has no wfi, and trapping it would cost a trap entry and return on
+ * every iteration, so this is a plain nop; the memory clobber makes the loop re-read its condition.
+ */
+static inline void cpu_idle(void) {
+	asm volatile ("nop" ::: "memory");
+}
+
+#endif
@@ -6,7 +6,43 @@ void lcd_putc(volatile lcd_regs_t *lcd, int x, int y, char c) {
 	lcd->ch = c;
 }
 
+/* Moves the console cursor to x, y, then writes s from there, a bus write per character */
 void lcd_puts(volatile lcd_regs_t *lcd, int x, int y, const char *s) {
+	lcd->x = x;
+	lcd->y = y;
+	lcd_console_puts(lcd, s);
+}
+
+void lcd_console_puts(volatile lcd_regs_t *lcd, const char *s) {
 	while (*s != 0)
-		lcd_putc(lcd, x++, y, *s++);
-}
\ No newline at end of file
+		lcd->console = *s++;
+}
+
+void lcd_sprite_load(volatile lcd_regs_t *lcd, int addr, const uint16_t *pixels, int n) {
+	lcd->sprite_addr = addr;
+	while (n--)
+		lcd->sprite_data = *pixels++;
+}
+
+void lcd_sprite_set(volatile lcd_regs_t *lcd, int i, int x, int y, int w, int h, int src, uint16_t key) {
+	lcd->sprite = i;
+	lcd->sprite_src = src;
+	lcd->sprite_key = key;
+	lcd->sprite_pos = x | (y << 8);
+	lcd->sprite_size = w | (h << 8);
+}
+
+void lcd_fb_enable(volatile lcd_regs_t *lcd, const uint16_t *fb) {
+	lcd_fb_show(lcd, fb);
+	lcd->fb_ctrl = LCD_FB_ENABLE;
+}
+
+void lcd_fb_disable(volatile lcd_regs_t *lcd) {
+	lcd->fb_ctrl = 0;
+}
+
+const uint32_t *lcd_image_find(const uint32_t *table, int i) {
+	if (table[0] != LCD_IMAGE_MAGIC || i < 0 || (uint32_t)i >= table[1])
+		return 0;
+	return table + table[2 + 3 * i] / 4;
+}
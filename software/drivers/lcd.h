@@ -3,14 +3,154 @@
 
 #include <stdint.h>
 
+#define LCD_COLS 30
+#define LCD_ROWS 15
+
 typedef struct __attribute__((packed)) {
 	uint32_t ch;
 	uint32_t x;
 	uint32_t y;
 	uint32_t color;
+	uint32_t console;
+	uint32_t scroll;
+	uint32_t cursor;
+	uint32_t refresh;
+	uint32_t rect;
+	uint32_t dirty;
+	uint32_t attr;
+	uint32_t palette;
+	uint32_t sprite;
+	uint32_t sprite_pos;
+	uint32_t sprite_size;
+	uint32_t sprite_src;
+	uint32_t sprite_key;
+	uint32_t sprite_addr;
+	uint32_t sprite_data;
+	/* With a framebuffer */
+	uint32_t fb_addr;
+	uint32_t fb_ctrl;
+	uint32_t fb_status;
+	uint32_t image;
 } lcd_regs_t;
 
+/* A cell attribute: foreground and background palette indices and a font bank */
+#define LCD_ATTR(fg, bg, bank) ((fg) | ((bg) << 4) | ((bank) << 8))
+#define LCD_ATTR_DEFAULT LCD_ATTR(1, 0, 0)
+
+#define LCD_SPRITES 4
+#define LCD_SPRITE_WORDS 1024
+/* Sprite images are stored with each row LCD_SPRITE_STRIDE pixels on from the last */
+#define LCD_SPRITE_STRIDE 16
+
+#define LCD_WIDTH 240
+#define LCD_HEIGHT 240
+
+#define LCD_FB_ENABLE (1 << 0)
+#define LCD_FB_IRQ (1 << 1)
+
+#define LCD_FB_SWAP_PENDING (1 << 0)
+#define LCD_FB_UNDERRUN (1 << 1)
+
+/* An image header: the words of pixels that follow it, and whether they are run-length encoded */
+#define LCD_IMAGE_WORDS(header) ((header) & 0xffffff)
+#define LCD_IMAGE_RLE (1u << 31)
+
+/* The magic number of the index table img2flash.py packs images after, "IMG0" */
+#define LCD_IMAGE_MAGIC 0x30474d49
+
+/* The index in a framebuffer of the pixel at x, y from the top left, as the panel scans down the columns from the right */
+#define LCD_FB_INDEX(x, y) ((LCD_WIDTH - 1 - (x)) * LCD_HEIGHT + (y))
+
 void lcd_putc(volatile lcd_regs_t *lcd, int x, int y,  char c);
 void lcd_puts(volatile lcd_regs_t *lcd, int x, int y,  const char *s);
 
+/*
+ * Console output at the hardware cursor, which advances and wraps by itself, with '\n', '\r' and
+ * '\f' (clear) handled by the hardware, and the screen scrolled by a row offset when it fills
+ */
+static inline void lcd_console_putc(volatile lcd_regs_t *lcd, char c) {
+	lcd->console = c;
+}
+
+static inline void lcd_clear(volatile lcd_regs_t *lcd) {
+	lcd->console = '\f';
+}
+
+void lcd_console_puts(volatile lcd_regs_t *lcd, const char *s);
+
+/* The attribute of the cells written from now on, by either lcd_putc or the console */
+static inline void lcd_set_attr(volatile lcd_regs_t *lcd, uint32_t attr) {
+	lcd->attr = attr;
+}
+
+/* Set one of the 16 palette entries to an RGB565 colour */
+static inline void lcd_set_palette(volatile lcd_regs_t *lcd, int index, uint16_t rgb) {
+	lcd->palette = rgb | (index << 16);
+}
+
+/* Copy n RGB565 pixels to the sprite memory at addr */
+void lcd_sprite_load(volatile lcd_regs_t *lcd, int addr, const uint16_t *pixels, int n);
+
+/*
+ * Show sprite i, w x h pixels of up to 16x16 from the image at src in sprite memory, at x, y, with pixels
+ * of the colour key transparent
+ */
+void lcd_sprite_set(volatile lcd_regs_t *lcd, int i, int x, int y, int w, int h, int src, uint16_t key);
+
+static inline void lcd_sprite_move(volatile lcd_regs_t *lcd, int i, int x, int y) {
+	lcd->sprite = i;
+	lcd->sprite_pos = x | (y << 8);
+}
+
+static inline void lcd_sprite_hide(volatile lcd_regs_t *lcd, int i) {
+	lcd->sprite = i;
+	lcd->sprite_size = 0;
+}
+
+/*
+ * With partial refresh, only the text rows changed and rectangles given to lcd_refresh_rect are sent
+ * to the panel, rather than whole frames continuously
+ */
+static inline void lcd_partial_refresh(volatile lcd_regs_t *lcd, int on) {
+	lcd->refresh = on;
+}
+
+/* Send the pixels from x0, y0 to x1, y1 inclusive, e.g. after drawing there in a framebuffer */
+static inline void lcd_refresh_rect(volatile lcd_regs_t *lcd, int x0, int y0, int x1, int y1) {
+	lcd->rect = x0 | (y0 << 8) | (x1 << 16) | (y1 << 24);
+}
+
+/* Wait until every change has been sent */
+static inline void lcd_refresh_wait(volatile lcd_regs_t *lcd) {
+	while (lcd->dirty)
+		;
+}
+
+/*
+ * Framebuffers of LCD_WIDTH * LCD_HEIGHT RGB565 pixels, fetched by the LCD itself. lcd_fb_show shows fb
+ * from the next frame; once lcd_fb_wait returns, the previous buffer is free to draw into.
+ */
+void lcd_fb_enable(volatile lcd_regs_t *lcd, const uint16_t *fb);
+void lcd_fb_disable(volatile lcd_regs_t *lcd);
+
+static inline void lcd_fb_show(volatile lcd_regs_t *lcd, const uint16_t *fb) {
+	lcd->fb_addr = (uint32_t)fb;
+}
+
+static inline void lcd_fb_wait(volatile lcd_regs_t *lcd) {
+	while (lcd->fb_status & LCD_FB_SWAP_PENDING)
+		;
+}
+
+/*
+ * Show the full-screen image whose header is at image, such as one packed into HyperFlash by
+ * img2flash.py, from the next frame
+ */
+static inline void lcd_image_show(volatile lcd_regs_t *lcd, const void *image) {
+	lcd->image = (uint32_t)image;
+}
+
+/* The header of image i in an img2flash.py index table, or 0 if there is no such image */
+const uint32_t *lcd_image_find(const uint32_t *table, int i);
+
 #endif
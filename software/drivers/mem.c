@@ -0,0 +1,28 @@
+#include "mem.h"
+
+#include "generated/soc.h"
+
+/* Smaller blocks are quicker to copy with the CPU than to set up the copy engine for */
+#ifndef COPY_ENGINE_MIN
+#define COPY_ENGINE_MIN 64
+#endif
+
+void *memcpy_bulk(void *dst, const void *src, size_t n) {
+#ifdef HAVE_COPY_ENGINE
+	if (n >= COPY_ENGINE_MIN) {
+		copy_engine_copy(dst, src, n);
+		return dst;
+	}
+#endif
+	return memcpy(dst, src, n);
+}
+
+void *memset_bulk(void *dst, int c, size_t n) {
+#ifdef HAVE_COPY_ENGINE
+	if (n >= COPY_ENGINE_MIN) {
+		copy_engine_fill(dst, c, n);
+		return dst;
+	}
+#endif
+	return memset(dst, c, n);
+}
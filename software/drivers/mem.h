@@ -0,0 +1,14 @@
+#ifndef MEM_H
+#define MEM_H
+
+#include <stddef.h>
+
+/* Word-at-a-time, unrolled when source and destination are word aligned */
+void *memcpy(void *dst, const void *src, size_t n);
+void *memset(void *dst, int c, size_t n);
+
+/* As memcpy and memset, but using the SoC's copy engine, if it has one, for large blocks */
+void *memcpy_bulk(void *dst, const void *src, size_t n);
+void *memset_bulk(void *dst, int c, size_t n);
+
+#endif
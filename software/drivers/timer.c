@@ -0,0 +1,22 @@
+#include "timer.h"
+
+void timer_start_periodic(volatile timer_regs_t *timer, uint32_t period) {
+	timer->period = period;
+	timer->compare = timer->cycles + period;
+	timer->ctrl = TIMER_CTRL_IRQ_EN | TIMER_CTRL_CLEAR;
+}
+
+void timer_start_oneshot(volatile timer_regs_t *timer, uint32_t delay) {
+	timer->period = 0;
+	timer->compare = timer->cycles + delay;
+	timer->ctrl = TIMER_CTRL_IRQ_EN | TIMER_CTRL_CLEAR;
+}
+
+/* Clear the pending interrupt, from the handler */
+void timer_ack(volatile timer_regs_t *timer) {
+	timer->ctrl = TIMER_CTRL_IRQ_EN | TIMER_CTRL_CLEAR;
+}
+
+void timer_stop(volatile timer_regs_t *timer) {
+	timer->ctrl = TIMER_CTRL_CLEAR;
+}
@@ -0,0 +1,22 @@
+#ifndef TIMER_H
+#define TIMER_H
+
+#include <stdint.h>
+
+typedef struct __attribute__((packed)) {
+	uint32_t cycles;
+	uint32_t compare;
+	uint32_t period;
+	uint32_t ctrl;
+	uint32_t pending;
+} timer_regs_t;
+
+#define TIMER_CTRL_IRQ_EN (1 << 0)
+#define TIMER_CTRL_CLEAR  (1 << 1)
+
+void timer_start_periodic(volatile timer_regs_t *timer, uint32_t period);
+void timer_start_oneshot(volatile timer_regs_t *timer, uint32_t delay);
+void timer_ack(volatile timer_regs_t *timer);
+void timer_stop(volatile timer_regs_t *timer);
+
+#endif
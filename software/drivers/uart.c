@@ -1,11 +1,16 @@
 #include "uart.h"
 
-void uart_putc(volatile uart_regs_t *uart, char c) {
-	if (c == '\n')
-		uart_putc(uart, '\r');
+/* A raw byte, without newline translation */
+void uart_putb(volatile uart_regs_t *uart, uint8_t b) {
 	while (!uart->tx_ready)
 		;
-	uart->tx_data = c;
+	uart->tx_data = b;
+}
+
+void uart_putc(volatile uart_regs_t *uart, char c) {
+	if (c == '\n')
+		uart_putb(uart, '\r');
+	uart_putb(uart, c);
 }
 
 void uart_puts(volatile uart_regs_t *uart, const char *s) {
@@ -10,6 +10,7 @@ typedef struct __attribute__((packed)) {
 	uint32_t rx_avail;
 } uart_regs_t;
 
+void uart_putb(volatile uart_regs_t *uart, uint8_t b);
 void uart_putc(volatile uart_regs_t *uart, char c);
 void uart_puts(volatile uart_regs_t *uart, const char *s);
 void uart_puthex(volatile uart_regs_t *uart, uint32_t x);
@@ -0,0 +1,130 @@
+#include "uart_fifo.h"
+#include "irq.h"
+
+/* Ring sizes, powers of two */
+#define TX_RING 256
+#define RX_RING 64
+
+/* Refill the hardware FIFO when it falls to this many bytes */
+#define TX_THRESHOLD 4
+
+static volatile uart_fifo_regs_t *irq_uart;
+static uint32_t irq_en;
+
+static uint8_t tx_ring[TX_RING];
+static volatile uint32_t tx_head, tx_tail;
+static uint8_t rx_ring[RX_RING];
+static volatile uint32_t rx_head, rx_tail;
+
+static void set_irq_en(volatile uart_fifo_regs_t *uart, uint32_t bits, int on) {
+	uint32_t state = irq_save();
+	irq_en = on ? (irq_en | bits) : (irq_en & ~bits);
+	uart->irq_en = irq_en;
+	irq_restore(state);
+}
+
+void uart_fifo_init(volatile uart_fifo_regs_t *uart) {
+	irq_uart = uart;
+	uart->tx_threshold = TX_THRESHOLD;
+	uart->rx_threshold = 1;
+	set_irq_en(uart, UART_FIFO_IRQ_RX, 1);
+}
+
+void uart_fifo_irq_handler(void) {
+	volatile uart_fifo_regs_t *uart = irq_uart;
+	if (!uart)
+		return;
+
+	while (uart->rx_avail) {
+		uint8_t c = uart->rx_data;
+		uint32_t next = (rx_head + 1) & (RX_RING - 1);
+		if (next != rx_tail) {
+			rx_ring[rx_head] = c;
+			rx_head = next;
+		}
+	}
+
+	while (tx_tail != tx_head && uart->tx_ready) {
+		uart->tx_data = tx_ring[tx_tail];
+		tx_tail = (tx_tail + 1) & (TX_RING - 1);
+	}
+	if (tx_tail == tx_head)
+		set_irq_en(uart, UART_FIFO_IRQ_TX, 0);
+}
+
+static void enqueue(volatile uart_fifo_regs_t *uart, char c) {
+	/* Straight to the hardware FIFO when nothing is queued ahead of it */
+	if (tx_head == tx_tail && uart->tx_ready) {
+		uart->tx_data = c;
+		return;
+	}
+	uint32_t next = (tx_head + 1) & (TX_RING - 1);
+	/*
+	 * With the ring full, move bytes to the hardware FIFO here rather than waiting for the interrupt
+	 * handler, which cannot run when this is called from an interrupt or with interrupts masked
+	 */
+	while (next == tx_tail) {
+		uint32_t state = irq_save();
+		if (tx_tail != tx_head && uart->tx_ready) {
+			uart->tx_data = tx_ring[tx_tail];
+			tx_tail = (tx_tail + 1) & (TX_RING - 1);
+		}
+		irq_restore(state);
+	}
+	tx_ring[tx_head] = c;
+	tx_head = next;
+	set_irq_en(uart, UART_FIFO_IRQ_TX, 1);
+}
+
+/* Change the baud rate once everything queued has been sent at the old one */
+void uart_fifo_set_baud(volatile uart_fifo_regs_t *uart, uint32_t clk_freq, uint32_t baud) {
+	uart_fifo_flush(uart);
+	uart->divisor = UART_FIFO_DIVISOR(clk_freq, baud);
+}
+
+/* A raw byte, without newline translation */
+void uart_fifo_putb(volatile uart_fifo_regs_t *uart, uint8_t b) {
+	if (irq_uart != uart)
+		uart_fifo_init(uart);
+	enqueue(uart, b);
+}
+
+void uart_fifo_putc(volatile uart_fifo_regs_t *uart, char c) {
+	if (irq_uart != uart)
+		uart_fifo_init(uart);
+	if (c == '\n')
+		enqueue(uart, '\r');
+	enqueue(uart, c);
+}
+
+void uart_fifo_puts(volatile uart_fifo_regs_t *uart, const char *s) {
+	while (*s != 0)
+		uart_fifo_putc(uart, *s++);
+}
+
+void uart_fifo_puthex(volatile uart_fifo_regs_t *uart, uint32_t x) {
+	for (int i = 7; i >= 0; i--) {
+		uint8_t nib = (x >> (4 * i)) & 0xF;
+		if (nib <= 9)
+			uart_fifo_putc(uart, '0' + nib);
+		else
+			uart_fifo_putc(uart, 'A' + (nib - 10));
+	}
+}
+
+/* The next received byte, or -1 if there is none */
+int uart_fifo_getc(volatile uart_fifo_regs_t *uart) {
+	if (irq_uart != uart)
+		uart_fifo_init(uart);
+	if (rx_head == rx_tail)
+		return -1;
+	uint8_t c = rx_ring[rx_tail];
+	rx_tail = (rx_tail + 1) & (RX_RING - 1);
+	return c;
+}
+
+/* Wait until everything queued has been sent, including the stop bit of the last byte */
+void uart_fifo_flush(volatile uart_fifo_regs_t *uart) {
+	while (tx_head != tx_tail || !uart->tx_idle)
+		;
+}
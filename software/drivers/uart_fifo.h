@@ -0,0 +1,44 @@
+#ifndef UART_FIFO_H
+#define UART_FIFO_H
+
+#include <stdint.h>
+
+typedef struct __attribute__((packed)) {
+	uint32_t tx_data;
+	uint32_t rx_data;
+	uint32_t tx_ready;
+	uint32_t rx_avail;
+	uint32_t divisor;
+	uint32_t tx_level;
+	uint32_t rx_level;
+	uint32_t tx_threshold;
+	uint32_t rx_threshold;
+	uint32_t irq_en;
+	uint32_t irq_pending;
+	uint32_t tx_idle;
+} uart_fifo_regs_t;
+
+#define UART_FIFO_IRQ_TX (1 << 0)
+#define UART_FIFO_IRQ_RX (1 << 1)
+
+/* The divisor register value for a baud rate: clock cycles per bit, in units of 1/256 */
+#define UART_FIFO_DIVISOR(clk_freq, baud) ((uint32_t)(((uint64_t)(clk_freq) * 256 + (baud) / 2) / (baud)))
+
+/*
+ * Output is queued in a RAM ring buffer and moved to the hardware FIFO by the interrupt handler,
+ * so these only wait when the ring is full, when they move bytes to the FIFO themselves, so that
+ * they are safe to call from interrupt handlers. Input is buffered the same way.
+ */
+void uart_fifo_init(volatile uart_fifo_regs_t *uart);
+void uart_fifo_set_baud(volatile uart_fifo_regs_t *uart, uint32_t clk_freq, uint32_t baud);
+void uart_fifo_putb(volatile uart_fifo_regs_t *uart, uint8_t b);
+void uart_fifo_putc(volatile uart_fifo_regs_t *uart, char c);
+void uart_fifo_puts(volatile uart_fifo_regs_t *uart, const char *s);
+void uart_fifo_puthex(volatile uart_fifo_regs_t *uart, uint32_t x);
+int uart_fifo_getc(volatile uart_fifo_regs_t *uart);
+void uart_fifo_flush(volatile uart_fifo_regs_t *uart);
+
+/* Called from the trap vector */
+void uart_fifo_irq_handler(void);
+
+#endif
@@ -0,0 +1,13 @@
+#ifndef LOG_MESSAGES_H
+#define LOG_MESSAGES_H
+
+/*
+ * The messages logged with blog, as X(id, format). Ids are numbered in order, so only add to the
+ * end of the list to keep old captures decodable. Formats are printf-style, with %d, %u, %x, %X,
+ * %c and %f (the argument's bits as a float) each taking a 32-bit argument.
+ */
+#define LOG_MESSAGES(X) \
+    X(LOG_BOOT, "boot: firmware started at %u Hz") \
+    X(LOG_TICK, "tick %u: leds %02x, color %04x")
+
+#endif
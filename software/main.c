@@ -1,9 +1,20 @@
 #include <stdint.h>
 
 #include "generated/soc.h"
+#include "drivers/blog.h"
+
+static volatile int ticks;
+
+void timer0_irq_handler(void) {
+	timer_ack(TIMER0);
+	ticks++;
+}
 
 void main() {
     puts("StormSoc\n");
+#ifdef BLOG
+	blog(LOG_BOOT, CLK_FREQ);
+#endif
 
 	LED_GPIO->oe = 1;
 	LED_GPIO->out = 0;
@@ -12,13 +23,24 @@ void main() {
 
 	lcd_puts(LCD0, 7, 5, "Hello World!");
 
+	// Tick at 25Hz, sleeping in between
+	timer_start_periodic(TIMER0, CLK_FREQ / 25);
+	irq_enable(IRQC0, TIMER0_IRQ);
+
 	while(1) {
 		LED_GPIO->out = LED_GPIO->out + 1;
 		SEG70->val = color >> 4;
 
 		LCD0->color = color;
 		color += 16;
-		for(int i=0;i<100000;i++) asm volatile ("");
+
+		int t = ticks;
+		while (ticks == t)
+			cpu_idle();
+#ifdef BLOG
+		blog(LOG_TICK, t, LED_GPIO->out, color);
+#else
 		puts("Hello\n");
+#endif
 	};
 }
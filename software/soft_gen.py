@@ -1,14 +1,38 @@
 from pathlib import Path
 
+
+def read_hot_list(filename):
+    """ Read a list of function names to run from RAM, one per line, as written by hotlist.py """
+    path = Path(filename)
+    if not path.exists():
+        return []
+    names = [line.split("#")[0].strip() for line in path.read_text().splitlines()]
+    return [n for n in names if n]
+
+
 class SoftwareGenerator:
-    def __init__(self, *, rom_start, rom_size, ram_start, ram_size):
+    """
+    Generates soc.h, start.S and the linker script for the firmware of a SoC.
+
+    The RAM given to the constructor is treated as fast unless ram_fast is False. Further RAM regions
+    can be added with add_ram. The stack, small data (.sdata/.sbss), __fast functions and data marked
+    __fast_data/__fast_bss go in the first fast region, and .data, .bss, data marked
+    __bulk_data/__bulk_bss and the heap in the largest slow region, or the fast region if there is none.
+    """
+    def __init__(self, *, rom_start, rom_size, ram_start, ram_size, ram_fast=True, march="rv32i"):
         self.rom_start = rom_start
         self.rom_size = rom_size
         self.ram_start = ram_start
         self.ram_size = ram_size
+        self.rams = [("RAM", ram_start, ram_size, ram_fast)]
+        self.march = march
         self.defines = []
         self.periphs = []
+        self.regions = []
         self.extra_init = []
+        self.hot_functions = []
+        self.copy_engine = None
+        self.irqs = []
 
     def generate(self, out_dir):
         Path(out_dir).mkdir(parents=True, exist_ok=True)
@@ -18,10 +42,59 @@ class SoftwareGenerator:
             f.write(self.lds)
         with open(Path(out_dir) / "soc.h", "w") as f:
             f.write(self.soc_h)
+        with open(Path(out_dir) / "arch.mk", "w") as f:
+            f.write(self.arch_mk)
 
     def add_periph(self, periph_type, name, address):
         self.periphs.append((periph_type, name, address))
 
+    def add_ram(self, name, start, size, fast=False):
+        """ Add a RAM region for the linker to place sections in """
+        self.rams.append((name, start, size, fast))
+
+    @property
+    def fast_ram(self):
+        return next((r for r in self.rams if r[3]), self.rams[0])
+
+    @property
+    def bulk_ram(self):
+        slow = [r for r in self.rams if not r[3]]
+        return max(slow, key=lambda r: r[2]) if slow else self.fast_ram
+
+    def add_region(self, name, start, size, writable=True):
+        """ Describe a memory region of the SoC to the firmware, e.g. for benchmarks """
+        self.regions.append((name, start, size, writable))
+
+    def add_hot_functions(self, names):
+        """
+        Link the named functions into .ramfunc, to run from RAM. The firmware must be compiled with
+        -ffunction-sections, as bios.mk does.
+        """
+        self.hot_functions += [n for n in names if n not in self.hot_functions]
+
+    def add_define(self, name, value):
+        self.defines.append((name, value))
+
+    def add_irq(self, name, line, handler=None):
+        """
+        Give the named peripheral interrupt line `line` of the interrupt controller (an "irq" peripheral).
+        The trap vector calls <name in lower case>_irq_handler for it, which the firmware may define.
+        If handler is given, it names a function provided by the peripheral's driver instead, and the
+        line is enabled at boot.
+        """
+        self.irqs.append((name, line, handler))
+
+    @property
+    def irq_controller(self):
+        return next(((n, a) for t, n, a in self.periphs if t == "irq"), None)
+
+    def set_copy_engine(self, name):
+        """
+        Use the named peripheral for memcpy_bulk/memset_bulk and to zero .bss at boot. Its driver
+        must provide <type>_copy(regs, dst, src, n) and <type>_fill(regs, dst, c, n).
+        """
+        self.copy_engine = name
+
     def add_extra_init(self, asm):
         self.extra_init.append(asm)
 
@@ -33,22 +106,72 @@ class SoftwareGenerator:
 
         for t in periph_types:
             result += f'#include "drivers/{t}.h"\n'
+        result += '#include "drivers/mem.h"\n'
         result += "\n"
 
         uart = None
 
         for t, n, a in self.periphs:
-            if uart is None and t == "uart": # first UART
-                uart = n
+            if uart is None and t in ("uart", "uart_fifo"): # first UART
+                uart = (t, n)
             result += f'#define {n} ((volatile {t}_regs_t *const)0x{a:08x})\n'
 
         result += '\n'
 
+        for n, v in self.defines:
+            result += f'#define {n} {v}\n'
+        if self.defines:
+            result += '\n'
+
+        if self.irqs:
+            for n, line, _ in self.irqs:
+                result += f'#define {n}_IRQ {line}\n'
+            for n, line, handler in self.irqs:
+                if handler is None:
+                    result += f'void {n.lower()}_irq_handler(void);\n'
+            result += '\n'
+
+        result += f'#define ROM_BASE 0x{self.rom_start:08x}\n'
+        result += f'#define ROM_SIZE 0x{self.rom_size:08x}\n'
+        result += f'#define RAM_BASE 0x{self.ram_start:08x}\n'
+        result += f'#define RAM_SIZE 0x{self.ram_size:08x}\n'
+        for n, start, size, fast in self.rams[1:]:
+            result += f'#define {n}_BASE 0x{start:08x}\n'
+            result += f'#define {n}_SIZE 0x{size:08x}\n'
+        _, fast_start, fast_size, _ = self.fast_ram
+        result += f'#define STACK_TOP 0x{fast_start + fast_size:08x}\n'
+        _, _, bulk_size, _ = self.bulk_ram
+        result += f'#define BULK_RAM_SIZE 0x{bulk_size:08x}\n'
+        result += '\n'
+
+        # X-macro listing the memory regions as X(name, base, size, writable)
+        result += '#define SOC_REGIONS(X)'
+        for n, start, size, writable in self.regions:
+            result += f' \\\n    X({n}, 0x{start:08x}, 0x{size:08x}, {int(writable)})'
+        result += '\n\n'
+
+        if self.copy_engine is not None:
+            t = next(t for t, n, _ in self.periphs if n == self.copy_engine)
+            result += '#define HAVE_COPY_ENGINE 1\n'
+            result += f'#define copy_engine_copy(d, s, n) {t}_copy({self.copy_engine}, d, s, n)\n'
+            result += f'#define copy_engine_fill(d, c, n) {t}_fill({self.copy_engine}, d, c, n)\n\n'
+
+        # Functions to copy to RAM at boot, for code otherwise executing in place from slow memory
+        result += '#define __fast __attribute__((section(".ramfunc"), noinline))\n'
+        # Explicit placement of data in the fast or the bulk RAM
+        result += '#define __fast_data __attribute__((section(".fast.data")))\n'
+        result += '#define __fast_bss __attribute__((section(".sbss.fast")))\n'
+        result += '#define __bulk_data __attribute__((section(".bulk.data")))\n'
+        result += '#define __bulk_bss __attribute__((section(".bss.bulk")))\n\n'
+
         if uart is not None:
-            result += f'#define putc(x) uart_putc({uart}, x)\n'
-            result += f'#define puts(x) uart_puts({uart}, x)\n'
-            result += f'#define puthex(x) uart_puthex({uart}, x)\n'
+            t, n = uart
+            result += f'#define putb(x) {t}_putb({n}, x)\n'
+            result += f'#define putc(x) {t}_putc({n}, x)\n'
+            result += f'#define puts(x) {t}_puts({n}, x)\n'
+            result += f'#define puthex(x) {t}_puthex({n}, x)\n'
         else:
+            result += f'#define putb(x) do {{ (void)x; }} while(0)\n'
             result += f'#define putc(x) do {{ (void)x; }} while(0) \n'
             result += f'#define puts(x) do {{ (void)x; }} while(0)\n'
             result += f'#define puthex(x) do {{ (void)x; }} while(0)\n'
@@ -56,17 +179,93 @@ class SoftwareGenerator:
         result += "#endif\n"
         return result
 
+    @property
+    def arch_mk(self):
+        # Included by bios.mk so that the firmware only uses instructions the CPU implements
+        return f"MARCH={self.march}\n"
+
+    @staticmethod
+    def _copy_loop(name, src, start, end):
+        """
+        Copy the words from src to [start, end), for the section initialisation in start.S.
+        Four words are moved per iteration, loads ahead of stores, then any remaining words singly.
+        """
+        return f"""la a0, {src}
+la a1, {start}
+la a2, {end}
+addi a5, a2, -16
+bgtu a1, a5, tail_init_{name}
+loop_init_{name}:
+lw a3, 0(a0)
+lw a4, 4(a0)
+lw a6, 8(a0)
+lw a7, 12(a0)
+sw a3, 0(a1)
+sw a4, 4(a1)
+sw a6, 8(a1)
+sw a7, 12(a1)
+addi a0, a0, 16
+addi a1, a1, 16
+bleu a1, a5, loop_init_{name}
+tail_init_{name}:
+bgeu a1, a2, end_init_{name}
+tail_loop_init_{name}:
+lw a3, 0(a0)
+sw a3, 0(a1)
+addi a0, a0, 4
+addi a1, a1, 4
+bltu a1, a2, tail_loop_init_{name}
+end_init_{name}:"""
+
+    @staticmethod
+    def _zero_loop(name, start, end):
+        """ Zero the words in [start, end), four words per iteration then any remaining words singly """
+        return f"""la a0, {start}
+la a1, {end}
+addi a5, a1, -16
+bgtu a0, a5, tail_init_{name}
+loop_init_{name}:
+sw zero, 0(a0)
+sw zero, 4(a0)
+sw zero, 8(a0)
+sw zero, 12(a0)
+addi a0, a0, 16
+bleu a0, a5, loop_init_{name}
+tail_init_{name}:
+bgeu a0, a1, end_init_{name}
+tail_loop_init_{name}:
+sw zero, 0(a0)
+addi a0, a0, 4
+bltu a0, a1, tail_loop_init_{name}
+end_init_{name}:"""
+
+    @property
+    def _bss_init(self):
+        if self.copy_engine is None:
+            return self._zero_loop("bss", "_sbss", "_ebss")
+        # The stack is already usable, so hand the possibly large .bss to the copy engine
+        return """la a0, _sbss
+li a1, 0
+la a2, _ebss
+sub a2, a2, a0
+call memset_bulk"""
+
     @property
     def start(self):
         joined_init = '\n'.join(self.extra_init)
+        _, fast_start, fast_size, _ = self.fast_ram
         return f""".section .text
 
+.globl start
 start:
 
 # zero-initialize register file
 addi x1, zero, 0
-li x2, 0x{self.ram_start+self.ram_size:08x} # Top of stack
-addi x3, zero, 0
+li x2, 0x{fast_start+fast_size:08x} # Top of stack, in the fast RAM
+.option push
+.option norelax
+la x3, __global_pointer$ # For gp-relative access to small data
+.option pop
 addi x4, zero, 0
 addi x5, zero, 0
 addi x6, zero, 0
@@ -98,49 +297,146 @@ addi x31, zero, 0
 
 {joined_init}
 
+# copy functions to run from RAM
+{self._copy_loop("ramfunc", "_siramfunc", "_sramfunc", "_eramfunc")}
+fence.i
+
+# copy small data section, in the fast RAM
+{self._copy_loop("fastdata", "_sifastdata", "_sfastdata", "_efastdata")}
+
 # copy data section
-la a0, _sidata
-la a1, _sdata
-la a2, _edata
-bge a1, a2, end_init_data
-loop_init_data:
-lw a3, 0(a0)
-sw a3, 0(a1)
-addi a0, a0, 4
-addi a1, a1, 4
-blt a1, a2, loop_init_data
-end_init_data:
+{self._copy_loop("data", "_sidata", "_sdata", "_edata")}
+
+# zero-init small bss section, in the fast RAM
+{self._zero_loop("fastbss", "_sfastbss", "_efastbss")}
 
 # zero-init bss section
-la a0, _sbss
-la a1, _ebss
-bge a0, a1, end_init_bss
-loop_init_bss:
-sw zero, 0(a0)
-addi a0, a0, 4
-blt a0, a1, loop_init_bss
-end_init_bss:
+{self._bss_init}
 
 # Update LEDs
 li a0, 0xb1000000
 li a1, 2
 sw a1, 0(a0)
 
+# Install the trap vector and enable the interrupt controller's line into the CPU
+la a0, trap_entry
+csrw mtvec, a0
+li a0, 1
+csrw 0x330, a0 # Minerva irq_mask
+li a0, 0x800
+csrs mie, a0 # MEIE
+csrs mstatus, 8 # MIE
+{self._driver_irqs}
 # call main
 call main
 loop:
 j loop
+
+{self._trap_vector}
+"""
+
+    @property
+    def _driver_irqs(self):
+        """ Enable the interrupt lines whose handlers are in the drivers """
+        mask = sum(1 << line for _, line, handler in self.irqs if handler is not None)
+        if not mask or self.irq_controller is None:
+            return ""
+        return f"""
+# Enable the interrupts handled by the drivers
+li a0, 0x{self.irq_controller[1] + 4:08x}
+li a1, 0x{mask:08x}
+sw a1, 0(a0)
+"""
+
+    @property
+    def _trap_vector(self):
+        """ Trap entry, saving the caller-saved registers and dispatching interrupts through irq_table """
+        saved = ["ra", "t0", "t1", "t2", "a0", "a1", "a2", "a3", "a4", "a5", "a6", "a7", "t3", "t4", "t5", "t6"]
+        save = "\n".join(f"sw {r}, {i * 4}(sp)" for i, r in enumerate(saved))
+        restore = "\n".join(f"lw {r}, {i * 4}(sp)" for i, r in enumerate(saved))
+        n_lines = max((line for _, line, _ in self.irqs), default=-1) + 1
+        handlers = {line: handler or f"{n.lower()}_irq_handler" for n, line, handler in self.irqs}
+        table = "\n".join(f".word {handlers.get(i, 'default_irq_handler')}" for i in range(n_lines))
+        weak = "\n".join(f".weak {n.lower()}_irq_handler\n.set {n.lower()}_irq_handler, default_irq_handler"
+                          for n, _, handler in self.irqs if handler is None)
+        controller = self.irq_controller
+        if controller is None or n_lines == 0:
+            dispatch = "# No interrupt controller"
+        else:
+            # vector is the third register of the interrupt controller
+            dispatch = f"""li t0, 0x{controller[1] + 8:08x}
+lw t0, 0(t0) # vector of the interrupt controller
+li t1, {n_lines}
+bgeu t0, t1, trap_return
+slli t0, t0, 2
+la t1, irq_table
+add t1, t1, t0
+lw t1, 0(t1)
+jalr t1"""
+        return f""".align 2
+trap_entry:
+addi sp, sp, -{len(saved) * 4}
+{save}
+csrr a0, mcause
+bgez a0, trap_exception_entry
+
+# External interrupt: call the handler of the active line
+{dispatch}
+j trap_return
+
+trap_exception_entry:
+csrr a1, mepc
+call trap_exception
+
+trap_return:
+{restore}
+addi sp, sp, {len(saved) * 4}
+mret
+
+default_irq_handler:
+ret
+
+# Exceptions stop here unless the firmware defines trap_exception(mcause, mepc)
+default_trap_exception:
+j default_trap_exception
+
+.weak trap_exception
+.set trap_exception, default_trap_exception
+{weak}
+
+.section .rodata
+.align 2
+irq_table:
+{table}
 """
 
     @property
     def lds(self):
-        return f"""MEMORY
+        hot = "".join(f"        *(.text.{name})\n" for name in self.hot_functions)
+        memory = "".join(f"    {n + ' (xrw)':15} : ORIGIN = 0x{start:08x}, LENGTH = 0x{size:08x}\n"
+                         for n, start, size, _ in self.rams)
+        fast = self.fast_ram[0]
+        bulk = self.bulk_ram[0]
+        return f"""ENTRY(start)
+
+MEMORY
 {{
     FLASH (rx)      : ORIGIN = 0x{self.rom_start:08x}, LENGTH = 0x{self.rom_size:08x}
-    RAM (xrw)       : ORIGIN = 0x{self.ram_start:08x}, LENGTH = 0x{self.ram_size:08x}
-}}
+{memory}}}
 
 SECTIONS {{
+    /* Functions that run from RAM, but are loaded after the code in FLASH and copied by the startup.
+       This comes first so that the hot function sections are not matched by .text below. */
+    .ramfunc : AT ( _siramfunc )
+    {{
+        . = ALIGN(4);
+        _sramfunc = .;     /* create a global symbol at ramfunc start; used by startup code */
+        *(.ramfunc)        /* functions marked __fast */
+        *(.ramfunc*)
+{hot}        . = ALIGN(4);
+        _eramfunc = .;     /* define a global symbol at ramfunc end; used by startup code */
+    }} >{fast}
+
     /* The program code and other data goes into FLASH */
     .text :
     {{
@@ -153,15 +449,41 @@ SECTIONS {{
         *(.srodata*)       /* .rodata* sections (constants, strings, etc.) */
         . = ALIGN(4);
         _etext = .;        /* define a global symbol at end of code */
-        _sidata = _etext;  /* This is used by the startup in order to initialize the .data secion */
+        _siramfunc = _etext; /* This is used by the startup in order to copy the .ramfunc section */
     }} >FLASH
 
+    /* Initialised small data, and data marked __fast_data, in the fast RAM and addressed from gp.
+       Like .ramfunc and .data, the initial values are loaded in FLASH and copied by the startup. */
+    .fastdata : AT ( _siramfunc + SIZEOF(.ramfunc) )
+    {{
+        . = ALIGN(4);
+        _sfastdata = .;
+        __global_pointer$ = . + 0x800;
+        *(.sdata)           /* .sdata sections */
+        *(.sdata*)          /* .sdata* sections */
+        *(.fast.data*)
+        . = ALIGN(4);
+        _efastdata = .;
+    }} >{fast}
+    _sifastdata = LOADADDR(.fastdata);
+
+    /* Zero initialised small data, and data marked __fast_bss, in .sbss.fast. GCC only makes sections
+    named .sbss* and .bss* NOBITS, and NOLOAD keeps their zeroes out of the image either way */
+    .fastbss (NOLOAD) :
+    {{
+        . = ALIGN(4);
+        _sfastbss = .;
+        *(.sbss)
+        *(.sbss*)
+        . = ALIGN(4);
+        _efastbss = .;
+    }} >{fast}
 
     /* This is the initialized data section
     The program executes knowing that the data is in the RAM
     but the loader puts the initial values in the FLASH (inidata).
     It is one task of the startup to copy the initial values from FLASH to RAM. */
-    .data : AT ( _sidata )
+    .data : AT ( _sifastdata + SIZEOF(.fastdata) )
     {{
         . = ALIGN(4);
         _sdata = .;        /* create a global symbol at data start; used by startup code in order to initialise the .data section in RAM */
@@ -169,32 +491,30 @@ SECTIONS {{
         . = ALIGN(4);
         *(.data)           /* .data sections */
         *(.data*)          /* .data* sections */
-        *(.sdata)           /* .sdata sections */
-        *(.sdata*)          /* .sdata* sections */
+        *(.bulk.data*)
         . = ALIGN(4);
         _edata = .;        /* define a global symbol at data end; used by startup code in order to initialise the .data section in RAM */
-    }} >RAM
+    }} >{bulk}
+    _sidata = LOADADDR(.data); /* This is used by the startup in order to initialize the .data secion */
 
-    /* Uninitialized data section */
-    .bss :
+    /* Uninitialized data section, including data marked __bulk_bss, in .bss.bulk */
+    .bss (NOLOAD) :
     {{
         . = ALIGN(4);
         _sbss = .;         /* define a global symbol at bss start; used by startup code */
         *(.bss)
         *(.bss*)
-        *(.sbss)
-        *(.sbss*)
         *(COMMON)
 
         . = ALIGN(4);
         _ebss = .;         /* define a global symbol at bss end; used by startup code */
-    }} >RAM
+    }} >{bulk}
 
     /* this is to define the start of the heap, and make sure we have a minimum size */
     .heap :
     {{
         . = ALIGN(4);
         _heap_start = .;    /* define a global symbol at heap start */
-    }} >RAM
+    }} >{bulk}
 }}
 """
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules under test live at the top of the repository, alongside the SoC scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
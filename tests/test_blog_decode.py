@@ -0,0 +1,48 @@
+import struct
+
+import blog_decode
+from blog_decode import SYNC, FrameDecoder, format_message, read_messages
+
+MESSAGES = [("LOG_BOOT", "boot at %u Hz"), ("LOG_VALUES", "%d %x %c %.1f")]
+
+
+def frame(msg_id, *args):
+    body = struct.pack(f"<HB{len(args)}I", msg_id, len(args), *args)
+    return bytes([SYNC]) + body + bytes([sum(body) & 0xff])
+
+
+def decode(data, chunk=None):
+    decoder = FrameDecoder(MESSAGES)
+    chunk = chunk or len(data)
+    out = ""
+    for i in range(0, len(data), chunk):
+        out += "".join(decoder.feed(data[i:i + chunk]))
+    return out + decoder.flush()
+
+
+def test_read_messages():
+    messages = read_messages(blog_decode.__file__.replace("blog_decode.py", "software/log_messages.h"))
+    assert [name for name, _ in messages][:2] == ["LOG_BOOT", "LOG_TICK"]
+    assert all("%" in fmt for _, fmt in messages)
+
+
+def test_format_message():
+    assert format_message("%d %u %x %c %.1f %%", [0xffffffff, 5, 255, 0x41, 0x3fc00000]) == "-1 5 ff A 1.5 %"
+    assert format_message("%u %u", [1]) == "1 <missing>"
+    assert format_message("%u", [1, 2]) == "1 [00000002]"
+
+
+def test_frames_between_text():
+    data = b"hello\n" + frame(0, 25000000) + b"bye\n"
+    assert decode(data) == "hello\nboot at 25000000 Hz\nbye\n"
+    # Split across reads, a byte at a time
+    assert decode(data, chunk=1) == "hello\nboot at 25000000 Hz\nbye\n"
+
+
+def test_bad_frames_are_text():
+    good = frame(1, 0xfffffffe, 16, ord("z"), 0)
+    bad = bytearray(good)
+    bad[-1] ^= 0xff
+    assert decode(bytes(bad) + good).endswith("-2 10 z 0.0\n")
+    # An unknown id is not a frame, and the text after it is kept
+    assert decode(bytes([SYNC]) + struct.pack("<HB", 7, 0) + b"ok") == "\ufffd\x07\x00\x00ok"
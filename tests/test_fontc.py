@@ -0,0 +1,97 @@
+import struct
+
+import fontc
+from fontc import HEIGHT, glyph_map, pack, parse_ranges, read_bdf, read_font, read_psf, subset
+
+FONT = fontc.__file__.replace("fontc.py", "peripheral/font_bizcat8x16.mem")
+
+
+def glyph(code):
+    """ The rows of a test glyph, distinct for each character """
+    return [(code + r) & 0xff for r in range(HEIGHT)]
+
+
+def font(codes):
+    return list(codes), [row for code in codes for row in glyph(code)]
+
+
+def test_read_mem():
+    codes, glyphs = read_font(FONT)
+    # Glyphs are numbered from 0, for as many as the file has
+    assert len(codes) >= 128
+    assert codes == list(range(len(codes)))
+    assert len(glyphs) == len(codes) * HEIGHT
+    # The space is blank and the A is not
+    assert not any(glyphs[32 * HEIGHT:33 * HEIGHT])
+    assert any(glyphs[65 * HEIGHT:66 * HEIGHT])
+
+
+def test_subset_keeps_space_and_order():
+    codes, glyphs = font(range(0x20, 0x80))
+    kept_codes, kept_glyphs = subset(codes, glyphs, {ord("B"), ord("A"), 0x100})
+    assert kept_codes == [ord(" "), ord("A"), ord("B")]
+    assert kept_glyphs == glyph(ord(" ")) + glyph(ord("A")) + glyph(ord("B"))
+
+
+def test_glyph_map_missing_characters_take_the_space():
+    index = glyph_map([ord(" "), ord("A")])
+    assert len(index) == 256
+    assert index[ord("A")] == 1
+    assert index[ord(" ")] == 0
+    assert index[ord("Z")] == 0
+    # Without a space, the first glyph
+    assert glyph_map([ord("A"), ord("B")])[ord("Z")] == 0
+
+
+def test_pack_round_trip(tmp_path):
+    codes, glyphs = subset(*font(range(256)), parse_ranges("41-43"))
+    path = tmp_path / "font.fnt"
+    path.write_bytes(pack(codes, glyphs))
+    assert read_font(str(path)) == (codes, glyphs)
+
+
+def test_parse_ranges():
+    assert parse_ranges("20-22,a0,b0-b1") == {0x20, 0x21, 0x22, 0xa0, 0xb0, 0xb1}
+
+
+def test_read_psf1():
+    rows = [bytes(glyph(i)) for i in range(256)]
+    data = fontc.PSF1_MAGIC + bytes([0, HEIGHT]) + b"".join(rows)
+    codes, glyphs = read_psf(data)
+    assert codes == list(range(256))
+    assert glyphs[:2 * HEIGHT] == glyph(0) + glyph(1)
+
+
+def test_read_psf2_centres_small_glyphs():
+    width, height, count = 6, 8, 2
+    header = fontc.PSF2_MAGIC + struct.pack("<7I", 0, 32, 0, count, height, height, width)
+    data = header + bytes([0xfc] * height) + bytes(height)
+    codes, glyphs = read_psf(data)
+    assert codes == [0, 1]
+    top = (HEIGHT - height) // 2
+    assert glyphs[:HEIGHT] == [0] * top + [0xfc] * height + [0] * (HEIGHT - top - height)
+    assert not any(glyphs[HEIGHT:])
+
+
+def test_read_bdf_places_glyphs_on_the_baseline():
+    bdf = b"""STARTFONT 2.1
+FONTBOUNDINGBOX 8 16 0 -4
+FONT_ASCENT 12
+STARTCHAR A
+ENCODING 65
+BBX 4 2 1 0
+BITMAP
+F0
+90
+ENDCHAR
+STARTCHAR big
+ENCODING 300
+BBX 8 16 0 -4
+BITMAP
+ENDCHAR
+ENDFONT
+"""
+    codes, glyphs = read_bdf(bdf)
+    assert codes == [65]
+    # Two rows ending at the baseline, 12 rows down, shifted right by the x offset
+    assert glyphs == [0] * 10 + [0x78, 0x48] + [0] * 4
@@ -0,0 +1,90 @@
+import struct
+
+import pytest
+
+import memimage
+from memimage import parse_binary, parse_elf, parse_text, read_firmware, read_image
+
+
+def elf32(segments):
+    """ A minimal 32-bit little-endian ELF file with a program header for each (type, paddr, data) """
+    phoff = 52
+    data_off = phoff + 32 * len(segments)
+    header = bytearray(52)
+    header[:6] = b"\x7fELF\x01\x01"
+    struct.pack_into("<I", header, 28, phoff)
+    struct.pack_into("<HH", header, 42, 32, len(segments))
+    phdrs = b""
+    body = b""
+    for p_type, paddr, data in segments:
+        phdrs += struct.pack("<8I", p_type, data_off + len(body), paddr, paddr, len(data), len(data), 0, 4)
+        body += data
+    return bytes(header) + phdrs + body
+
+
+def test_parse_binary_little_endian():
+    assert parse_binary(bytes([1, 2, 3, 4, 5, 6, 7, 8]), 32) == [0x04030201, 0x08070605]
+    assert parse_binary(bytes([1, 2, 3]), 16) == [0x0201, 0x0003]
+    assert parse_binary(bytes([1, 2]), 8) == [1, 2]
+    with pytest.raises(ValueError):
+        parse_binary(b"", 24)
+
+
+def test_parse_text_comments_and_addresses():
+    text = b"// header\n0a 0b_0c\n@4 ff // at 4\n@1 11\n"
+    assert parse_text(text, 16) == [0x0a, 0x11, 0, 0, 0xff]
+    assert parse_text(b"0101\n1_1\n", 2) == [5, 3]
+
+
+def test_parse_elf_lays_out_loadable_segments():
+    elf = elf32([
+        (1, 0x108, b"\x03\x00\x00\x00"),
+        (1, 0x100, b"\x01\x00\x00\x00\x02\x00\x00\x00"),
+        (4, 0x0, b"note"),
+    ])
+    assert parse_elf(elf, 32) == [1, 2, 3]
+
+
+def test_read_image_pads_to_depth(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes(range(8)))
+    assert read_image(str(path), depth=4) == [0x03020100, 0x07060504, 0, 0]
+    with pytest.raises(ValueError):
+        read_image(str(path), depth=1)
+
+
+def test_read_image_guesses_format(tmp_path):
+    hex_path = tmp_path / "image.hex"
+    hex_path.write_text("12345678\n")
+    assert read_image(str(hex_path)) == [0x12345678]
+    elf_path = tmp_path / "image.elf"
+    elf_path.write_bytes(elf32([(1, 0, b"\x78\x56\x34\x12")]))
+    assert read_image(str(elf_path)) == [0x12345678]
+    mem_path = tmp_path / "image.mem"
+    mem_path.write_text("00\n")
+    with pytest.raises(ValueError):
+        read_image(str(mem_path))
+    assert read_image(str(mem_path), width=8, fmt="bin-text") == [0]
+
+
+def test_read_image_caches_until_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes(4))
+    parsed = []
+    parse = memimage.parse_binary
+    monkeypatch.setattr(memimage, "parse_binary", lambda data, width: parsed.append(data) or parse(data, width))
+
+    assert read_image(str(path)) == [0]
+    words = read_image(str(path))
+    words.append(1)
+    assert read_image(str(path)) == [0]
+    assert len(parsed) == 1
+
+    path.write_bytes(bytes([1, 0, 0, 0, 2, 0, 0, 0]))
+    assert read_image(str(path)) == [1, 2]
+    assert len(parsed) == 2
+
+
+def test_read_firmware_missing_is_empty(tmp_path):
+    with pytest.warns(UserWarning):
+        assert read_firmware(str(tmp_path / "missing.bin"), depth=4) == []
@@ -0,0 +1,88 @@
+from reports import clock_of_domain, module_figures, parse_fmax, parse_stat, parse_utilisation, timing_passed
+
+NEXTPNR_TIMING = """\
+Info: Max frequency for clock '$glbnet$clk': 31.20 MHz (PASS at 30.00 MHz)
+Info: Max frequency for clock 'qspi_clk': 50.00 MHz (FAIL at 60.00 MHz)
+Info: Routing..
+Info: Max frequency for clock '$glbnet$clk': 29.50 MHz (FAIL at 30.00 MHz)
+Info: Max frequency for clock 'qspi_clk': 61.00 MHz (PASS at 60.00 MHz)
+Info: Max frequency for clock 'lcd_clk': 40.00 MHz (FAIL at 48.00 MHz)
+"""
+
+NEXTPNR_UTILISATION = """\
+Info: Device utilisation:
+Info: 	         ICESTORM_LC:  3521/ 7680    45%
+Info: 	        ICESTORM_RAM:    20/   32    62%
+Info: 	               SB_IO:    41/  256    16%
+"""
+
+YOSYS_STAT = """\
+=== top ===
+
+   Number of wires:                 10
+   Number of cells:                  3
+     SB_DFF                          1
+     SB_LUT4                         2
+
+=== top.cpu ===
+
+   Number of cells:                 14
+     SB_CARRY                        4
+     SB_DFFE                         3
+     SB_LUT4                         7
+
+=== top.cpu.cache ===
+
+   Number of cells:                  3
+     SB_LUT4                         1
+     SB_RAM40_4K                     2
+
+=== design hierarchy ===
+
+   top                               1
+     cpu                             1
+"""
+
+
+def test_parse_fmax_takes_the_last_report():
+    assert parse_fmax(NEXTPNR_TIMING) == {
+        "$glbnet$clk": (29.5, False, 30.0),
+        "qspi_clk": (61.0, True, 60.0),
+        "lcd_clk": (40.0, False, 48.0),
+    }
+    assert parse_fmax("Info: no clocks\n") == {}
+
+
+def test_clock_of_domain():
+    clocks = parse_fmax(NEXTPNR_TIMING)
+    assert clock_of_domain(clocks) == "$glbnet$clk"
+    assert clock_of_domain(clocks, "qspi") == "qspi_clk"
+    assert clock_of_domain({"soc.clk": None}) == "soc.clk"
+    assert clock_of_domain(clocks, "neg") is None
+
+
+def test_timing_passed_judges_only_the_domain():
+    clocks = {"$glbnet$clk": (31.2, True, 30.0), "qspi_clk": (50.0, False, 60.0)}
+    assert timing_passed(clocks)
+    assert not timing_passed(clocks, "qspi")
+    assert not timing_passed(parse_fmax(NEXTPNR_TIMING))
+    assert not timing_passed({})
+
+
+def test_parse_utilisation():
+    assert parse_utilisation(NEXTPNR_UTILISATION) == {
+        "ICESTORM_LC": (3521, 7680),
+        "ICESTORM_RAM": (20, 32),
+        "SB_IO": (41, 256),
+    }
+
+
+def test_parse_stat_and_module_figures():
+    modules = parse_stat(YOSYS_STAT)
+    assert modules["top.cpu"] == {"SB_CARRY": 4, "SB_DFFE": 3, "SB_LUT4": 7}
+    assert modules["top.cpu.cache"] == {"SB_LUT4": 1, "SB_RAM40_4K": 2}
+    # Submodules are summed into the top level module they are under
+    assert module_figures(modules) == {
+        "top": {"lut": 2, "carry": 0, "ram": 0, "ff": 1},
+        "cpu": {"lut": 8, "carry": 4, "ram": 2, "ff": 3},
+    }
@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("amaranth_orchard")
+
+from peripheral.uart_fifo import FRAC_BITS, divisor_from_baud
+
+
+def test_divisor_from_baud():
+    assert divisor_from_baud(25e6, 3000000) == round(25e6 * 256 / 3000000)
+    assert divisor_from_baud(48e6, 115200) >> FRAC_BITS == 416
+    # Whole divisors have no fraction
+    assert divisor_from_baud(12e6, 1000000) == 12 << FRAC_BITS
+    assert divisor_from_baud(12e6, 1000000, frac_bits=0) == 12
+
+
+def test_divisor_rate_error():
+    # The average bit period is within half a 1/256 cycle step of the exact one
+    for clk_freq, baud in [(25e6, 3000000), (30e6, 921600), (48e6, 115200)]:
+        divisor = divisor_from_baud(clk_freq, baud)
+        assert abs(divisor / 256 - clk_freq / baud) <= 0.5 / 256
@@ -0,0 +1,15 @@
+from importlib import import_module
+
+# SoC variants in this repository: name -> (module, class)
+VARIANTS = {
+    "soc":       ("soc", "StormSoC"),
+    "hyper_soc": ("hyper_soc", "StormHyperSoC"),
+    "hfsoc":     ("hfsoc", "HfSoC"),
+    "show_soc":  ("show_soc", "ShowSoC"),
+}
+
+
+def get_variant(name):
+    """ Return the SoC class for a variant name, importing its module on demand """
+    module, cls = VARIANTS[name]
+    return getattr(import_module(module), cls)
@@ -1,12 +1,18 @@
 from amaranth import *
 from amaranth.build import *
 
+from minerva.core import Minerva
+
 from amaranth_orchard.base.gpio import GPIOPins
-from amaranth_orchard.io.uart import UARTPins
+from amaranth_orchard.io.uart import UARTPins, UARTPeripheral
 from amaranth_orchard.memory.hyperram import HyperRAMPins
 
 from peripheral.seg7 import Seg7Pins
-from peripheral.lcd import LcdPins
+from peripheral.lcd import LcdPins, LcdPeripheral
+from peripheral.uart_fifo import UARTFifoPeripheral, divisor_from_baud
+
+from pll import PLL
+from cpu_profiles import get_profile
 
 from typing import List
 
@@ -31,11 +37,97 @@ class SoCWrapper(Elaboratable):
     """
     This wrapper provides glue to simplify use of the Blackice Nxt platform, and integrate between
     the Amaranth platform and the format of pins that the IP cores expect.
+
+    If sync_freq (in Hz) is given, the sync domain is driven from a PLL at the nearest frequency the PLL
+    can achieve, rather than directly from the board clock. After elaboration, clk_freq holds the actual
+    sync domain frequency, and all clock-derived constants should be calculated from it.
+
+    bios_file is the firmware image the SoC boots, whether it is held in BRAM or, in simulation, HyperFlash.
+
+    cpu_profile names the Minerva configuration to use (see cpu_profiles.py), defaulting to the SoC's
+    default_cpu_profile. The firmware is compiled for the matching -march.
+
+    If uart_fifo_depth is given (or the SoC's default_uart_fifo_depth is not None), the UART is the
+    interrupt-driven UARTFifoPeripheral with FIFOs of that depth, rather than the polled UARTPeripheral.
+
+    uart_baud is the UART's initial baud rate. UARTFifoPeripheral has a fractional divisor, so it can
+    run at several megabaud; UARTPeripheral's whole-cycle divisor must be within 2% of the rate.
+
+    If lcd_freq (in Hz) is given, the LCD's SPI serializer runs in an lcd domain driven from a PLL at
+    that frequency, clocking the panel at half of it, rather than in the sync domain. The ST7789 takes
+    up to 62.5MHz, and the iCE40 has few PLLs to spare.
     """
 
+    default_cpu_profile = "tiny"
+    default_uart_fifo_depth = None
+    default_uart_baud = 115200
+
+    def __init__(self, *, sync_freq=None, bios_file="software/bios.bin", cpu_profile=None,
+                 uart_fifo_depth=None, uart_baud=None, lcd_freq=None):
+        self.sync_freq = sync_freq
+        self.bios_file = bios_file
+        self.cpu_profile = cpu_profile or self.default_cpu_profile
+        self.uart_fifo_depth = uart_fifo_depth or self.default_uart_fifo_depth
+        self.uart_baud = uart_baud or self.default_uart_baud
+        self.lcd_freq = lcd_freq
+        self.cpu_options, self.march = get_profile(self.cpu_profile)
+        self.clk_freq = None
+        self.ref_clk = None
+
     def is_sim(self, platform):
         return hasattr(platform, "is_sim")
 
+    def fast_sim(self, platform):
+        """ Whether power-on delays should be collapsed to speed up simulation """
+        return self.is_sim(platform) and platform.fast_boot
+
+    def add_bus_monitors(self, m, platform, *masters):
+        """
+        In simulation, add a monitor to each Wishbone master bus, which traces its transfers identified
+        by the master's position. The monitors also watch for start.S's marker write to the LEDs.
+        """
+        if self.is_sim(platform):
+            for i, bus in enumerate(masters):
+                m.submodules[f"bus_mon{i}"] = platform.add_monitor("wb_mon", bus, master=i,
+                                                                   main_marker=self.led_gpio_base)
+
+    def get_cpu(self, **cache_regions):
+        """ Create a Minerva CPU from the CPU profile, caching the given regions """
+        return Minerva(**self.cpu_options, **cache_regions)
+
+    def uart_divisor(self, baud=None):
+        """ The whole clock cycles per bit, for UARTPeripheral """
+        baud = baud or self.uart_baud
+        divisor = int(self.clk_freq // baud)
+        if abs(self.clk_freq / divisor - baud) > baud * 0.02:
+            raise ValueError(f"{baud} baud is not achievable at {self.clk_freq / 1e6:.3f} MHz "
+                             "without a fractional divisor; use uart_fifo_depth")
+        return divisor
+
+    def uart_frac_divisor(self, baud=None):
+        """ The clock cycles per bit in units of 1/256, for UARTFifoPeripheral and the simulation model """
+        return divisor_from_baud(self.clk_freq, baud or self.uart_baud)
+
+    def add_pll_domain(self, m, platform, name, freq):
+        """ Create a clock domain driven by a PLL from the board clock, and return its actual frequency """
+        if self.is_sim(platform):
+            m.domains += ClockDomain(name)
+            m.d.comb += [
+                ClockSignal(name).eq(platform.clk),
+                ResetSignal(name).eq(platform.rst)
+            ]
+            return freq
+
+        m.submodules[f"{name}_pll"] = pll = PLL(freq_in_mhz=int(platform.default_clk_frequency / 1e6),
+                                                freq_out_mhz=freq / 1e6,
+                                                domain_name=name)
+        m.domains += pll.domain
+        m.d.comb += pll.clk_pin.eq(self.ref_clk)
+
+        actual_freq = pll.freq_out_actual * 1e6
+        platform.add_clock_constraint(pll.domain.clk, actual_freq)
+        return actual_freq
+
     def get_led_gpio(self, m, platform):
         leds = GPIOPins(width=7)
 
@@ -62,7 +154,8 @@ class SoCWrapper(Elaboratable):
     def get_uart(self, m, platform):
         uart = UARTPins()
         if self.is_sim(platform):
-            m.submodules.uart_model = platform.add_model("uart_model", uart, edge_det=[])
+            m.submodules.uart_model = platform.add_model("uart_model", uart, edge_det=[],
+                                                         divisor=self.uart_frac_divisor())
         else:
             platform.add_resources([
                 Resource("ext_uart", 0,
@@ -77,9 +170,24 @@ class SoCWrapper(Elaboratable):
             ]
         return uart
 
+    @property
+    def uart_type(self):
+        """ The driver type of the UART, for SoftwareGenerator.add_periph """
+        return "uart_fifo" if self.uart_fifo_depth else "uart"
+
+    def get_uart_peripheral(self, m, platform):
+        pins = self.get_uart(m, platform)
+        if self.uart_fifo_depth:
+            return UARTFifoPeripheral(pins=pins, init_divisor=self.uart_frac_divisor(),
+                                      tx_depth=self.uart_fifo_depth, rx_depth=self.uart_fifo_depth)
+        return UARTPeripheral(init_divisor=self.uart_divisor(), pins=pins)
+
     def get_seg7(self, m, platform):
         seg7 = Seg7Pins()
 
+        if self.is_sim(platform):
+            return seg7
+
         platform.add_resources(tile_resources(SEG7_TILE))
 
         seg7_pins = platform.request("seven_seg_tile")
@@ -94,6 +202,10 @@ class SoCWrapper(Elaboratable):
     def get_lcd(self, m, platform):
         lcd = LcdPins()
 
+        if self.is_sim(platform):
+            m.submodules.lcd_model = platform.add_model("st7789_model", lcd, edge_det=['sclk'])
+            return lcd
+
         platform.add_resources([
             Resource("oled", 0,
                      Subsignal("oled_bl", Pins("1", dir="o", conn=("blade", LCD_BLADE))),
@@ -118,11 +230,19 @@ class SoCWrapper(Elaboratable):
 
         return lcd
 
+    def get_lcd_peripheral(self, m, platform, **kwargs):
+        """ Create the LCD peripheral, with its SPI serializer in the lcd domain if there is one """
+        pins = self.get_lcd(m, platform)
+        if self.lcd_freq:
+            spi_clk_freq = self.add_pll_domain(m, platform, "lcd", self.lcd_freq)
+            kwargs.update(spi_domain="lcd", spi_clk_freq=spi_clk_freq)
+        return LcdPeripheral(pins=pins, clk_freq=self.clk_freq, fast_init=self.fast_sim(platform), **kwargs)
+
     def get_hram(self, m, platform):
         # HyperRam on the Blackice Nxt board
         hram = HyperRAMPins(cs_count=1)
         if self.is_sim(platform):
-            m.submodules.hram = platform.add_model("hyperram_model", hram, edge_det=['clk_o', ])
+            m.submodules.hram = platform.add_model("hyperram_model", hram, edge_det=['clk_o', ], latency=7)
         else:
             plat_hram = platform.request("hyperbus", 0)
             m.d.comb += [
@@ -140,11 +260,12 @@ class SoCWrapper(Elaboratable):
             ]
         return hram
 
-    def get_hflash(self, m, platform):
-        # HyperRam on the Blackice Nxt board
+    def get_hflash(self, m, platform, init_file=""):
+        # HyperFlash on the Blackice Nxt board, initialised from init_file in simulation
         hram = HyperRAMPins(cs_count=1)
         if self.is_sim(platform):
-            m.submodules.hram = platform.add_model("hyperram_model", hram, edge_det=['clk_o', ])
+            m.submodules.hflash = platform.add_model("hyperram_model", hram, edge_det=['clk_o', ],
+                                                     latency=16, init_file=init_file)
         else:
             plat_hram = platform.request("hyperbus", 0)
             m.d.comb += [
@@ -169,5 +290,13 @@ class SoCWrapper(Elaboratable):
             m.domains.sync = ClockDomain()
             m.d.comb += ClockSignal().eq(platform.clk)
             m.d.comb += ResetSignal().eq(platform.rst)
+            self.clk_freq = self.sync_freq or platform.default_clk_frequency
+        elif self.sync_freq is not None:
+            # Drive the sync domain from a PLL, which eats the board clock
+            self.ref_clk = platform.request(platform.default_clk).i
+            self.clk_freq = self.add_pll_domain(m, platform, "sync", self.sync_freq)
+        else:
+            self.ref_clk = ClockSignal()
+            self.clk_freq = platform.default_clk_frequency
 
         return m